@@ -0,0 +1,46 @@
+"""
+Description: Application configuration for the authn app.
+
+Main content:
+1. function: create_extensions(using, **kwargs)
+2. class: AuthnConfig(AppConfig)
+"""
+
+from django.apps import AppConfig
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.db.models.signals import pre_migrate, post_save, post_delete
+
+# Estensioni Postgres richieste dagli indici dei modelli
+POSTGRES_EXTENSIONS = ['pg_trgm']
+
+def create_extensions(using='default', **kwargs):
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        for extension in POSTGRES_EXTENSIONS:
+            cursor.execute(f'CREATE EXTENSION IF NOT EXISTS {extension}')
+
+class AuthnConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'authn'
+
+    def ready(self):
+        # Le migrazioni vengono generate all'avvio (setup.sh), quindi le
+        # estensioni vengono create prima di applicarle
+        pre_migrate.connect(create_extensions, sender=self)
+
+        # Presenza e cache condivise tra i processi (vedi presence.py)
+        from .presence import check_shared_cache
+        check_shared_cache()
+
+        # Gli utenti in cache (sessions.USER_CACHE) scadono a ogni modifica
+        from .sessions import invalidate_user
+        User = self.get_model('User')
+        post_save.connect(invalidate_user, sender=User, dispatch_uid='authn_user_cache_save')
+        post_delete.connect(invalidate_user, sender=User, dispatch_uid='authn_user_cache_delete')
+
+        # Conteggio delle query per view (metrics.METRICS)
+        from .metrics import instrument
+        connection_created.connect(instrument, dispatch_uid='authn_metrics_queries')
@@ -0,0 +1,310 @@
+"""
+Description: Cold tier of the match history: compressed columnar segments on disk.
+
+Main content:
+1. function: write_segment(path, game, month, matches)
+2. class: Segment
+3. object: ARCHIVE
+
+The matches older than the hot window leave the Match table (archive_matches)
+for one immutable segment per game and month:
+ARCHIVE_DIR/<game>/<YYYY-MM>.<generation>.seg. A segment has one row per human
+player of every match, sorted by player and then by (date, id) descending, so
+the history of a player in a month is one contiguous range of rows:
+- header: magic, length and JSON metadata (game, month, sizes, dictionaries);
+- player index: sorted player ids and the first row of each range (int64);
+- group table: file offset of every group of ARCHIVE_GROUP_ROWS rows;
+- groups: the columns of the group one after the other, zlib-compressed.
+
+Segments are memory-mapped: the index and the group table are NumPy views of
+the mapping (nothing is read or copied when a segment is opened), a lookup is
+a binary search and only the groups of the requested range are decompressed,
+straight from the mapping. The last ARCHIVE_CACHE_GROUPS decompressed groups
+are kept, for the pages that follow. Archiving a month again writes the next
+generation with the old and the new rows; the readers use the newest one.
+"""
+
+import json
+import mmap
+import os
+import struct
+import threading
+import zlib
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone as dt_timezone
+import numpy as np
+from django.conf import settings
+from rest_framework import serializers
+from .models import Player, Match
+
+MAGIC = b'AMSEG\x00\x01\x00'
+# Le codifiche seguono le choices del modello (matches.py importa ratings.py, che importa questo modulo)
+MODES = tuple(value for value, _ in Match._meta.get_field('mode').choices)
+WINNERS = tuple(value for value, _ in Match._meta.get_field('winner').choices)
+# Colonne di ogni riga: slot è il posto (1 o 2) del giocatore a cui appartiene la riga
+COLUMNS = (
+    ('id', '<i8'), ('date', '<i8'), ('player1', '<i8'), ('player2', '<i8'),
+    ('player1_result', '<u4'), ('player2_result', '<u4'),
+    ('slot', 'u1'), ('mode', 'u1'), ('winner', 'u1'), ('bot', 'u1'),
+)
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+MICROSECOND = timedelta(microseconds=1)
+DATE_FIELD = serializers.DateTimeField()
+
+def to_micros(date):
+    return (date - EPOCH) // MICROSECOND
+
+def from_micros(micros):
+    return EPOCH + timedelta(microseconds=int(micros))
+
+def _align(offset):
+    return offset + -offset % 8
+
+def write_segment(path, game, month, matches):
+    """Write the matches of game in month (dict of arrays, one entry per match, see COLUMNS).
+
+    player2 is -1 for the bot, bot is the position in matches['bots'] (0: none),
+    mode and winner the positions in MODES and WINNERS. The file appears only
+    when complete (rename).
+    """
+    human = matches['player2'] >= 0
+    # Una riga per il player1 e una per il player2 umano
+    owner = np.concatenate([matches['player1'], matches['player2'][human]])
+    rows = {name: np.concatenate([matches[name], matches[name][human]]).astype(dtype)
+            for name, dtype in COLUMNS if name != 'slot'}
+    rows['slot'] = np.concatenate([np.ones(len(human), 'u1'), np.full(int(human.sum()), 2, 'u1')])
+    order = np.lexsort((-rows['id'], -rows['date'], owner))
+    owner = owner[order]
+    rows = {name: rows[name][order] for name, _ in COLUMNS}
+
+    players, starts = np.unique(owner, return_index=True)
+    starts = np.append(starts, len(owner)).astype('<i8')
+    group_rows = getattr(settings, 'ARCHIVE_GROUP_ROWS', 4096)
+    blobs = [
+        zlib.compress(b''.join(rows[name][first:first + group_rows].tobytes() for name, _ in COLUMNS))
+        for first in range(0, len(owner), group_rows)
+    ]
+
+    meta = json.dumps({
+        'game': game, 'month': month, 'rows': len(owner), 'matches': len(human),
+        'players': len(players), 'groups': len(blobs), 'group_rows': group_rows,
+        'columns': COLUMNS, 'bots': matches['bots'], 'modes': MODES, 'winners': WINNERS,
+    }).encode()
+    offset = _align(len(MAGIC) + 4 + len(meta))
+    tables = offset + 8 * (len(players) + len(starts) + len(blobs) + 1)
+    groups = np.cumsum([tables] + [len(blob) for blob in blobs]).astype('<i8')
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary = f'{path}.tmp'
+    with open(temporary, 'wb') as file:
+        file.write(MAGIC + struct.pack('<I', len(meta)) + meta)
+        file.write(b'\0' * (offset - file.tell()))
+        for table in (players.astype('<i8'), starts, groups):
+            file.write(table.tobytes())
+        for blob in blobs:
+            file.write(blob)
+        file.flush()
+        os.fsync(file.fileno())
+    os.chmod(temporary, 0o444)
+    os.replace(temporary, path)
+
+class Segment:
+    def __init__(self, path, groups_cache):
+        self.path = path
+        with open(path, 'rb') as file:
+            self.mapping = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.mapping[:len(MAGIC)] != MAGIC:
+            raise ValueError(f'{path} is not a match segment')
+        length, = struct.unpack_from('<I', self.mapping, len(MAGIC))
+        start = len(MAGIC) + 4
+        self.meta = json.loads(self.mapping[start:start + length])
+        offset = _align(start + length)
+        # Viste sulla mappatura: nessuna copia
+        players = self.meta['players']
+        self.players = np.frombuffer(self.mapping, '<i8', players, offset)
+        self.starts = np.frombuffer(self.mapping, '<i8', players + 1, offset + 8 * players)
+        self.groups = np.frombuffer(self.mapping, '<i8', self.meta['groups'] + 1, offset + 8 * (2 * players + 1))
+        self.groups_cache = groups_cache
+
+    def group(self, number):
+        """Columns of a group (dict of read-only arrays)."""
+        key = (self.path, number)
+        columns = self.groups_cache.get(key)
+        if columns is None:
+            first, last = int(self.groups[number]), int(self.groups[number + 1])
+            raw = zlib.decompress(memoryview(self.mapping)[first:last])
+            size = min(self.meta['group_rows'], self.meta['rows'] - number * self.meta['group_rows'])
+            columns, offset = {}, 0
+            for name, dtype in COLUMNS:
+                columns[name] = np.frombuffer(raw, dtype, size, offset)
+                offset += size * np.dtype(dtype).itemsize
+            self.groups_cache.put(key, columns)
+        return columns
+
+    def read(self, first, last):
+        """Columns of the rows [first, last)."""
+        group_rows = self.meta['group_rows']
+        parts = []
+        for number in range(first // group_rows, (last - 1) // group_rows + 1):
+            base = number * group_rows
+            columns = self.group(number)
+            parts.append({name: values[max(first - base, 0):last - base] for name, values in columns.items()})
+        if len(parts) == 1:
+            return parts[0]
+        return {name: np.concatenate([part[name] for part in parts]) for name, _ in COLUMNS}
+
+    def history(self, player_id, after, limit):
+        """Up to limit rows of player_id older than after ((date micros, id) or None)."""
+        index = int(np.searchsorted(self.players, player_id))
+        if index == len(self.players) or self.players[index] != player_id:
+            return None
+        columns = self.read(int(self.starts[index]), int(self.starts[index + 1]))
+        first = 0
+        if after is not None:
+            date, pk = after
+            # Righe in ordine (date, id) decrescente: la prima più vecchia del cursore
+            older = (columns['date'] < date) | ((columns['date'] == date) & (columns['id'] < pk))
+            first = int(older.argmax()) if older.any() else len(older)
+        return {name: values[first:first + limit] for name, values in columns.items()}
+
+    def matches(self):
+        """Every match once (the rows of player1), as columns."""
+        columns = self.read(0, self.meta['rows']) if self.meta['rows'] else {
+            name: np.empty(0, dtype) for name, dtype in COLUMNS
+        }
+        mask = columns['slot'] == 1
+        return {name: values[mask] for name, values in columns.items()}
+
+class GroupCache:
+    """LRU of the decompressed groups, shared by the segments."""
+
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            columns = self.entries.get(key)
+            if columns is not None:
+                self.entries.move_to_end(key)
+            return columns
+
+    def put(self, key, columns):
+        with self.lock:
+            self.entries[key] = columns
+            while len(self.entries) > getattr(settings, 'ARCHIVE_CACHE_GROUPS', 64):
+                self.entries.popitem(last=False)
+
+class Archive:
+    def __init__(self):
+        self.lock = threading.Lock()
+        # gioco -> (mtime della cartella, {mese: Segment})
+        self.listings = {}
+        self.groups_cache = GroupCache()
+
+    def directory(self, game):
+        return os.path.join(getattr(settings, 'ARCHIVE_DIR', 'archive'), game)
+
+    def segment_path(self, game, month, generation):
+        return os.path.join(self.directory(game), f'{month}.{generation:04d}.seg')
+
+    def generations(self, game):
+        """{month: (generation, path)} of the newest segments of game."""
+        newest = {}
+        try:
+            names = os.listdir(self.directory(game))
+        except FileNotFoundError:
+            return newest
+        for name in names:
+            parts = name.split('.')
+            if len(parts) != 3 or parts[2] != 'seg' or not parts[1].isdigit():
+                continue
+            generation = int(parts[1])
+            if parts[0] not in newest or newest[parts[0]][0] < generation:
+                newest[parts[0]] = (generation, os.path.join(self.directory(game), name))
+        return newest
+
+    def segments(self, game):
+        """{month: Segment}; reopened only when the directory changes."""
+        try:
+            mtime = os.stat(self.directory(game)).st_mtime_ns
+        except FileNotFoundError:
+            return {}
+        with self.lock:
+            listing = self.listings.get(game)
+            if listing is not None and listing[0] == mtime:
+                return listing[1]
+            previous = listing[1] if listing else {}
+        opened = {}
+        for month, (_, path) in self.generations(game).items():
+            segment = previous.get(month)
+            opened[month] = segment if segment is not None and segment.path == path else Segment(path, self.groups_cache)
+        with self.lock:
+            self.listings[game] = (mtime, opened)
+        return opened
+
+    def months(self, game):
+        return sorted(self.segments(game))
+
+    def history(self, game, player_id, after, limit):
+        """Up to limit archived matches of player_id older than after ((date, id) or None), newest first."""
+        position = None if after is None else (to_micros(after[0]), after[1])
+        last_month = None if after is None else f'{after[0].astimezone(dt_timezone.utc):%Y-%m}'
+        segments = self.segments(game)
+        parts = []
+        for month in sorted(segments, reverse=True):
+            if limit <= 0:
+                break
+            if last_month is not None and month > last_month:
+                continue
+            rows = segments[month].history(player_id, position, limit)
+            if rows is None or not len(rows['id']):
+                continue
+            parts.append((segments[month], rows))
+            limit -= len(rows['id'])
+            # I mesi più vecchi vengono letti dall'inizio
+            position = None
+        return parts
+
+    def history_data(self, game, player_id, after, limit):
+        """Archived matches in the format of MatchSerializer (one query for the uids)."""
+        parts = self.history(game, player_id, after, limit)
+        ids = set()
+        for _, rows in parts:
+            ids.update(rows['player1'].tolist())
+            ids.update(rows['player2'][rows['player2'] >= 0].tolist())
+        uids = dict(Player.objects.filter(pk__in=ids).values_list('pk', 'user__uid')) if ids else {}
+        data, keys = [], []
+        for segment, rows in parts:
+            bots, modes, winners = segment.meta['bots'], segment.meta['modes'], segment.meta['winners']
+            for values in zip(*(rows[name].tolist() for name, _ in COLUMNS)):
+                row = dict(zip((name for name, _ in COLUMNS), values))
+                date = from_micros(row['date'])
+                match = {'player1_uid': uids.get(row['player1'])}
+                # Come MatchSerializer: nessun player2_uid nelle partite contro il bot
+                if row['player2'] >= 0:
+                    match['player2_uid'] = uids.get(row['player2'])
+                match.update({
+                    'bot_name': bots[row['bot']] or None,
+                    'player1_result': row['player1_result'],
+                    'player2_result': row['player2_result'],
+                    'mode': modes[row['mode']],
+                    'winner': winners[row['winner']],
+                    'date': DATE_FIELD.to_representation(date),
+                })
+                data.append(match)
+                keys.append((date, row['id']))
+        return data, keys
+
+    def matches(self, game):
+        """(id, player1, player2, winner) int64 columns of all the archived matches of game.
+
+        player2 is -1 for the bot, winner the position in WINNERS.
+        """
+        parts = [segment.matches() for segment in self.segments(game).values()]
+        return tuple(
+            np.concatenate([part[name].astype(np.int64) for part in parts]) if parts else np.empty(0, np.int64)
+            for name in ('id', 'player1', 'player2', 'winner')
+        )
+
+ARCHIVE = Archive()
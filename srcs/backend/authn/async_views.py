@@ -0,0 +1,245 @@
+"""
+Description: Async implementations of the hot read endpoints and of the login.
+
+Main content:
+1. class: AsyncAPIView(View)
+2. class: AsyncLoginView(AsyncAPIView) [post]
+3. class: AsyncInfoView(AsyncAPIView) [get]
+4. class: AsyncPongInfoView(AsyncPlayerInfoView) [get]
+5. class: AsyncTrisInfoView(AsyncPlayerInfoView) [get]
+6. class: AsyncPongLeaderboardView(AsyncLeaderboardView) [get]
+7. class: AsyncTrisLeaderboardView(AsyncLeaderboardView) [get]
+
+GET requests (and the login POST) are served on the event loop with the async
+ORM; the other methods of the same route (PUT, POST) are handed to the sync DRF
+view, so the API stays the same. Blocking work (Basic auth hashing) runs in the
+bounded executor, the login hash in the pool of passwords.py.
+"""
+
+import logging
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import alogin
+from django.http import JsonResponse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import status
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.parsers import JSONParser, FormParser, MultiPartParser
+from rest_framework.request import Request
+from .models import User, Player
+from .serializers import UserSerializer, PlayerSerializer
+from .leaderboard import LEADERBOARD
+from .executor import run_sync
+from .authentication import CachedBasicAuthentication
+from .passwords import acheck_login
+from .presence import PRESENCE
+from .response_cache import acached_response, user_resource, player_resource, leaderboard_resource
+from .views import Login, InfoView, PongInfoView, TrisInfoView, get_int_param, LEADERBOARD_MAX_PAGE_SIZE
+
+LOGGER = logging.getLogger('web')
+
+def create_json_response(data, status_code=status.HTTP_200_OK):
+    data['log_index'] = 'authn'
+    return JsonResponse(data, status=status_code)
+
+def cached_json_response(data, status_code):
+    # Risposta ricostruita dai dati in cache (log_index già presente)
+    return JsonResponse(data, status=status_code)
+
+def cached_uid(resource):
+    def name(view, request):
+        uid = request.GET.get('uid')
+        return resource(view, uid) if uid else None
+    return name
+
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncAPIView(View):
+    # Come permission_classes: True per IsAuthenticated, False per AllowAny
+    login_required = True
+    # View DRF sincrona che gestisce i metodi diversi da GET
+    sync_view = None
+
+    async def authenticate(self, request):
+        user = await request.auser()
+        if user.is_authenticated:
+            return user
+        if request.META.get('HTTP_AUTHORIZATION', '').lower().startswith('basic '):
+            try:
+                result = await run_sync(CachedBasicAuthentication().authenticate, Request(request))
+            except AuthenticationFailed:
+                return None
+            if result is not None:
+                return result[0]
+        return None
+
+    async def dispatch(self, request, *args, **kwargs):
+        method = 'get' if request.method == 'HEAD' else request.method.lower()
+        handler = getattr(self, method, None) if method in ('get', 'post') else None
+        if handler is None:
+            if self.sync_view is None:
+                return self.http_method_not_allowed(request, *args, **kwargs)
+            return await sync_to_async(self.sync_view.as_view(), thread_sensitive=True)(request, *args, **kwargs)
+
+        if self.login_required:
+            user = await self.authenticate(request)
+            if user is None:
+                # Come DRF con BasicAuthentication come primo metodo di autenticazione
+                response = create_json_response(
+                    {'detail': 'Authentication credentials were not provided.'},
+                    status.HTTP_401_UNAUTHORIZED
+                )
+                response['WWW-Authenticate'] = 'Basic realm="api"'
+                return response
+            request.user = user
+        return await handler(request, *args, **kwargs)
+
+class AsyncLoginView(AsyncAPIView):
+    login_required = False
+    sync_view = Login
+
+    async def post(self, request):
+        LOGGER.debug('- AsyncLoginView.post()')
+
+        user = await request.auser()
+        if user.is_authenticated:
+            # Come Login.post: la risposta serializza l'utente già loggato
+            return await sync_to_async(self.sync_view.as_view(), thread_sensitive=True)(request)
+
+        data = Request(request, parsers=[JSONParser(), FormParser(), MultiPartParser()]).data
+        email = data.get('email')
+        password = data.get('password')
+        if not email or not password:
+            LOGGER.warning('Missing required fields')
+            return create_json_response({'message': 'Missing required fields'}, status.HTTP_400_BAD_REQUEST)
+
+        # L'hash della password gira nel pool di passwords.py, non sull'event loop
+        user, error = await acheck_login(email, password)
+        if user is None:
+            LOGGER.warning(error)
+            return create_json_response({'message': error}, status.HTTP_401_UNAUTHORIZED)
+
+        LOGGER.info('Login successful')
+        await alogin(request, user, backend=settings.AUTHENTICATION_BACKENDS[0])
+        PRESENCE.online(user.uid)
+        return create_json_response({'message': 'Login successful'})
+
+class AsyncInfoView(AsyncAPIView):
+    sync_view = InfoView
+
+    @acached_response(cached_uid(lambda view, uid: user_resource(uid)), cached_json_response)
+    async def get(self, request):
+        LOGGER.debug('- AsyncInfoView.get()')
+        uid = request.GET.get('uid')
+
+        if not uid:
+            LOGGER.warning('UID is required')
+            return create_json_response({'message': 'UID is required'}, status.HTTP_400_BAD_REQUEST)
+
+        try:
+            user = request.user if request.user.uid == uid else await User.objects.aget(uid=uid)
+        except User.DoesNotExist:
+            LOGGER.warning('User with UID %s not found', uid)
+            return create_json_response({'message': 'User not found'}, status.HTTP_404_NOT_FOUND)
+
+        LOGGER.info('User info retrieved for UID: %s', uid)
+        return create_json_response({
+            'message': 'User info retrieved',
+            'data': UserSerializer(user).data
+        })
+
+class AsyncPlayerInfoView(AsyncAPIView):
+    game = None
+    label = None
+
+    @acached_response(cached_uid(lambda view, uid: player_resource(view.game, uid)), cached_json_response)
+    async def get(self, request):
+        LOGGER.debug('- Async%sInfoView.get()', self.label)
+        uid = request.GET.get('uid')
+
+        if not uid:
+            LOGGER.warning('UID is required')
+            return create_json_response({'message': 'UID is required'}, status.HTTP_400_BAD_REQUEST)
+
+        try:
+            user = request.user if request.user.uid == uid else await User.objects.aget(uid=uid)
+        except User.DoesNotExist:
+            LOGGER.warning('User with UID %s not found', uid)
+            return create_json_response({'message': 'User not found'}, status.HTTP_404_NOT_FOUND)
+
+        # Crea il Player se non esiste
+        player, created = await Player.objects.aget_or_create(user=user, game_type=self.game)
+        if created:
+            LOGGER.info('%s player created for user: %s', self.label, user.username)
+        # Evita il caricamento lazy (sincrono) di player.user nel serializer
+        player.user = user
+
+        LOGGER.info('%s player info retrieved for user: %s', self.label, user.username)
+        return create_json_response({
+            'message': f'{self.label} player info retrieved',
+            'data': PlayerSerializer(player).data
+        })
+
+class AsyncPongInfoView(AsyncPlayerInfoView):
+    sync_view = PongInfoView
+    game = 'pong'
+    label = 'Pong'
+
+class AsyncTrisInfoView(AsyncPlayerInfoView):
+    sync_view = TrisInfoView
+    game = 'tris'
+    label = 'Tris'
+
+class AsyncLeaderboardView(AsyncAPIView):
+    login_required = False
+    game = None
+    label = None
+
+    @acached_response(lambda view, request: leaderboard_resource(view.game), cached_json_response)
+    async def get(self, request):
+        LOGGER.debug('- Async%sLeaderboardView.get()', self.label)
+
+        # Rank di un singolo giocatore
+        uid = request.GET.get('uid')
+        if uid:
+            entry = await LEADERBOARD.arank_of(self.game, uid)
+            if entry is None:
+                LOGGER.info('Player %s not ranked in %s leaderboard', uid, self.label)
+                return create_json_response({
+                    'message': f'Player not ranked in {self.label} leaderboard',
+                    'data': None
+                }, status.HTTP_404_NOT_FOUND)
+            return create_json_response({
+                'message': f'{self.label} leaderboard rank retrieved',
+                'data': entry
+            })
+
+        page_size = get_int_param(request.GET, 'page_size', 10, minimum=1, maximum=LEADERBOARD_MAX_PAGE_SIZE)
+        page = get_int_param(request.GET, 'page', 1, minimum=1)
+        leaderboard, total = await LEADERBOARD.apage(self.game, (page - 1) * page_size, page_size)
+
+        if not leaderboard:
+            LOGGER.info('No players found for %s leaderboard', self.label)
+            return create_json_response({
+                'message': f'No players found for {self.label} leaderboard',
+                'data': [],
+                'total': total
+            })
+
+        LOGGER.info('%s leaderboard retrieved with %s players', self.label, len(leaderboard))
+        return create_json_response({
+            'message': f'{self.label} leaderboard retrieved',
+            'data': leaderboard,
+            'page': page,
+            'page_size': page_size,
+            'total': total
+        })
+
+class AsyncPongLeaderboardView(AsyncLeaderboardView):
+    game = 'pong'
+    label = 'Pong'
+
+class AsyncTrisLeaderboardView(AsyncLeaderboardView):
+    game = 'tris'
+    label = 'Tris'
@@ -0,0 +1,79 @@
+"""
+Description: Basic authentication with a cache of the verified credentials.
+
+Main content:
+1. class: CredentialCache
+2. class: CachedBasicAuthentication(BasicAuthentication)
+3. object: CREDENTIAL_CACHE
+
+Scripts and the integration collection send Basic credentials on every call,
+so every call ran the password KDF. After a successful check the credentials
+are remembered for BASIC_AUTH_CACHE_TTL seconds under an HMAC (keyed with the
+SECRET_KEY) of email and password: the cache never holds a password or
+anything a password can be guessed from offline. A hit costs one cache read and
+the user lookup of sessions.USER_CACHE, without any hash.
+
+The entry also records a fingerprint of the email and of the stored password
+hash, so changing either anywhere makes it useless at once; InfoView.put also
+deletes it explicitly.
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.crypto import constant_time_compare, salted_hmac
+from rest_framework import exceptions
+from rest_framework.authentication import BasicAuthentication
+from .passwords import check_login
+from .sessions import USER_CACHE
+
+class CredentialCache:
+    key_prefix = 'auth:basic:'
+    key_salt = 'authn.authentication.CredentialCache'
+
+    @property
+    def timeout(self):
+        return getattr(settings, 'BASIC_AUTH_CACHE_TTL', 60)
+
+    def _key(self, email, password):
+        digest = salted_hmac(self.key_salt, f'{email.strip().lower()}\x00{password}', algorithm='sha256')
+        return f'{self.key_prefix}{digest.hexdigest()}'
+
+    def _fingerprint(self, user):
+        # HMAC della password (l'utente di USER_CACHE non ha l'hash, vedi sessions.py)
+        return salted_hmac(self.key_salt, f'{user.email}\x00{user.get_session_auth_hash()}', algorithm='sha256').hexdigest()[:32]
+
+    def get(self, email, password):
+        """User of already verified credentials, or None."""
+        entry = cache.get(self._key(email, password))
+        if entry is None:
+            return None
+        user_id, fingerprint = entry
+        user = USER_CACHE.get(user_id)
+        # Email o password cambiate (o utente eliminato) dopo la verifica
+        if user is None or not constant_time_compare(fingerprint, self._fingerprint(user)):
+            return None
+        return user
+
+    def add(self, email, password, user):
+        if self.timeout > 0:
+            cache.set(self._key(email, password), (user.pk, self._fingerprint(user)), self.timeout)
+
+    def invalidate(self, email, password):
+        cache.delete(self._key(email, password))
+
+CREDENTIAL_CACHE = CredentialCache()
+
+class CachedBasicAuthentication(BasicAuthentication):
+    """DRF BasicAuthentication that hashes a password only the first time it's seen."""
+
+    def authenticate_credentials(self, userid, password, request=None):
+        user = CREDENTIAL_CACHE.get(userid, password)
+        if user is None:
+            # Una query e un hash nel pool di passwords.py, come la login
+            user, error = check_login(userid, password)
+            if user is None:
+                raise exceptions.AuthenticationFailed('Invalid username/password.')
+            CREDENTIAL_CACHE.add(userid, password, user)
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed('User inactive or deleted.')
+        return (user, None)
@@ -0,0 +1,139 @@
+"""
+Description: Avatar upload pipeline: square thumbnails in WebP and JPEG, stored by content hash.
+
+Main content:
+1. object: AVATAR_EXECUTOR
+2. function: upload_too_large(request)
+3. function: save_avatar(upload)
+4. function: avatar_urls(image)
+
+An upload is hashed while it's read in chunks (Django keeps large uploads on a
+temporary file, never whole in memory) and stored under
+avatars/<aa>/<sha256>/<size>.<webp|jpg>: the same picture uploaded twice, by
+any user, is processed and stored once. The decode and the resizes run on
+AVATAR_EXECUTOR (Pillow releases the GIL there), at most AVATAR_WORKERS at a
+time. JPEG sources are decoded directly at the smallest scale that still
+covers the largest thumbnail. The variants are new images: EXIF (GPS
+included), ICC and comments of the upload are not copied, after applying the
+EXIF orientation.
+
+Requests larger than AVATAR_MAX_UPLOAD_SIZE are refused from their
+Content-Length before the body is read, images over AVATAR_MAX_PIXELS from
+their header before they are decoded.
+"""
+
+import hashlib
+import io
+import re
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+AVATAR_EXECUTOR = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'AVATAR_WORKERS', 2),
+    thread_name_prefix='avatar'
+)
+
+ALLOWED_FORMATS = {'JPEG', 'PNG', 'WEBP', 'GIF'}
+FORMATS = {'webp': ('WEBP', {'quality': 80, 'method': 4}),
+           'jpeg': ('JPEG', {'quality': 85, 'optimize': True, 'progressive': True})}
+EXTENSIONS = {'webp': 'webp', 'jpeg': 'jpg'}
+AVATAR_DIR = 'avatars'
+AVATAR_NAME = re.compile(rf'^{AVATAR_DIR}/[0-9a-f]{{2}}/(?P<digest>[0-9a-f]{{64}})/\d+\.jpg$')
+# Margine per i campi non file di una richiesta multipart
+MULTIPART_OVERHEAD = 64 * 1024
+
+def avatar_sizes():
+    return sorted(getattr(settings, 'AVATAR_SIZES', (64, 128, 256)))
+
+def max_upload_size():
+    return getattr(settings, 'AVATAR_MAX_UPLOAD_SIZE', 5 * 1024 * 1024)
+
+def upload_too_large(request):
+    """True if the declared body size is above the avatar limit (checked before parsing it)."""
+    try:
+        length = int(request.META.get('CONTENT_LENGTH') or 0)
+    except ValueError:
+        return False
+    return length > max_upload_size() + MULTIPART_OVERHEAD
+
+def _render(source, sizes):
+    """Decode source and return {(size, format): bytes} of the square thumbnails."""
+    largest = sizes[-1]
+    try:
+        with Image.open(source) as image:
+            if image.format not in ALLOWED_FORMATS:
+                raise ValueError(f'Unsupported image format: {image.format}')
+            width, height = image.size
+            if width * height > getattr(settings, 'AVATAR_MAX_PIXELS', 24000000):
+                raise ValueError('Image too large')
+            # JPEG: decodifica ridotta (1/2 .. 1/8) se il lato corto resta >= largest
+            scale = min(width, height) / largest
+            if scale > 1:
+                image.draft('RGB', (round(width / scale), round(height / scale)))
+            image = ImageOps.exif_transpose(image)
+            if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+                # Trasparenza su sfondo bianco (il JPEG non ha canale alfa)
+                rgba = image.convert('RGBA')
+                image = Image.new('RGB', rgba.size, (255, 255, 255))
+                image.paste(rgba, mask=rgba.getchannel('A'))
+            else:
+                image = image.convert('RGB')
+            square = ImageOps.fit(image, (largest, largest), Image.Resampling.LANCZOS)
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError) as e:
+        raise ValueError(f'Invalid image: {e}') from e
+
+    variants = {}
+    for size in sizes:
+        variant = square if size == largest else square.resize((size, size), Image.Resampling.LANCZOS)
+        # Nessun metadato copiato dall'originale
+        variant.info = {}
+        for name, (pil_format, options) in FORMATS.items():
+            buffer = io.BytesIO()
+            variant.save(buffer, pil_format, **options)
+            variants[(size, name)] = buffer.getvalue()
+    return variants
+
+def _variant_name(digest, size, name):
+    return f'{AVATAR_DIR}/{digest[:2]}/{digest}/{size}.{EXTENSIONS[name]}'
+
+def save_avatar(upload):
+    """Process an uploaded file; return the storage name of the largest JPEG. Raise ValueError."""
+    if upload.size > max_upload_size():
+        raise ValueError('Image too large')
+    digest = hashlib.sha256()
+    for chunk in upload.chunks():
+        digest.update(chunk)
+    digest = digest.hexdigest()
+
+    sizes = avatar_sizes()
+    main = _variant_name(digest, sizes[-1], 'jpeg')
+    # Scritto per ultimo: se esiste, tutte le varianti esistono
+    if default_storage.exists(main):
+        return main
+
+    upload.seek(0)
+    variants = AVATAR_EXECUTOR.submit(_render, upload, sizes).result()
+    main_data = variants.pop((sizes[-1], 'jpeg'))
+    for (size, name), data in variants.items():
+        variant_name = _variant_name(digest, size, name)
+        if not default_storage.exists(variant_name):
+            default_storage.save(variant_name, ContentFile(data))
+    default_storage.save(main, ContentFile(main_data))
+    return main
+
+def avatar_urls(image):
+    """URL of every size and format of an avatar ({'64': {'webp': url, 'jpeg': url}, ...})."""
+    name = getattr(image, 'name', image) or ''
+    match = AVATAR_NAME.match(name)
+    if match is None:
+        # Immagine di default o caricata prima della pipeline: un solo file per tutte le misure
+        url = default_storage.url(name) if name else None
+        return {str(size): {'webp': url, 'jpeg': url} for size in avatar_sizes()}
+    digest = match.group('digest')
+    return {
+        str(size): {name: default_storage.url(_variant_name(digest, size, name)) for name in FORMATS}
+        for size in avatar_sizes()
+    }
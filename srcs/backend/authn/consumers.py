@@ -0,0 +1,81 @@
+"""
+Description: WebSocket consumers of the authn app.
+
+Main content:
+1. class: PresenceConsumer(AsyncJsonWebsocketConsumer)
+2. class: PongConsumer(AsyncJsonWebsocketConsumer)
+
+An open presence socket keeps its user online: the connection itself replaces
+the HTTP heartbeat, and closing the tab marks the user offline immediately.
+A pong socket joins a server-side room (see pong_rooms.py): the client only
+sends its paddle direction and receives the state of the match. The creator of
+a local room names its opponent (?mode=local&opponent=<uid>); anyone else is
+refused before the handshake completes.
+"""
+
+import logging
+from urllib.parse import parse_qs
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+from .executor import run_sync
+from .presence import PRESENCE
+from .pong_rooms import ROOMS
+
+LOGGER = logging.getLogger('web')
+
+class PresenceConsumer(AsyncJsonWebsocketConsumer):
+    async def connect(self):
+        user = self.scope.get('user')
+        if user is None or not user.is_authenticated:
+            await self.close(code=4001)
+            return
+        self.uid = user.uid
+        await self.accept()
+        await run_sync(PRESENCE.online, self.uid)
+        LOGGER.debug('Presence socket opened for %s', self.uid)
+
+    async def receive_json(self, content, **kwargs):
+        if content.get('type') == 'heartbeat':
+            await run_sync(PRESENCE.heartbeat, self.uid)
+
+    async def disconnect(self, code):
+        if hasattr(self, 'uid'):
+            await run_sync(PRESENCE.offline, self.uid)
+            LOGGER.debug('Presence socket closed for %s', self.uid)
+
+class PongConsumer(AsyncJsonWebsocketConsumer):
+    async def connect(self):
+        user = self.scope.get('user')
+        if user is None or not user.is_authenticated:
+            await self.close(code=4001)
+            return
+        self.room_id = self.scope['url_route']['kwargs']['room_id']
+        query = parse_qs(self.scope.get('query_string', b'').decode())
+        mode = query.get('mode', ['local'])[0]
+        opponent = query.get('opponent', [None])[0]
+        # Solo il creatore o l'avversario che ha invitato
+        if not ROOMS.admits(self.room_id, user.uid, mode, opponent):
+            LOGGER.warning('%s is not invited to pong room %s', user.uid, self.room_id)
+            await self.close(code=4003)
+            return
+
+        await self.accept()
+        side = await ROOMS.join(self.room_id, self, user.uid, mode, opponent=opponent)
+        if side is None:
+            LOGGER.warning('%s cannot join pong room %s', user.uid, self.room_id)
+            await self.close(code=4003)
+            return
+        self.side = side
+        await self.send_json({'type': 'joined', 'room': self.room_id, 'side': side})
+        LOGGER.debug('%s joined pong room %s as player %s', user.uid, self.room_id, side)
+
+    async def receive_json(self, content, **kwargs):
+        # {"type": "move", "direction": -1 | 0 | 1}
+        if content.get('type') == 'move' and hasattr(self, 'side'):
+            try:
+                ROOMS.move(self.room_id, self, int(content.get('direction', 0)))
+            except (TypeError, ValueError):
+                pass
+
+    async def disconnect(self, code):
+        if hasattr(self, 'side'):
+            await ROOMS.leave(self.room_id, self)
@@ -0,0 +1,23 @@
+"""
+Description: Bounded thread pool for the sync code called from async views.
+
+Main content:
+1. object: EXECUTOR
+2. function: run_sync(func, *args, **kwargs)
+
+Password hashing and the in-memory engines' database reloads are blocking; they
+run here instead of on the event loop, and at most ASYNC_SYNC_WORKERS of them
+(and of their database connections) exist per process.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+EXECUTOR = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'ASYNC_SYNC_WORKERS', 8),
+    thread_name_prefix='sync-fallback'
+)
+
+async def run_sync(func, *args, **kwargs):
+    return await sync_to_async(func, thread_sensitive=False, executor=EXECUTOR)(*args, **kwargs)
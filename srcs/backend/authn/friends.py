@@ -0,0 +1,69 @@
+"""
+Description: Cached friend graph (adjacency lists per user).
+
+Main content:
+1. class: FriendGraph
+2. object: FRIEND_GRAPH
+
+For every user the cache holds the accepted friends and the incoming and
+outgoing pending requests, built with a single joined query on a miss.
+FriendRequestView invalidates both ends of a friendship when it changes.
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import models
+from .models import Friendship
+
+class FriendGraph:
+    key_prefix = 'friends:adj:'
+
+    @property
+    def timeout(self):
+        return getattr(settings, 'FRIEND_GRAPH_TTL', 300)
+
+    def _key(self, user_id):
+        return f'{self.key_prefix}{user_id}'
+
+    def _load(self, user_id):
+        adjacency = {'accepted': [], 'incoming': [], 'outgoing': []}
+        rows = Friendship.objects.filter(
+            models.Q(sender_id=user_id) | models.Q(receiver_id=user_id),
+            status__in=['accepted', 'pending']
+        ).values_list('sender_id', 'sender__uid', 'sender__username', 'receiver__uid', 'receiver__username', 'status')
+        for sender_id, sender_uid, sender_name, receiver_uid, receiver_name, status in rows:
+            outgoing = sender_id == user_id
+            other = (receiver_uid, receiver_name) if outgoing else (sender_uid, sender_name)
+            if status == 'accepted':
+                adjacency['accepted'].append(other)
+            else:
+                adjacency['outgoing' if outgoing else 'incoming'].append(other)
+        return adjacency
+
+    def get(self, user):
+        """Return the adjacency of user: lists of (uid, username) per relation."""
+        key = self._key(user.pk)
+        adjacency = cache.get(key)
+        if adjacency is None:
+            adjacency = self._load(user.pk)
+            cache.set(key, adjacency, self.timeout)
+        return adjacency
+
+    def invalidate(self, *users):
+        cache.delete_many([self._key(user.pk) for user in users])
+
+    def invalidate_neighbours(self, user):
+        """Drop the cached lists of user and its neighbours; return the uids of the neighbours."""
+        # Dopo un cambio di uid/username le liste degli amici contengono il vecchio valore
+        pairs = Friendship.objects.filter(
+            models.Q(sender=user) | models.Q(receiver=user)
+        ).values_list('sender_id', 'sender__uid', 'receiver_id', 'receiver__uid')
+        keys = {self._key(user.pk)}
+        uids = set()
+        for sender_id, sender_uid, receiver_id, receiver_uid in pairs:
+            keys.update((self._key(sender_id), self._key(receiver_id)))
+            uids.add(receiver_uid if sender_id == user.pk else sender_uid)
+        cache.delete_many(list(keys))
+        return uids
+
+FRIEND_GRAPH = FriendGraph()
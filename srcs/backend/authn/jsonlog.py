@@ -0,0 +1,169 @@
+"""
+Description: Non-blocking logging: queue, background writer and ECS JSON lines.
+
+Main content:
+1. object: REQUEST_CONTEXT
+2. class: JSONFormatter(logging.Formatter)
+3. class: SamplingFilter(logging.Filter)
+4. class: QueueHandler(logging.handlers.QueueHandler)
+
+A log call on a request thread only interpolates its message (the arguments
+may be lazy objects that must not be read from another thread) and puts the
+record on a bounded queue; the JSON encoding and the file and console writes
+happen on the listener thread. When the queue is full the record is dropped
+and counted instead of blocking the request; as soon as the queue takes
+records again, one warning line reports how many were lost since the last one
+(labels.dropped_records, so it can be summed in Kibana).
+
+Every file line is one ECS document (@timestamp, log.level, message, ...)
+with the fields of the current request (http.request.id, url.path, ...) taken
+from REQUEST_CONTEXT, set by middleware.RequestLogMiddleware: Logstash
+decodes it with the json filter instead of parsing free text.
+
+LOG_SAMPLING maps a level to the fraction of records kept. The decision is
+taken on the request id, so a sampled request keeps all of its records.
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import threading
+import zlib
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from django.conf import settings
+
+# Campi ECS (chiavi con il punto) della richiesta in corso
+REQUEST_CONTEXT = ContextVar('request_context', default=None)
+ECS_VERSION = '8.11.0'
+
+def _nest(document, dotted):
+    """Merge {'http.request.id': x} into document as {'http': {'request': {'id': x}}}."""
+    for key, value in dotted.items():
+        if value is None:
+            continue
+        target = document
+        *parents, leaf = key.split('.')
+        for parent in parents:
+            target = target.setdefault(parent, {})
+        target[leaf] = value
+    return document
+
+class JSONFormatter(logging.Formatter):
+    """One ECS JSON document per record."""
+
+    def __init__(self, service='backend', log_index='authn', **kwargs):
+        super().__init__(**kwargs)
+        self.service = service
+        self.log_index = log_index
+
+    def format(self, record):
+        document = {
+            '@timestamp': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds')
+            .replace('+00:00', 'Z'),
+            'message': record.getMessage(),
+            'log': {
+                'level': record.levelname.lower(),
+                'logger': record.name,
+                'origin': {'file': {'name': record.filename, 'line': record.lineno}, 'function': record.funcName},
+            },
+            'ecs': {'version': ECS_VERSION},
+            'service': {'name': self.service},
+            'process': {'pid': record.process, 'thread': {'name': record.threadName}},
+            # Indice usato da Logstash (come 'log_index' nelle risposte)
+            'labels': {'log_index': self.log_index},
+        }
+        _nest(document, getattr(record, 'context', None) or {})
+        _nest(document, getattr(record, 'ecs', None) or {})
+        if record.exc_info:
+            record.error_type = record.exc_info[0].__name__
+            if not record.exc_text:
+                record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            document['error'] = {'type': getattr(record, 'error_type', None), 'stack_trace': record.exc_text}
+        return json.dumps(document, default=str, ensure_ascii=False)
+
+class SamplingFilter(logging.Filter):
+    """Keep LOG_SAMPLING[level] of the records (1.0 if the level is not listed)."""
+
+    def filter(self, record):
+        rate = getattr(settings, 'LOG_SAMPLING', {}).get(record.levelname, 1.0)
+        if rate >= 1:
+            return True
+        if rate <= 0:
+            return False
+        context = REQUEST_CONTEXT.get()
+        if context is None:
+            return random.random() < rate
+        # Stessa decisione per tutti i record della stessa richiesta
+        return zlib.crc32(context['http.request.id'].encode()) / 0xffffffff < rate
+
+class QueueHandler(logging.handlers.QueueHandler):
+    """Enqueue the records; a listener thread writes JSON to filename and text to the console."""
+
+    def __init__(self, filename, when='midnight', backup_count=7, console_level='INFO', queue_size=10000):
+        super().__init__(queue.Queue(queue_size))
+        self.dropped = 0
+        # Record persi già segnalati nel log
+        self.reported = 0
+        self.report_lock = threading.Lock()
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        file_handler = logging.handlers.TimedRotatingFileHandler(filename, when=when, backupCount=backup_count)
+        file_handler.setFormatter(JSONFormatter())
+        console_handler = logging.StreamHandler()
+        console_handler.setLevel(console_level)
+        console_handler.setFormatter(logging.Formatter('{levelname} {message}', style='{'))
+        self.listener = logging.handlers.QueueListener(
+            self.queue, file_handler, console_handler, respect_handler_level=True
+        )
+        self.listener.start()
+        # Scrive i record ancora in coda all'uscita del processo
+        atexit.register(self.listener.stop)
+
+    def prepare(self, record):
+        # Messaggio interpolato qui: gli argomenti possono essere oggetti lazy (request.user, ...)
+        message = record.getMessage()
+        record = logging.makeLogRecord(record.__dict__)
+        if record.exc_info:
+            record.error_type = record.exc_info[0].__name__
+            if not record.exc_text:
+                record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.msg, record.args, record.exc_info = message, None, None
+        context = REQUEST_CONTEXT.get()
+        record.context = dict(context) if context else None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            # Il processo non aspetta il disco: il record viene perso
+            with self.report_lock:
+                self.dropped += 1
+            return
+        if self.dropped > self.reported:
+            self.report_dropped()
+
+    def report_dropped(self):
+        """Enqueue one warning with the records dropped since the last report."""
+        with self.report_lock:
+            lost = self.dropped - self.reported
+            if lost <= 0:
+                return
+            self.reported = self.dropped
+        record = logging.makeLogRecord({
+            'name': 'web', 'levelno': logging.WARNING, 'levelname': 'WARNING', 'pathname': __file__,
+            'filename': os.path.basename(__file__), 'funcName': 'report_dropped',
+            'msg': f'{lost} log records dropped: the log queue was full',
+            'ecs': {'labels.dropped_records': lost},
+        })
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            # Coda di nuovo piena: verranno segnalati alla prossima occasione
+            with self.report_lock:
+                self.reported -= lost
@@ -0,0 +1,297 @@
+"""
+Description: In-memory leaderboard engine for the Pong and Tris leaderboards.
+
+Main content:
+1. class: RankTree
+2. class: Leaderboard
+3. object: LEADERBOARD
+
+The leaderboard is loaded from the database once per process (one joined query)
+and then kept up to date by the games views, so the public leaderboard endpoints
+never touch Postgres on the hot path. Players are ordered by Elo rating
+(descending) and then by uid; only players with TOTP > 0 are ranked, like the
+original query.
+"""
+
+import random
+import threading
+import time
+from django.conf import settings
+from .models import Player
+from .executor import run_sync
+
+GAMES = ('pong', 'tris')
+
+class _Node:
+    __slots__ = ('key', 'priority', 'size', 'left', 'right')
+
+    def __init__(self, key):
+        self.key = key
+        self.priority = random.random()
+        self.size = 1
+        self.left = None
+        self.right = None
+
+def _size(node):
+    return node.size if node else 0
+
+def _update(node):
+    node.size = 1 + _size(node.left) + _size(node.right)
+
+def _split(node, key):
+    # Divide l'albero in (chiavi < key, chiavi >= key)
+    if node is None:
+        return None, None
+    if node.key < key:
+        left, right = _split(node.right, key)
+        node.right = left
+        _update(node)
+        return node, right
+    left, right = _split(node.left, key)
+    node.left = right
+    _update(node)
+    return left, node
+
+def _merge(left, right):
+    if left is None:
+        return right
+    if right is None:
+        return left
+    if left.priority > right.priority:
+        left.right = _merge(left.right, right)
+        _update(left)
+        return left
+    right.left = _merge(left, right.left)
+    _update(right)
+    return right
+
+class RankTree:
+    """Order-statistic treap: insert, remove, rank and select in O(log n)."""
+
+    def __init__(self):
+        self._root = None
+
+    def __len__(self):
+        return _size(self._root)
+
+    def insert(self, key):
+        left, right = _split(self._root, key)
+        self._root = _merge(_merge(left, _Node(key)), right)
+
+    def remove(self, key):
+        parent, node = None, self._root
+        path = []
+        while node is not None and node.key != key:
+            path.append(node)
+            parent = node
+            node = node.left if key < node.key else node.right
+        if node is None:
+            return False
+        merged = _merge(node.left, node.right)
+        if parent is None:
+            self._root = merged
+        elif parent.left is node:
+            parent.left = merged
+        else:
+            parent.right = merged
+        for ancestor in path:
+            ancestor.size -= 1
+        return True
+
+    def rank(self, key):
+        """Number of keys strictly smaller than key."""
+        node, rank = self._root, 0
+        while node is not None:
+            if key <= node.key:
+                node = node.left
+            else:
+                rank += _size(node.left) + 1
+                node = node.right
+        return rank
+
+    def select(self, index):
+        node = self._root
+        while node is not None:
+            left_size = _size(node.left)
+            if index < left_size:
+                node = node.left
+            elif index == left_size:
+                return node.key
+            else:
+                index -= left_size + 1
+                node = node.right
+        raise IndexError('RankTree index out of range')
+
+    def slice(self, start, count):
+        """Return up to count keys starting at position start, in O(log n + count)."""
+        result = []
+        stack = []
+        node = self._root
+        # Scende fino al nodo in posizione start salvando il percorso
+        while node is not None:
+            left_size = _size(node.left)
+            if start < left_size:
+                stack.append(node)
+                node = node.left
+            elif start == left_size:
+                stack.append(node)
+                break
+            else:
+                start -= left_size + 1
+                node = node.right
+        while stack and len(result) < count:
+            node = stack.pop()
+            result.append(node.key)
+            node = node.right
+            while node is not None:
+                stack.append(node)
+                node = node.left
+        return result
+
+class _GameBoard:
+    __slots__ = ('tree', 'stats', 'loaded_at', 'replay')
+
+    def __init__(self):
+        self.tree = RankTree()
+        self.stats = {}
+        self.loaded_at = None
+        # Aggiornamenti ricevuti durante un ricaricamento, riapplicati alla fine
+        self.replay = None
+
+class Leaderboard:
+    """Per-game ranking of players, shared by all the requests of a process."""
+
+    def __init__(self, max_age=None):
+        self._boards = {game: _GameBoard() for game in GAMES}
+        self._lock = threading.RLock()
+        # Notificata alla fine di ogni caricamento (riuscito o no)
+        self._loaded = threading.Condition(self._lock)
+        self._max_age = max_age
+
+    @property
+    def max_age(self):
+        if self._max_age is not None:
+            return self._max_age
+        return getattr(settings, 'LEADERBOARD_MAX_AGE', 300)
+
+    @staticmethod
+    def _key(uid, rating):
+        return (-rating, uid)
+
+    def _stale(self, board):
+        return board.loaded_at is None or (self.max_age and time.monotonic() - board.loaded_at > self.max_age)
+
+    def refresh(self, game):
+        """Reload a stale board; the query runs without holding the lock.
+
+        While another thread loads the board, the others keep reading the old
+        one; if there is none yet (first load, invalidate) they wait for it.
+        """
+        board = self._boards[game]
+        with self._lock:
+            while True:
+                if not self._stale(board):
+                    return
+                if board.replay is None:
+                    board.replay = []
+                    break
+                if board.loaded_at is not None:
+                    return
+                self._loaded.wait()
+        try:
+            # Una sola query con join su User: nessun accesso lazy a player.user
+            rows = Player.objects.filter(game_type=game, TOTP__gt=0).values_list('user__uid', 'TOTW', 'TOTP', 'rating')
+            tree, stats = RankTree(), {}
+            for uid, totw, totp, rating in rows.iterator():
+                stats[uid] = (totw, totp, rating)
+                tree.insert(self._key(uid, rating))
+        except Exception:
+            with self._lock:
+                board.replay = None
+                # Chi aspettava riprova il caricamento
+                self._loaded.notify_all()
+            raise
+        with self._lock:
+            replay, board.replay = board.replay, None
+            board.tree, board.stats = tree, stats
+            board.loaded_at = time.monotonic()
+            for args in replay:
+                self._apply(board, *args)
+            self._loaded.notify_all()
+
+    def invalidate(self, game=None):
+        with self._lock:
+            for name in ([game] if game else GAMES):
+                self._boards[name].loaded_at = None
+
+    def update(self, game, uid, totw, totp, rating):
+        """Record the current counters and rating of a player after a match was saved."""
+        with self._lock:
+            board = self._boards[game]
+            if board.replay is not None:
+                board.replay.append((uid, totw, totp, rating))
+            if board.loaded_at is not None:
+                self._apply(board, uid, totw, totp, rating)
+
+    def _apply(self, board, uid, totw, totp, rating):
+        previous = board.stats.pop(uid, None)
+        if previous is not None:
+            board.tree.remove(self._key(uid, previous[2]))
+        if totp > 0:
+            board.stats[uid] = (totw, totp, rating)
+            board.tree.insert(self._key(uid, rating))
+
+    def rename(self, old_uid, new_uid):
+        with self._lock:
+            for board in self._boards.values():
+                previous = board.stats.pop(old_uid, None)
+                if previous is None:
+                    continue
+                board.tree.remove(self._key(old_uid, previous[2]))
+                board.stats[new_uid] = previous
+                board.tree.insert(self._key(new_uid, previous[2]))
+
+    def _entry(self, board, key, rank):
+        uid = key[1]
+        totw, totp, rating = board.stats[uid]
+        return {'player_uid': uid, 'TOTP': totp, 'TOTW': totw, 'rating': round(rating, 1), 'rank': rank + 1}
+
+    def page(self, game, offset=0, limit=10, reload=True):
+        if reload:
+            self.refresh(game)
+        with self._lock:
+            board = self._boards[game]
+            keys = board.tree.slice(offset, limit)
+            return [self._entry(board, key, offset + i) for i, key in enumerate(keys)], len(board.tree)
+
+    def top(self, game, limit=10):
+        return self.page(game, 0, limit)[0]
+
+    def rank_of(self, game, uid, reload=True):
+        if reload:
+            self.refresh(game)
+        with self._lock:
+            board = self._boards[game]
+            stats = board.stats.get(uid)
+            if stats is None:
+                return None
+            key = self._key(uid, stats[2])
+            return self._entry(board, key, board.tree.rank(key))
+
+    def count(self, game):
+        self.refresh(game)
+        with self._lock:
+            return len(self._boards[game].tree)
+
+    # Versioni per le view async: solo il caricamento dal database esce dall'event loop
+    async def apage(self, game, offset=0, limit=10):
+        if self._stale(self._boards[game]):
+            await run_sync(self.refresh, game)
+        return self.page(game, offset, limit, reload=False)
+
+    async def arank_of(self, game, uid):
+        if self._stale(self._boards[game]):
+            await run_sync(self.refresh, game)
+        return self.rank_of(game, uid, reload=False)
+
+LEADERBOARD = Leaderboard()
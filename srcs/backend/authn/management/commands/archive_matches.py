@@ -0,0 +1,150 @@
+"""
+Description: Move the old matches from the Match table to the archive segments.
+
+Main content:
+1. class: Command(BaseCommand)
+
+Usage: python manage.py archive_matches [--keep-months 6] [--game pong] [--dry-run]
+Every month before the last --keep-months ones (the current month included)
+is written to one segment per game (see archive.py) and then removed from the
+table. When the whole month goes (no --game), its partition is dropped
+(partition_matches); otherwise the rows are deleted. The segment is on disk
+(fsync) before the rows go: after a crash in between, the next run writes the
+month again, merged with the segment already there. The pairings of the
+archived matches lose their link to the match. Counters, ratings and rollups
+don't change: Player keeps the totals, recompute_ratings and backfill_rollups
+read the archive too.
+"""
+
+import os
+import time
+from datetime import datetime, timezone as dt_timezone
+from itertools import islice
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from authn.archive import ARCHIVE, COLUMNS, MODES, WINNERS, to_micros, write_segment
+from authn.leaderboard import GAMES
+from authn.models import Match, Pairing
+from authn.response_cache import RESPONSE_CACHE
+from authn.management.commands.partition_matches import month_start, next_month, partition_name
+
+FIELDS = ('id', 'date', 'player1_id', 'player2_id', 'player1_result', 'player2_result', 'mode', 'winner', 'bot_name')
+LOAD_CHUNK = 10000
+
+def previous_month(moment, months):
+    index = moment.year * 12 + moment.month - 1 - months
+    return month_start(datetime(index // 12, index % 12 + 1, 1))
+
+class Command(BaseCommand):
+    help = 'Archive the matches older than the hot window into compressed segments'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keep-months', type=int, default=6, help='Months kept in the table (current included)')
+        parser.add_argument('--game', choices=GAMES, help='Only this game (default: all)')
+        parser.add_argument('--dry-run', action='store_true', help='Only print the months to archive')
+
+    def handle(self, *args, **options):
+        if options['keep_months'] < 1:
+            raise CommandError('--keep-months must be at least 1')
+        games = [options['game']] if options['game'] else GAMES
+        cutoff = previous_month(datetime.now(dt_timezone.utc), options['keep_months'] - 1)
+        months = [month_start(day) for day in
+                  Match.objects.filter(game__in=games, date__lt=cutoff).dates('date', 'month')]
+        if not months:
+            self.stdout.write(f'No matches before {cutoff:%Y-%m}')
+            return
+
+        for month in months:
+            start = time.perf_counter()
+            archived = {}
+            for game in games:
+                matches = self.load(game, month)
+                if not len(matches['id']):
+                    continue
+                archived[game] = len(matches['id'])
+                if not options['dry_run']:
+                    self.write(game, f'{month:%Y-%m}', matches)
+            if not options['dry_run']:
+                self.remove(month, games, whole_month=not options['game'])
+            self.stdout.write(f'{month:%Y-%m}: ' + ', '.join(f'{game} {count}' for game, count in archived.items())
+                              + (' matches to archive' if options['dry_run'] else
+                                 f' matches archived in {time.perf_counter() - start:.1f}s'))
+        RESPONSE_CACHE.invalidate_all()
+
+    def load(self, game, month):
+        """Columns of the matches of game in month (see archive.write_segment)."""
+        rows = (Match.objects.filter(game=game, date__gte=month, date__lt=next_month(month))
+                .values_list(*FIELDS).iterator(chunk_size=LOAD_CHUNK))
+        bots = ['']
+        codes = {'': 0}
+        modes = {mode: index for index, mode in enumerate(MODES)}
+        winners = {winner: index for index, winner in enumerate(WINNERS)}
+        chunks = {name: [] for name, _ in COLUMNS if name != 'slot'}
+        # Un blocco di righe alla volta: in memoria restano solo le colonne numpy
+        while chunk := list(islice(rows, LOAD_CHUNK)):
+            for row in chunk:
+                if row[8] and row[8] not in codes:
+                    codes[row[8]] = len(bots)
+                    bots.append(row[8])
+            columns = {
+                'id': [row[0] for row in chunk],
+                'date': [to_micros(row[1]) for row in chunk],
+                'player1': [row[2] for row in chunk],
+                'player2': [-1 if row[3] is None else row[3] for row in chunk],
+                'player1_result': [row[4] for row in chunk],
+                'player2_result': [row[5] for row in chunk],
+                'mode': [modes[row[6]] for row in chunk],
+                'winner': [winners[row[7]] for row in chunk],
+                'bot': [codes[row[8] or ''] for row in chunk],
+            }
+            for name, values in columns.items():
+                chunks[name].append(np.array(values, np.int64))
+        matches = {name: np.concatenate(values) if values else np.empty(0, np.int64)
+                   for name, values in chunks.items()}
+        matches['bots'] = bots
+        return matches
+
+    def write(self, game, month, matches):
+        """Write the next generation of the segment of month, merged with the current one."""
+        current = ARCHIVE.generations(game).get(month)
+        generation = 1
+        if current is not None:
+            generation = current[0] + 1
+            segment = ARCHIVE.segments(game)[month]
+            old = segment.matches()
+            # Codici dei bot del segmento vecchio riportati su quelli nuovi
+            bots = matches['bots']
+            for name in segment.meta['bots']:
+                if name not in bots:
+                    bots.append(name)
+            remap = np.array([bots.index(name) for name in segment.meta['bots']], np.int64)
+            merged = {name: np.concatenate([matches[name], old[name].astype(np.int64)])
+                      for name, _ in COLUMNS if name != 'slot'}
+            merged['bot'][len(matches['id']):] = remap[old['bot']]
+            # Dopo un'interruzione le righe possono essere in entrambi: una sola copia per id
+            _, keep = np.unique(merged['id'], return_index=True)
+            matches = {name: values[keep] for name, values in merged.items()}
+            matches['bots'] = bots
+        write_segment(ARCHIVE.segment_path(game, month, generation), game, month, matches)
+        if current is not None:
+            os.remove(current[1])
+
+    def remove(self, month, games, whole_month):
+        quote = connection.ops.quote_name
+        table = Match._meta.db_table
+        following = next_month(month)
+        with transaction.atomic(), connection.cursor() as cursor:
+            Pairing.objects.filter(match__game__in=games, match__date__gte=month,
+                                   match__date__lt=following).update(match=None)
+            if whole_month and connection.vendor == 'postgresql':
+                partition = partition_name(table, month)
+                cursor.execute('SELECT to_regclass(%s) IS NOT NULL', [partition])
+                if cursor.fetchone()[0]:
+                    cursor.execute(f'DROP TABLE {quote(partition)}')
+            # Le righe fuori dalle partizioni (default) o di un solo gioco
+            cursor.execute(
+                f'DELETE FROM {quote(table)} WHERE game IN ({", ".join(["%s"] * len(games))}) '
+                f'AND date >= %s AND date < %s',
+                [*games, month, following]
+            )
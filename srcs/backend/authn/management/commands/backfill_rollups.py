@@ -0,0 +1,96 @@
+"""
+Description: Build the daily match rollups from the existing Match rows.
+
+Main content:
+1. class: Command(BaseCommand)
+
+Usage: python manage.py backfill_rollups [--game pong] [--batch-size 5000]
+Deletes the rollups of the game and rebuilds them: one query streams the
+matches of both slots ordered by player and save order (server-side cursor),
+so only the days of one player are in memory at a time and the rows are
+written with bulk_create. The rollups of the archived months (archive_matches)
+are kept: their matches are no longer in the table.
+"""
+
+import time
+from datetime import date, timedelta
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from authn.leaderboard import GAMES
+from authn.archive import ARCHIVE
+from authn.models import Match, PlayerDailyStats
+from authn.rollups import MODE_ALL, add_result, match_day
+from authn.response_cache import RESPONSE_CACHE
+
+def archived_months(game):
+    """(first day, first day of the next month) of every archived month of game."""
+    months = []
+    for month in ARCHIVE.months(game):
+        first = date.fromisoformat(f'{month}-01')
+        months.append((first, (first + timedelta(days=31)).replace(day=1)))
+    return months
+
+class Command(BaseCommand):
+    help = 'Rebuild the daily per-player rollups from the Match history'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--game', choices=GAMES, help='Only this game (default: all)')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows per bulk insert')
+
+    def handle(self, *args, **options):
+        for game in ([options['game']] if options['game'] else GAMES):
+            start = time.perf_counter()
+            matches, rows = self.backfill(game, options['batch_size'])
+            self.stdout.write(f'{game}: {matches} match results -> {rows} rollup rows '
+                              f'in {time.perf_counter() - start:.1f}s')
+        RESPONSE_CACHE.invalidate_all()
+
+    def backfill(self, game, batch_size):
+        table = Match._meta.db_table
+        # Ogni partita compare una volta per ogni giocatore umano
+        query = (
+            f"SELECT player1_id, id, date, mode, "
+            f"CASE winner WHEN 'player1' THEN 'won' WHEN 'draw' THEN 'drawn' ELSE 'lost' END, "
+            f"player1_result, player2_result FROM {table} WHERE game = %s "
+            f"UNION ALL "
+            f"SELECT player2_id, id, date, mode, "
+            f"CASE winner WHEN 'player2' THEN 'won' WHEN 'draw' THEN 'drawn' ELSE 'lost' END, "
+            f"player2_result, player1_result FROM {table} WHERE game = %s AND player2_id IS NOT NULL "
+            f"ORDER BY 1, 2"
+        )
+        results = written = 0
+        batch = []
+        days = {}
+        current_player = None
+        with transaction.atomic():
+            # I giorni dei mesi archiviati non hanno più partite nella tabella: i loro rollup restano
+            rollups = PlayerDailyStats.objects.filter(player__game_type=game)
+            for first, following in archived_months(game):
+                rollups = rollups.exclude(day__gte=first, day__lt=following)
+            rollups.delete()
+            with connection.chunked_cursor() as cursor:
+                cursor.execute(query, [game, game])
+                while True:
+                    chunk = cursor.fetchmany(batch_size)
+                    if not chunk:
+                        break
+                    for player_id, _, date, mode, outcome, points_for, points_against in chunk:
+                        if player_id != current_player:
+                            batch.extend(days.values())
+                            days = {}
+                            current_player = player_id
+                        day = match_day(date)
+                        for key in ((day, mode), (day, MODE_ALL)):
+                            row = days.get(key)
+                            if row is None:
+                                row = days[key] = PlayerDailyStats(player_id=player_id, day=day, mode=key[1])
+                            add_result(row, outcome, points_for, points_against)
+                        results += 1
+                    if len(batch) >= batch_size:
+                        PlayerDailyStats.objects.bulk_create(batch, batch_size=batch_size)
+                        written += len(batch)
+                        batch = []
+            batch.extend(days.values())
+            PlayerDailyStats.objects.bulk_create(batch, batch_size=batch_size)
+            written += len(batch)
+        return results, written
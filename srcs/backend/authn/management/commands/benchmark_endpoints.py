@@ -0,0 +1,292 @@
+"""
+Description: Query budgets, latency and memory of every endpoint of authn/urls.py.
+
+Main content:
+1. class: Scenario
+2. class: Command(BaseCommand)
+
+Usage: python manage.py benchmark_endpoints [--requests 50] [--only pong] [--output results.json]
+Run it after seed_benchmark. Every route of authn/urls.py has at least one
+scenario (the command fails if one is missing); each scenario sends
+--requests calls through the test client, as the heaviest benchmark player
+(the longest match history) or as the other roles it needs, and reports:
+- the most DB queries of a call (counted by MetricsMiddleware, async views
+  included), checked against the scenario's budget;
+- p50 and p99 latency of the calls after the first;
+- peak Python memory (tracemalloc) of the first, cold call.
+A budget exceeded or a response with a status other than the expected one
+makes the command fail, so an N+1 introduced in a view (or a call that stops
+working and gets cheap) breaks the run. The write scenarios really write:
+use a development database.
+"""
+
+import base64
+import json
+import time
+import tracemalloc
+from collections import Counter
+from datetime import timedelta
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+from django.utils import timezone
+from authn import urls
+from authn.models import User, Player, Friendship, Pairing
+from authn.management.commands.benchmark_signup import EMAIL_DOMAIN
+
+PASSWORD = 'bench-password'
+ADMIN_EMAIL = f'admin@{EMAIL_DOMAIN}'
+SAMPLE_USERS = 500
+TOURNAMENT_PLAYERS = 64
+BATCH_GAMES = 100
+# record_matches: un UPDATE per giocatore coinvolto (qui BATCH_GAMES avversari diversi)
+BATCH_BUDGET = BATCH_GAMES + 12
+TRIS_BOARD = [['X', None, None], [None, 'O', None], [None, None, 'X']]
+
+class Scenario:
+    """Calls of one route: build(ctx, i) returns the query or body of call i (None: no more calls)."""
+
+    def __init__(self, url, method, budget, build=None, auth='basic', collect=None, status=200):
+        self.url = url
+        self.method = method
+        self.budget = budget
+        # Status atteso di ogni chiamata
+        self.status = status
+        self.build = build or (lambda ctx, i: {})
+        self.auth = auth
+        # collect(ctx, data): salva nel contesto i dati della risposta (id creati, ...)
+        self.collect = collect
+
+    @property
+    def name(self):
+        return f'{self.method.upper()} {self.url}'
+
+def _cycle(key):
+    # Valori diversi a ogni chiamata: la prima lettura di ognuno non è in cache
+    return lambda ctx, i: {'uid': ctx[key][i % len(ctx[key])]}
+
+def _take(key, build):
+    # Un elemento per chiamata, finché ce ne sono
+    return lambda ctx, i: build(ctx, ctx[key][i]) if i < len(ctx[key]) else None
+
+def _game(ctx, i, game):
+    return {'player1_uid': ctx['uid'], 'player2_uid': ctx['others'][i % len(ctx['others'])],
+            'mode': 'local', 'p1_score': 5 if game == 'pong' else 1, 'p2_score': i % 5 if game == 'pong' else 0}
+
+def _batch(game):
+    return lambda ctx, i: {'games': [_game(ctx, i * BATCH_GAMES + n, game) for n in range(BATCH_GAMES)]}
+
+def _stats(ctx, i):
+    return {'uid': ctx['uid'], 'from': ctx['year_ago']}
+
+def _tournament(ctx, i):
+    others = ctx['others']
+    first = i * TOURNAMENT_PLAYERS % len(others)
+    players = (others * 2)[first:first + TOURNAMENT_PLAYERS - 1]
+    return {'game': 'pong', 'name': f'Bench {i}', 'players': [ctx['uid']] + players}
+
+def _open_pairings(ctx, i):
+    if 'pairings' not in ctx:
+        ctx['pairings'] = list(Pairing.objects.filter(
+            tournament_id=ctx['tournaments'][0], entry2__isnull=False, winner__isnull=True
+        ).order_by('id').values_list('id', flat=True))
+    if i >= len(ctx['pairings']):
+        return None
+    return {'pairing_id': ctx['pairings'][i], 'p1_score': 5, 'p2_score': i % 5}
+
+def _first_tournament(ctx, i):
+    return {'id': ctx['tournaments'][0]} if ctx['tournaments'] else None
+
+def _collect_tournament(ctx, data):
+    ctx['tournaments'].append(data['data']['id'])
+
+# Budget: il massimo di query di una chiamata, a cache vuota, misurato sul codice attuale.
+# Status atteso: 200, 201 per le creazioni.
+# In ordine: i tornei creati servono ai turni, i turni ai risultati
+SCENARIOS = [
+    Scenario('is_authenticated', 'get', 1),
+    Scenario('csrf_token', 'get', 0, auth='anonymous'),
+    Scenario('signup', 'post', 10, lambda ctx, i: {
+        'username': 'signup', 'email': f'signup{ctx["run"]}-{i}@{EMAIL_DOMAIN}', 'password': PASSWORD
+    }, auth='anonymous', status=201),
+    Scenario('login', 'post', 7, lambda ctx, i: {'email': ctx['email'], 'password': PASSWORD}, auth='anonymous'),
+    Scenario('login', 'get', 1, auth='session'),
+    Scenario('login_guest', 'post', 1, lambda ctx, i: {'email': ctx['guest_email'], 'password': PASSWORD}),
+    Scenario('logout', 'post', 3, auth='session'),
+    Scenario('info', 'get', 1, _cycle('friends')),
+    Scenario('info', 'put', 2, lambda ctx, i: {'description': f'Benchmark description {i}'}),
+    Scenario('presence_heartbeat', 'post', 1),
+    Scenario('friend', 'get', 2),
+    Scenario('friend_request', 'get', 2),
+    Scenario('friend_request', 'post', 3, _take('strangers', lambda ctx, uid: {
+        'emitter-uid': ctx['uid'], 'receiver-uid': uid
+    }), status=201),
+    Scenario('friend_request', 'put', 3, _take('requesters', lambda ctx, uid: {
+        'emitter-uid': uid, 'status': 'accepted'
+    })),
+    Scenario('pong_info', 'get', 2, _cycle('others')),
+    Scenario('pong_info', 'post', 2, lambda ctx, i: {'uid': ctx['uid']}),
+    Scenario('pong_games', 'get', 3, lambda ctx, i: {'uid': ctx['uid']}),
+    Scenario('pong_games', 'post', 11, lambda ctx, i: _game(ctx, i, 'pong'), status=201),
+    Scenario('pong_games_batch', 'post', BATCH_BUDGET, _batch('pong'), status=201),
+    Scenario('pong_stats', 'get', 2, _stats),
+    Scenario('pong_leaderboard', 'get', 1, lambda ctx, i: {'page': i % 5 + 1}),
+    Scenario('pong_leaderboard', 'get', 1, _cycle('others')),
+    Scenario('tris', 'get', 2, _cycle('others')),
+    Scenario('tris', 'post', 2, lambda ctx, i: {'uid': ctx['uid']}),
+    Scenario('tris_games', 'get', 3, lambda ctx, i: {'uid': ctx['uid']}),
+    Scenario('tris_games', 'post', 11, lambda ctx, i: _game(ctx, i, 'tris'), status=201),
+    Scenario('tris_games_batch', 'post', BATCH_BUDGET, _batch('tris'), status=201),
+    Scenario('tris_stats', 'get', 2, _stats),
+    Scenario('tris_bot_move', 'post', 0, lambda ctx, i: {'board': TRIS_BOARD, 'player': 'O'}),
+    Scenario('tris_leaderboard', 'get', 1, lambda ctx, i: {'page': i % 5 + 1}),
+    Scenario('search_player', 'get', 1, lambda ctx, i: {'username': f'bench{i % 100}'}),
+    Scenario('tournament', 'post', 6, _tournament, collect=_collect_tournament, status=201),
+    Scenario('tournament_round', 'post', 9, _take('tournaments', lambda ctx, id: {'id': id}), status=201),
+    Scenario('tournament', 'get', 2, _first_tournament),
+    Scenario('tournament_result', 'post', 19, _open_pairings, status=201),
+    Scenario('tournament_standings', 'get', 2, _first_tournament),
+    Scenario('metrics', 'get', 1, auth='admin'),
+]
+
+def _basic(email):
+    return 'Basic ' + base64.b64encode(f'{email}:{PASSWORD}'.encode()).decode()
+
+class Command(BaseCommand):
+    help = 'Measure query count, latency and memory of every authn endpoint and check the query budgets'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50, help='Calls per scenario')
+        parser.add_argument('--only', help='Only the scenarios whose route name contains this text')
+        parser.add_argument('--output', help='Also write the results to this JSON file')
+
+    def handle(self, *args, **options):
+        covered = {scenario.url for scenario in SCENARIOS}
+        missing = [pattern.name for pattern in urls.urlpatterns if pattern.name not in covered]
+        if missing:
+            raise CommandError(f'No benchmark scenario for: {", ".join(missing)}')
+
+        # Il test client usa l'host 'testserver'
+        with override_settings(ALLOWED_HOSTS=['*']):
+            ctx = self.context()
+            self.stdout.write(f'Benchmark player {ctx["uid"]} ({ctx["matches"]} pong matches), '
+                              f'{options["requests"]} calls per scenario')
+            self.stdout.write(f'{"scenario":<34} {"status":<14} {"queries":>9} {"p50 ms":>8} {"p99 ms":>8} '
+                              f'{"peak KiB":>9}')
+            results, failures = [], []
+            for scenario in SCENARIOS:
+                if options['only'] and options['only'] not in scenario.url:
+                    continue
+                result = self.run(scenario, ctx, options['requests'])
+                results.append(result)
+                self.report(result)
+                if result['queries'] > scenario.budget:
+                    failures.append(f'{scenario.name}: {result["queries"]} queries (budget {scenario.budget})')
+                if set(result['status']) - {scenario.status}:
+                    failures.append(f'{scenario.name}: status {result["status"]} (expected {scenario.status})')
+
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump(results, file, indent=2)
+        if failures:
+            raise CommandError('Benchmark failed:\n' + '\n'.join(failures))
+        self.stdout.write(self.style.SUCCESS(f'{len(results)} scenarios within their query budgets and with the expected status'))
+
+    def context(self):
+        """Users and data shared by the scenarios."""
+        heaviest = Player.objects.filter(game_type='pong', user__email__endswith=f'@{EMAIL_DOMAIN}') \
+            .exclude(user__email=ADMIN_EMAIL).select_related('user').order_by('-TOTP').first()
+        if heaviest is None:
+            raise CommandError('No benchmark data: run seed_benchmark first')
+        user = heaviest.user
+        sample = list(User.objects.filter(email__endswith=f'@{EMAIL_DOMAIN}').exclude(pk=user.pk)
+                      .exclude(email=ADMIN_EMAIL).order_by('id').values_list('id', 'uid', 'email')[:SAMPLE_USERS * 3])
+        linked = set(Friendship.objects.filter(sender=user).values_list('receiver_id', flat=True))
+        linked |= set(Friendship.objects.filter(receiver=user).values_list('sender_id', flat=True))
+        strangers = [(pk, uid) for pk, uid, _ in sample if pk not in linked]
+        # Richieste in attesa verso l'utente, accettate dallo scenario PUT
+        requesters = strangers[SAMPLE_USERS:SAMPLE_USERS * 2]
+        Friendship.objects.bulk_create([Friendship(sender_id=pk, receiver=user) for pk, _ in requesters],
+                                       ignore_conflicts=True)
+        friends = list(User.objects.filter(pk__in=linked).values_list('uid', flat=True)[:SAMPLE_USERS])
+
+        if not User.objects.filter(email=ADMIN_EMAIL).exists():
+            User.objects.create_superuser(email=ADMIN_EMAIL, username='benchadmin', password=PASSWORD)
+        return {
+            'run': time.time_ns(),
+            'user': user,
+            'uid': user.uid,
+            'email': user.email,
+            'matches': heaviest.TOTP,
+            'guest_email': sample[0][2],
+            'others': [uid for _, uid, _ in sample[:SAMPLE_USERS]],
+            'friends': friends or [user.uid],
+            'strangers': [uid for _, uid in strangers[:SAMPLE_USERS]],
+            'requesters': [uid for _, uid in requesters],
+            'year_ago': (timezone.localdate() - timedelta(days=365)).isoformat(),
+            'tournaments': [],
+        }
+
+    def client(self, auth, ctx):
+        if auth == 'basic':
+            return Client(HTTP_AUTHORIZATION=_basic(ctx['email']))
+        if auth == 'admin':
+            return Client(HTTP_AUTHORIZATION=_basic(ADMIN_EMAIL))
+        client = Client()
+        if auth == 'session':
+            client.force_login(ctx['user'])
+        return client
+
+    def call(self, client, scenario, payload):
+        path = reverse(scenario.url)
+        if scenario.method == 'get':
+            return client.get(path, payload, secure=True)
+        return getattr(client, scenario.method)(path, payload, content_type='application/json', secure=True)
+
+    def run(self, scenario, ctx, requests):
+        latencies, statuses, queries, peak = [], Counter(), 0, 0
+        # Client condiviso per le chiamate autenticate: sessione e cache come un client reale
+        shared = self.client(scenario.auth, ctx) if scenario.auth in ('basic', 'admin') else None
+        for i in range(requests):
+            payload = scenario.build(ctx, i)
+            if payload is None:
+                break
+            client = shared or self.client(scenario.auth, ctx)
+            cold = i == 0
+            if cold:
+                tracemalloc.start()
+            start = time.perf_counter()
+            response = self.call(client, scenario, payload)
+            elapsed = time.perf_counter() - start
+            if cold:
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+            else:
+                # La prima chiamata, tracciata da tracemalloc, non conta per la latenza
+                latencies.append(elapsed)
+            statuses[response.status_code] += 1
+            queries = max(queries, getattr(response.wsgi_request, 'db_queries', 0))
+            if scenario.collect and response.status_code < 300:
+                scenario.collect(ctx, json.loads(response.content))
+
+        p50, p99 = np.percentile(latencies, [50, 99]) * 1000 if latencies else (float('nan'), float('nan'))
+        return {
+            'scenario': scenario.name,
+            'calls': sum(statuses.values()),
+            'status': dict(statuses),
+            'queries': queries,
+            'budget': scenario.budget,
+            'expected_status': scenario.status,
+            'p50_ms': round(float(p50), 2),
+            'p99_ms': round(float(p99), 2),
+            'peak_kib': round(peak / 1024),
+        }
+
+    def report(self, result):
+        status = ','.join(f'{code}x{count}' for code, count in sorted(result['status'].items()))
+        line = (f'{result["scenario"]:<34} {status:<14} {result["queries"]:>4}/{result["budget"]:<4} '
+                f'{result["p50_ms"]:>8.2f} {result["p99_ms"]:>8.2f} {result["peak_kib"]:>9}')
+        failed = result['queries'] > result['budget'] or set(result['status']) - {result['expected_status']}
+        self.stdout.write(self.style.ERROR(line) if failed else line)
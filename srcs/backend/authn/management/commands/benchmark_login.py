@@ -0,0 +1,86 @@
+"""
+Description: Benchmark of the login credentials check, old path against the new one.
+
+Main content:
+1. class: Command(BaseCommand)
+
+Usage: python manage.py benchmark_login --users 200 --logins 200 --threads 4 [--cleanup]
+Creates --users accounts with the configured hasher, then runs --logins checks
+on --threads threads with the old Login.post sequence (query, check_password,
+authenticate: two queries and two hashes) and with passwords.check_login (one
+query, one hash on HASH_EXECUTOR). Reports logins per second and per core.
+Run it against a development database only.
+"""
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.contrib.auth import authenticate
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from authn.models import User
+from authn.passwords import check_login, hash_workers
+
+EMAIL_DOMAIN = 'login-bench.local'
+PASSWORD = 'Sp33dy-Login!'
+
+def legacy_login(email, password):
+    # Sequenza della vecchia Login.post
+    user = User.objects.get(email=email)
+    if not user.check_password(password):
+        return None
+    return authenticate(email=email, password=password)
+
+def new_login(email, password):
+    user, _ = check_login(email, password)
+    return user
+
+class Command(BaseCommand):
+    help = 'Measure logins per second per core with the old and the new credentials check'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200, help='Accounts to log in with')
+        parser.add_argument('--logins', type=int, default=200, help='Logins to measure for each path')
+        parser.add_argument('--threads', type=int, default=os.cpu_count() or 1, help='Concurrent request threads')
+        parser.add_argument('--cleanup', action='store_true', help='Delete the benchmark users at the end')
+
+    def handle(self, *args, **options):
+        emails = self.seed(options['users'])
+        threads = options['threads']
+        # Core effettivamente usati: i thread o il pool di hash, il minore
+        workers = hash_workers()
+        cores = min(threads, os.cpu_count() or 1, workers)
+        self.stdout.write(f'{threads} threads, {workers} hash workers, {cores} cores used')
+
+        for label, login in (('before', legacy_login), ('after', new_login)):
+            elapsed = self.measure(login, emails, options['logins'], threads)
+            rate = options['logins'] / elapsed
+            self.stdout.write(f'{label}: {rate:.1f} logins/s, {rate / cores:.1f} logins/s per core '
+                              f'({elapsed / options["logins"] * 1000:.1f} ms each)')
+
+        if options['cleanup']:
+            deleted, _ = User.objects.filter(email__endswith=f'@{EMAIL_DOMAIN}').delete()
+            self.stdout.write(f'Deleted {deleted} rows')
+
+    def seed(self, count):
+        emails = [f'user{i}@{EMAIL_DOMAIN}' for i in range(count)]
+        existing = set(User.objects.filter(email__in=emails).values_list('email', flat=True))
+        missing = [email for email in emails if email not in existing]
+        if missing:
+            password = make_password(PASSWORD)
+            User.objects.bulk_create([
+                User(email=email, username=f'lbench{i}', password=password, uid=f'lbench{i}#0000')
+                for i, email in enumerate(missing, start=len(existing))
+            ])
+            self.stdout.write(f'Seeded {len(missing)} users')
+        return emails
+
+    def measure(self, login, emails, logins, threads):
+        def run(index):
+            if login(emails[index % len(emails)], PASSWORD) is None:
+                raise RuntimeError('Login failed')
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            list(executor.map(run, range(logins)))
+        return time.perf_counter() - start
@@ -0,0 +1,78 @@
+"""
+Description: Benchmark of the server-side Pong engine.
+
+Main content:
+1. class: Command(BaseCommand)
+
+Usage: python manage.py benchmark_pong --rooms 2000 --ticks 600 [--loop 10]
+Steps --rooms bot matches for --ticks frames (simulation and state encoding
+only) and reports the cost of one room-tick and how many rooms one core can
+keep at 60 Hz. With --loop it also runs the real room loop for that many
+seconds with fake sockets and reports late and dropped ticks.
+"""
+
+import asyncio
+import json
+import time
+from django.core.management.base import BaseCommand
+from authn.pong_engine import PongState, TICK_RATE, PADDLE_HEIGHT, step
+from authn.pong_rooms import RoomManager
+
+class _NullSocket:
+    __slots__ = ('sent',)
+
+    def __init__(self):
+        self.sent = 0
+
+    async def send(self, text_data=None, bytes_data=None):
+        self.sent += 1
+
+class Command(BaseCommand):
+    help = 'Measure how many Pong rooms one core can simulate at 60 Hz'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rooms', type=int, default=2000, help='Concurrent rooms')
+        parser.add_argument('--ticks', type=int, default=600, help='Frames simulated per room')
+        parser.add_argument('--loop', type=float, default=0, help='Seconds of real 60 Hz loop to run')
+
+    def handle(self, *args, **options):
+        self.measure_steps(options['rooms'], options['ticks'])
+        if options['loop']:
+            asyncio.run(self.measure_loop(options['rooms'], options['loop']))
+
+    def measure_steps(self, rooms, ticks):
+        # Partite che non finiscono: il costo per tick resta costante
+        states = [PongState(bot=True, seed=n, winning_score=10 ** 9) for n in range(rooms)]
+        start = time.perf_counter()
+        for _ in range(ticks):
+            for state in states:
+                # Il giocatore 1 segue la palla, così gli scambi durano
+                state.set_direction(1, (state.ball.y > state.player1.y + PADDLE_HEIGHT / 2) -
+                                    (state.ball.y < state.player1.y + PADDLE_HEIGHT / 2))
+                step(state)
+                json.dumps({'type': 'state', 'data': state.snapshot()}, separators=(',', ':'))
+        elapsed = time.perf_counter() - start
+
+        per_room_tick = elapsed / (rooms * ticks)
+        self.stdout.write(f'{rooms} rooms x {ticks} ticks in {elapsed:.2f}s')
+        self.stdout.write(f'{per_room_tick * 1e6:.2f} us per room-tick (step + state encoding)')
+        self.stdout.write(f'~{int(1 / (per_room_tick * TICK_RATE))} rooms per core at {TICK_RATE} Hz')
+
+    async def measure_loop(self, rooms, seconds):
+        manager = RoomManager(record=False)
+        sockets = []
+        for n in range(rooms):
+            socket = _NullSocket()
+            sockets.append(socket)
+            await manager.join(f'bench{n}', socket, f'bench{n}', mode='bot', winning_score=10 ** 9)
+
+        start = time.perf_counter()
+        await asyncio.sleep(seconds)
+        elapsed = time.perf_counter() - start
+        frames = sum(socket.sent for socket in sockets)
+        for n, socket in enumerate(sockets):
+            await manager.leave(f'bench{n}', socket)
+
+        expected = int(elapsed * TICK_RATE)
+        self.stdout.write(f'Loop: {manager.ticks}/{expected} ticks in {elapsed:.2f}s, '
+                          f'{manager.late_ticks} late, {manager.dropped_ticks} dropped, {frames} frames sent')
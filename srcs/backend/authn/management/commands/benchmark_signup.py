@@ -0,0 +1,100 @@
+"""
+Description: Benchmark of signup throughput with a large user table.
+
+Main content:
+1. class: Command(BaseCommand)
+
+Usage: python manage.py benchmark_signup --users 1000000 --signups 2000 [--fast-hasher] [--cleanup]
+Seeds --users accounts with bulk inserts (if not already there), then measures
+--signups calls to User.objects.create_user and to the uid allocator alone.
+Run it against a development database only.
+"""
+
+import time
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+from authn.models import User, DiscriminatorPool
+from authn.uids import ALLOCATOR, GLOBAL_SCOPE, space_size, permute
+
+EMAIL_DOMAIN = 'bench.local'
+NAMES = 5000
+BATCH_SIZE = 10000
+
+class Command(BaseCommand):
+    help = 'Seed a large user table and measure signup and uid allocation throughput'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000000, help='Users to seed before measuring')
+        parser.add_argument('--signups', type=int, default=2000, help='Signups to measure')
+        parser.add_argument('--fast-hasher', action='store_true', help='Use MD5 hashing to measure the allocator, not the KDF')
+        parser.add_argument('--cleanup', action='store_true', help='Delete the benchmark users at the end')
+
+    def handle(self, *args, **options):
+        self.seed(options['users'])
+        if options['fast_hasher']:
+            with override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher']):
+                self.measure(options['signups'])
+        else:
+            self.measure(options['signups'])
+        if options['cleanup']:
+            deleted, _ = User.objects.filter(email__endswith=f'@{EMAIL_DOMAIN}').delete()
+            DiscriminatorPool.objects.filter(scope__startswith='bench').delete()
+            self.stdout.write(f'Deleted {deleted} rows')
+
+    def seed(self, count):
+        existing = User.objects.filter(email__endswith=f'@{EMAIL_DOMAIN}').count()
+        if existing >= count:
+            self.stdout.write(f'{existing} benchmark users already present')
+            return
+
+        # Stessa sequenza del pool: gli uid seminati sono quelli che l'allocatore avrebbe assegnato
+        password = make_password('bench-password')
+        is_global = getattr(settings, 'UID_POOL_SCOPE', 'username') == 'global'
+        pools = {
+            pool.scope: (pool.width, pool.next_value)
+            for pool in DiscriminatorPool.objects.filter(scope__in=[GLOBAL_SCOPE] + [f'bench{n}' for n in range(NAMES)])
+        }
+        start = time.perf_counter()
+        users = []
+        for i in range(existing, count):
+            username = f'bench{i % NAMES}'
+            scope = GLOBAL_SCOPE if is_global else username
+            width, counter = pools.get(scope, (4, 0))
+            if counter >= space_size(width):
+                width, counter = width + 1, 0
+            pools[scope] = (width, counter + 1)
+            users.append(User(
+                email=f'user{i}@{EMAIL_DOMAIN}',
+                username=username,
+                password=password,
+                uid=f'{username}#{permute(counter, width)}'
+            ))
+            if len(users) >= BATCH_SIZE:
+                User.objects.bulk_create(users)
+                users = []
+        if users:
+            User.objects.bulk_create(users)
+        for scope, (width, counter) in pools.items():
+            DiscriminatorPool.objects.update_or_create(scope=scope, defaults={'width': width, 'next_value': counter})
+        self.stdout.write(f'Seeded {count - existing} users in {time.perf_counter() - start:.1f}s')
+
+    def measure(self, signups):
+        offset = User.objects.filter(email__endswith=f'@{EMAIL_DOMAIN}').count()
+
+        start = time.perf_counter()
+        for i in range(signups):
+            ALLOCATOR.allocate(f'bench{i % NAMES}')
+        elapsed = time.perf_counter() - start
+        self.stdout.write(f'uid allocation: {signups / elapsed:.0f}/s ({elapsed / signups * 1000:.2f} ms each)')
+
+        start = time.perf_counter()
+        for i in range(signups):
+            User.objects.create_user(
+                email=f'user{offset + i}@{EMAIL_DOMAIN}',
+                username=f'bench{i % NAMES}',
+                password='Sp33dy-Signup!'
+            )
+        elapsed = time.perf_counter() - start
+        self.stdout.write(f'signup: {signups / elapsed:.0f}/s ({elapsed / signups * 1000:.2f} ms each)')
@@ -0,0 +1,58 @@
+"""
+Description: Benchmark of the Tris bot.
+
+Main content:
+1. class: Command(BaseCommand)
+
+Usage: python manage.py benchmark_tris --games 2000 [--rows 4 --cols 4 --k 3]
+Plays --games bot-vs-bot rounds and reports moves per second: on 3x3 with the
+precomputed table (plus the time to build it), on other sizes with the
+alpha-beta solver and its transposition cache.
+"""
+
+import random
+import time
+from django.core.management.base import BaseCommand
+from authn.tris_solver import TRIS_TABLE, DIFFICULTIES, get_solver
+
+class Command(BaseCommand):
+    help = 'Measure the moves per second of the Tris bot'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--games', type=int, default=2000, help='Rounds to play')
+        parser.add_argument('--rows', type=int, default=3)
+        parser.add_argument('--cols', type=int, default=3)
+        parser.add_argument('--k', type=int, default=3)
+        parser.add_argument('--difficulty', default='perfect', choices=list(DIFFICULTIES))
+
+    def handle(self, *args, **options):
+        rows, cols, k = options['rows'], options['cols'], options['k']
+        if (rows, cols, k) == (3, 3, 3):
+            start = time.perf_counter()
+            positions = len(TRIS_TABLE)
+            self.stdout.write(f'Table built in {time.perf_counter() - start:.3f}s ({positions} canonical positions)')
+            solver = TRIS_TABLE
+        else:
+            solver = get_solver(rows, cols, k)
+
+        rng = random.Random(42)
+        geometry = solver.geometry
+        moves, results = 0, {'win': 0, 'draw': 0}
+        start = time.perf_counter()
+        for _ in range(options['games']):
+            own = opp = 0
+            while True:
+                cell = solver.move(own, opp, options['difficulty'], rng)
+                if cell is None:
+                    results['draw'] += 1
+                    break
+                moves += 1
+                own |= 1 << cell
+                if geometry.wins(own, cell):
+                    results['win'] += 1
+                    break
+                own, opp = opp, own
+        elapsed = time.perf_counter() - start
+
+        self.stdout.write(f'{rows}x{cols} k={k}: {moves} moves in {elapsed:.2f}s, '
+                          f'{moves / elapsed:.0f} moves/s ({results["win"]} decisive, {results["draw"]} draws)')
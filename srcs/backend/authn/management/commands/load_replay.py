@@ -0,0 +1,319 @@
+"""
+Description: Load generator that replays the Postman collection with concurrent virtual users.
+
+Main content:
+1. function: load_collection(path, strip_prefix)
+2. class: Stats
+3. class: Command(BaseCommand)
+
+Usage: python manage.py load_replay [--base-url https://localhost:8000] [--users 50] [--duration 60]
+       [--ramp-up 10] [--weight Auth/200_OK=5] [--exclude update-password] [--insecure] [--output results.json]
+Every folder of the collection that directly holds requests is a scenario (for example
+'Auth/200_OK' is the journey login -> user info -> logout). Each virtual user has its
+own session and account: it runs the '201_CREATED' scenarios once (signup,
+players), then picks scenarios by weight until --duration ends, with --think-time
+between the requests. By default every scenario expecting a 2xx has weight 1 and
+the error scenarios weight 0; --weight NAME=W sets the weight of the scenarios
+whose name starts with NAME.
+
+The collection targets the frontend proxy (/auth/...): --strip-prefix maps its
+URLs to the backend routes, and the requests that match no route of the current
+URLconf are listed and skipped. The example account of the collection
+(example@example.com, example, 3X4mpl3:ex, the uid query parameters) is replaced
+by the account of each virtual user; {{email}}, {{username}}, {{password}}, {{uid}}
+and {{vu}} can also be used in the collection. Unsafe requests carry the CSRF
+cookie in X-CSRFToken and the frontend Origin, like the browser.
+
+The report has, per request: calls, throughput, error rate (status different
+from the one of its folder, e.g. '401_UNAUTHORIZED', or >= 400 without one),
+p50/p90/p99/max latency and the statuses received.
+"""
+
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from urllib.parse import urlsplit, parse_qsl, urlencode
+import numpy as np
+import requests
+import urllib3
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import Resolver404, resolve
+
+DEFAULT_COLLECTION = settings.BASE_DIR.parent.parent / 'config' / 'test' / 'integration' / \
+    'ft_transcendence.postman_collection.json'
+EXPECTED_STATUS = re.compile(r'^(\d{3})_')
+VARIABLE = re.compile(r'\{\{(\w+)\}\}')
+# Account di esempio della collection -> variabili dell'utente virtuale
+LITERALS = {'example@example.com': '{{email}}', 'example': '{{username}}', '3X4mpl3:ex': '{{password}}'}
+EXAMPLE_UID = re.compile(r'^example#\d+$')
+UNSAFE_METHODS = ('POST', 'PUT', 'PATCH', 'DELETE')
+REQUEST_TIMEOUT = 30
+
+def _raw_url(url):
+    return url.get('raw', '') if isinstance(url, dict) else (url or '')
+
+def _template(value):
+    if isinstance(value, str):
+        return '{{uid}}' if EXAMPLE_UID.match(value) else LITERALS.get(value, value)
+    if isinstance(value, dict):
+        return {key: _template(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_template(item) for item in value]
+    return value
+
+def _route(path):
+    """Backend path of a collection path, or None if no route matches."""
+    for candidate in (path, path.rstrip('/') + '/'):
+        try:
+            resolve(candidate)
+            return candidate
+        except Resolver404:
+            continue
+    return None
+
+def load_collection(path, strip_prefix):
+    """Return ({scenario: [request, ...]}, [skipped request names]) of a Postman collection (v2.x)."""
+    try:
+        with open(path, encoding='utf-8-sig') as file:
+            collection = json.load(file)
+    except (OSError, ValueError) as e:
+        raise CommandError(f'Cannot read the collection: {e}')
+
+    scenarios, skipped = {}, []
+
+    def walk(items, folders, expected):
+        for item in items:
+            if 'item' in item:
+                match = EXPECTED_STATUS.match(item['name'])
+                walk(item['item'], folders + [item['name']], int(match.group(1)) if match else expected)
+                continue
+            scenario = '/'.join(folders)
+            name = f'{scenario}/{item["name"]}'
+            request = item.get('request', {})
+            url = urlsplit(_raw_url(request.get('url')))
+            path = url.path
+            if strip_prefix and path.startswith(strip_prefix):
+                path = path[len(strip_prefix):] or '/'
+            route = _route(path) if url.path else None
+            if route is None:
+                skipped.append(f'{request.get("method", "GET")} {url.path or "(no url)"} ({name})')
+                continue
+            body = request.get('body', {}).get('raw') or None
+            if body:
+                try:
+                    body = _template(json.loads(body))
+                except ValueError:
+                    pass
+            scenarios.setdefault(scenario, []).append({
+                'name': name,
+                'method': request.get('method', 'GET').upper(),
+                'path': route,
+                # Il parametro uid è sempre l'utente virtuale (gli uid della collection non esistono più)
+                'query': [(key, '{{uid}}' if key == 'uid' and value else _template(value))
+                          for key, value in parse_qsl(url.query, keep_blank_values=True)],
+                # Il token CSRF della collection è scaduto: si usa quello della sessione
+                'headers': {header['key']: header['value'] for header in request.get('header', [])
+                            if not header.get('disabled') and header['key'].lower() != 'x-csrftoken'},
+                'body': body,
+                'expected': expected,
+            })
+
+    walk(collection.get('item', []), [], None)
+    return scenarios, skipped
+
+def _substitute(value, variables):
+    if isinstance(value, str):
+        return VARIABLE.sub(lambda match: str(variables.get(match.group(1), match.group(0))), value)
+    if isinstance(value, dict):
+        return {key: _substitute(item, variables) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_substitute(item, variables) for item in value]
+    return value
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+        self.errors = Counter()
+
+    def record(self, name, status, elapsed, error):
+        with self.lock:
+            self.latencies[name].append(elapsed)
+            self.statuses[name][status] += 1
+            if error:
+                self.errors[name] += 1
+
+    def summary(self, name, duration):
+        latencies = np.array(self.latencies[name]) * 1000
+        p50, p90, p99 = np.percentile(latencies, [50, 90, 99])
+        return {
+            'request': name,
+            'calls': len(latencies),
+            'rps': round(len(latencies) / duration, 2),
+            'error_rate': round(self.errors[name] / len(latencies), 4),
+            'p50_ms': round(float(p50), 2),
+            'p90_ms': round(float(p90), 2),
+            'p99_ms': round(float(p99), 2),
+            'max_ms': round(float(latencies.max()), 2),
+            'status': {str(code): count for code, count in sorted(self.statuses[name].items())},
+        }
+
+class Command(BaseCommand):
+    help = 'Replay the Postman collection against a running backend with concurrent virtual users'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--collection', default=str(DEFAULT_COLLECTION), help='Postman collection (v2.x)')
+        parser.add_argument('--base-url', default='https://localhost:8000', help='Backend to load')
+        parser.add_argument('--strip-prefix', default='/auth', help='Proxy prefix removed from the collection paths')
+        parser.add_argument('--origin', default='https://localhost:3000', help='Origin of the unsafe requests (CSRF)')
+        parser.add_argument('--users', type=int, default=20, help='Concurrent virtual users')
+        parser.add_argument('--duration', type=float, default=60, help='Seconds of load')
+        parser.add_argument('--ramp-up', type=float, default=0, help='Seconds to start all the users')
+        parser.add_argument('--think-time', type=float, default=0, help='Seconds between two requests of a user')
+        parser.add_argument('--weight', action='append', default=[], help='SCENARIO_PREFIX=WEIGHT (repeatable)')
+        parser.add_argument('--exclude', action='append', default=[], help='Skip the requests whose name contains this')
+        parser.add_argument('--insecure', action='store_true', help="Don't verify the TLS certificate")
+        parser.add_argument('--seed', type=int, help='Random seed of the scenario choice')
+        parser.add_argument('--output', help='Also write the results to this JSON file')
+
+    def handle(self, *args, **options):
+        scenarios, skipped = load_collection(options['collection'], options['strip_prefix'])
+        for name in skipped:
+            self.stdout.write(self.style.WARNING(f'Skipped, no matching route: {name}'))
+        for scenario, items in scenarios.items():
+            scenarios[scenario] = [item for item in items
+                                   if not any(text in item['name'] for text in options['exclude'])]
+
+        setup = [item for scenario, items in scenarios.items() if scenario.endswith('201_CREATED') for item in items]
+        weights = self.weights(scenarios, options['weight'])
+        mix = [(scenario, weight) for scenario, weight in weights.items() if weight > 0 and scenarios[scenario]]
+        if not mix:
+            raise CommandError('No scenario with a positive weight')
+        self.stdout.write('Scenarios: ' + ', '.join(f'{scenario} x{weight:g}' for scenario, weight in mix))
+
+        if options['insecure']:
+            urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+        self.options = options
+        self.stats = Stats()
+        self.run_id = time.time_ns()
+        rng = random.Random(options['seed'])
+        start = time.perf_counter()
+        self.deadline = start + options['ramp_up'] + options['duration']
+        threads = []
+        for vu in range(options['users']):
+            delay = options['ramp_up'] * vu / options['users']
+            thread = threading.Thread(target=self.virtual_user,
+                                      args=(vu, delay, setup, [(scenarios[name], weight) for name, weight in mix],
+                                            rng.random()),
+                                      name=f'vu{vu}', daemon=True)
+            thread.start()
+            threads.append(thread)
+        for thread in threads:
+            thread.join()
+        self.report(time.perf_counter() - start, options['output'])
+
+    def weights(self, scenarios, overrides):
+        weights = {}
+        for scenario, items in scenarios.items():
+            expected = items[0]['expected'] if items else None
+            weights[scenario] = 1.0 if expected is None or expected < 300 else 0.0
+            if scenario.endswith('201_CREATED'):
+                # Eseguiti una volta per utente, all'avvio
+                weights[scenario] = 0.0
+        for override in overrides:
+            prefix, _, value = override.partition('=')
+            try:
+                value = float(value)
+            except ValueError:
+                raise CommandError(f'Invalid weight: {override}')
+            for scenario in scenarios:
+                if scenario.startswith(prefix):
+                    weights[scenario] = value
+        return weights
+
+    def virtual_user(self, vu, delay, setup, mix, seed):
+        time.sleep(delay)
+        rng = random.Random(seed)
+        session = requests.Session()
+        origin = self.options['origin']
+        session.headers.update({'Origin': origin, 'Referer': f'{origin}/'})
+        variables = {
+            'vu': vu,
+            'email': f'load{self.run_id}-{vu}@load.local',
+            'username': f'load{vu % 100000}'[:10],
+            'password': f'L0ad-{self.run_id % 1000000}!',
+            'uid': '',
+        }
+        # Cookie CSRF (non misurato), poi registrazione e giocatori
+        self.send(session, {'name': None, 'method': 'GET', 'path': '/csrf-token/', 'query': [], 'headers': {},
+                            'body': None, 'expected': 200}, variables)
+        for item in setup:
+            self.send(session, item, variables)
+        journeys, weights = zip(*mix)
+        while time.perf_counter() < self.deadline:
+            for item in rng.choices(journeys, weights)[0]:
+                if time.perf_counter() >= self.deadline:
+                    break
+                self.send(session, item, variables)
+                if self.options['think_time']:
+                    time.sleep(self.options['think_time'])
+
+    def send(self, session, item, variables):
+        method = item['method']
+        headers = _substitute(item['headers'], variables)
+        if method in UNSAFE_METHODS and 'csrftoken' in session.cookies:
+            headers['X-CSRFToken'] = session.cookies['csrftoken']
+        query = urlencode(_substitute(item['query'], variables))
+        url = self.options['base_url'].rstrip('/') + item['path'] + (f'?{query}' if query else '')
+        body = _substitute(item['body'], variables)
+        kwargs = {'json': body} if isinstance(body, (dict, list)) else {'data': body}
+
+        start = time.perf_counter()
+        try:
+            # verify per richiesta: Session.verify viene ignorato se è impostato REQUESTS_CA_BUNDLE
+            response = session.request(method, url, headers=headers, timeout=REQUEST_TIMEOUT,
+                                       verify=not self.options['insecure'], allow_redirects=False, **kwargs)
+            status = response.status_code
+        except requests.RequestException:
+            response, status = None, 0
+        elapsed = time.perf_counter() - start
+
+        if response is not None and not variables['uid']:
+            # uid dell'utente dalla prima risposta che lo contiene (login, is-authenticated)
+            try:
+                data = response.json().get('data')
+                if isinstance(data, dict) and data.get('uid'):
+                    variables['uid'] = data['uid']
+            except (ValueError, AttributeError):
+                pass
+        if item['name'] is not None:
+            expected = item['expected']
+            error = status == 0 or (status != expected if expected else status >= 400)
+            self.stats.record(item['name'], status, elapsed, error)
+
+    def report(self, duration, output):
+        names = list(self.stats.latencies)
+        if not names:
+            raise CommandError('No request completed')
+        results = [self.stats.summary(name, duration) for name in names]
+        width = max(len(name) for name in names)
+        self.stdout.write(f'{"request":<{width}} {"calls":>7} {"req/s":>8} {"errors":>7} {"p50 ms":>8} '
+                          f'{"p90 ms":>8} {"p99 ms":>8} {"max ms":>8}  status')
+        for result in results:
+            status = ','.join(f'{code}x{count}' for code, count in result['status'].items())
+            line = (f'{result["request"]:<{width}} {result["calls"]:>7} {result["rps"]:>8.1f} '
+                    f'{result["error_rate"]:>7.1%} {result["p50_ms"]:>8.1f} {result["p90_ms"]:>8.1f} '
+                    f'{result["p99_ms"]:>8.1f} {result["max_ms"]:>8.1f}  {status}')
+            self.stdout.write(self.style.ERROR(line) if result['error_rate'] else line)
+        calls = sum(result['calls'] for result in results)
+        errors = sum(self.stats.errors.values())
+        self.stdout.write(f'Total: {calls} requests in {duration:.1f}s, {calls / duration:.1f} req/s, '
+                          f'{errors / calls:.1%} errors')
+        if output:
+            with open(output, 'w') as file:
+                json.dump({'duration': duration, 'requests': results}, file, indent=2)
@@ -0,0 +1,152 @@
+"""
+Description: Monthly range partitioning of the Match table (PostgreSQL).
+
+Main content:
+1. class: Command(BaseCommand)
+
+Usage: python manage.py partition_matches [--ahead 3]
+The first run converts the table created by the migrations into a table
+partitioned by month on date. It also copies the existing rows and rebuilds
+the model indexes on the partitions. The primary key becomes (id, date), as
+PostgreSQL requires, and the ids keep coming from a sequence. Every run then
+creates the partitions of the current month and of the --ahead next ones.
+Rows that ended up in the default partition (dates outside every partition,
+e.g. imported history) are moved to the partitions of their months. Run it
+after migrate and then at least once a month (cron).
+"""
+
+from datetime import datetime, timezone as dt_timezone
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from authn.models import Match
+
+def month_start(moment):
+    return datetime(moment.year, moment.month, 1, tzinfo=dt_timezone.utc)
+
+def next_month(moment):
+    return month_start(datetime(moment.year + moment.month // 12, moment.month % 12 + 1, 1))
+
+def partition_name(table, month):
+    return f'{table}_y{month.year}m{month.month:02d}'
+
+def bound(moment):
+    return f"'{moment.isoformat()}'"
+
+class Command(BaseCommand):
+    help = 'Partition the Match table by month and create the partitions of the next months'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ahead', type=int, default=3, help='Months to create after the current one')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Match partitioning needs PostgreSQL')
+        table = Match._meta.db_table
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute('SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)', [table])
+            row = cursor.fetchone()
+            if row is None:
+                raise CommandError(f'{table} does not exist: run migrate first')
+            if row[0] != 'p':
+                self.convert(cursor, table)
+
+            month = month_start(datetime.now(dt_timezone.utc))
+            months = set()
+            for _ in range(options['ahead'] + 1):
+                months.add(month)
+                month = next_month(month)
+            # Prima il default: una partizione nuova non può coprire righe rimaste lì
+            moved = self.split_default(cursor, table)
+            created = self.create_partitions(cursor, table, months)
+        self.stdout.write(f'{table}: {created} partitions created, {moved} rows moved out of the default partition')
+
+    def existing(self, cursor, name):
+        cursor.execute('SELECT to_regclass(%s) IS NOT NULL', [name])
+        return cursor.fetchone()[0]
+
+    def create_partitions(self, cursor, table, months):
+        quote = connection.ops.quote_name
+        created = 0
+        for month in sorted(months):
+            name = partition_name(table, month)
+            if self.existing(cursor, name):
+                continue
+            cursor.execute(f'CREATE TABLE {quote(name)} PARTITION OF {quote(table)} '
+                           f'FOR VALUES FROM ({bound(month)}) TO ({bound(next_month(month))})')
+            created += 1
+        return created
+
+    def split_default(self, cursor, table):
+        """Move the rows of the default partition to the partitions of their months."""
+        quote = connection.ops.quote_name
+        default = f'{table}_default'
+        cursor.execute(f"SELECT DISTINCT date_trunc('month', date, 'UTC') FROM {quote(default)}")
+        moved = 0
+        for (month,) in cursor.fetchall():
+            month = month_start(month.astimezone(dt_timezone.utc))
+            name = partition_name(table, month)
+            # La partizione si aggancia solo quando il default non ha più righe del suo mese
+            cursor.execute(f'CREATE TABLE {quote(name)} (LIKE {quote(table)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)')
+            cursor.execute(
+                f'WITH rows AS (DELETE FROM {quote(default)} WHERE date >= %s AND date < %s RETURNING *) '
+                f'INSERT INTO {quote(name)} SELECT * FROM rows',
+                [month, next_month(month)]
+            )
+            moved += cursor.rowcount
+            cursor.execute(f'ALTER TABLE {quote(table)} ATTACH PARTITION {quote(name)} '
+                           f'FOR VALUES FROM ({bound(month)}) TO ({bound(next_month(month))})')
+        return moved
+
+    def convert(self, cursor, table):
+        """Replace the plain table with a partitioned one holding the same rows."""
+        quote = connection.ops.quote_name
+        old = f'{table}_unpartitioned'
+        self.stdout.write(f'Converting {table} to a partitioned table...')
+        cursor.execute(f'LOCK TABLE {quote(table)} IN ACCESS EXCLUSIVE MODE')
+
+        # Le FK verso Match (id da solo non è più univoco) e gli indici da ricreare
+        cursor.execute(
+            'SELECT conrelid::regclass::text, conname FROM pg_constraint '
+            'WHERE confrelid = to_regclass(%s) AND contype = %s', [table, 'f']
+        )
+        for referencing, name in cursor.fetchall():
+            cursor.execute(f'ALTER TABLE {referencing} DROP CONSTRAINT {quote(name)}')
+        cursor.execute(
+            'SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint '
+            'WHERE conrelid = to_regclass(%s) AND contype = %s', [table, 'f']
+        )
+        foreign_keys = cursor.fetchall()
+        # Le definizioni nominano già la tabella nuova: vengono lette prima del RENAME
+        cursor.execute(
+            'SELECT pg_get_indexdef(indexrelid) FROM pg_index WHERE indrelid = to_regclass(%s) AND NOT indisprimary',
+            [table]
+        )
+        indexes = [definition for (definition,) in cursor.fetchall()]
+        cursor.execute(f'SELECT max(id) FROM {quote(table)}')
+        last_id = cursor.fetchone()[0]
+
+        # Postgres 15: niente colonne identity sulle tabelle partizionate, si usa una sequenza
+        cursor.execute(f'ALTER TABLE {quote(table)} ALTER COLUMN id DROP IDENTITY IF EXISTS')
+        cursor.execute(f'ALTER TABLE {quote(table)} RENAME TO {quote(old)}')
+        cursor.execute(f'CREATE TABLE {quote(table)} (LIKE {quote(old)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) '
+                       f'PARTITION BY RANGE (date)')
+        sequence = f'{table}_id_seq'
+        cursor.execute(f'CREATE SEQUENCE {quote(sequence)} OWNED BY {quote(table)}.id')
+        cursor.execute(f"ALTER TABLE {quote(table)} ALTER COLUMN id SET DEFAULT nextval('{sequence}')")
+        if last_id is not None:
+            cursor.execute('SELECT setval(%s, %s)', [sequence, last_id])
+        cursor.execute(f'CREATE TABLE {quote(table + "_default")} PARTITION OF {quote(table)} DEFAULT')
+
+        cursor.execute(f"SELECT DISTINCT date_trunc('month', date, 'UTC') FROM {quote(old)}")
+        months = {month_start(month.astimezone(dt_timezone.utc)) for (month,) in cursor.fetchall()}
+        self.create_partitions(cursor, table, months)
+        cursor.execute(f'INSERT INTO {quote(table)} SELECT * FROM {quote(old)}')
+        self.stdout.write(f'{cursor.rowcount} matches copied to {len(months)} partitions')
+        cursor.execute(f'DROP TABLE {quote(old)}')
+
+        # PK, indici e FK dopo la copia (e con i nomi liberati dal DROP): costruiti una volta sola
+        cursor.execute(f'ALTER TABLE {quote(table)} ADD PRIMARY KEY (id, date)')
+        for definition in indexes:
+            cursor.execute(definition)
+        for name, definition in foreign_keys:
+            cursor.execute(f'ALTER TABLE {quote(table)} ADD CONSTRAINT {quote(name)} {definition}')
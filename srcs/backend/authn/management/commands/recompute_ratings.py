@@ -0,0 +1,52 @@
+"""
+Description: Recompute every Elo rating from the full match history.
+
+Main content:
+1. class: Command(BaseCommand)
+
+Usage: python manage.py recompute_ratings [--game pong] [--k 24] [--bot-rating 1400] [--dry-run]
+Replays all the matches of each game in save order with NumPy (see ratings.py)
+and writes the result, so the rating parameters can be tuned in place. Without
+--k / --bot-rating the RATING_K and RATING_BOT settings are used; to keep the
+new values, update the settings too, or the next matches will use the old ones.
+"""
+
+import time
+from django.core.management.base import BaseCommand
+from authn.leaderboard import LEADERBOARD, GAMES
+from authn.ratings import rating_params, load_matches, recompute, save_ratings
+from authn.response_cache import RESPONSE_CACHE
+
+class Command(BaseCommand):
+    help = 'Recompute the Elo ratings of all the players from the Match history'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--game', choices=GAMES, help='Only this game (default: all)')
+        parser.add_argument('--k', type=float, help='K factor')
+        parser.add_argument('--bot-rating', type=float, help='Fixed rating of the bot AM')
+        parser.add_argument('--dry-run', action='store_true', help='Compute and print the top ratings without saving')
+
+    def handle(self, *args, **options):
+        k, initial, bot_rating = rating_params()
+        if options['k'] is not None:
+            k = options['k']
+        if options['bot_rating'] is not None:
+            bot_rating = options['bot_rating']
+
+        for game in ([options['game']] if options['game'] else GAMES):
+            start = time.perf_counter()
+            player1, player2, scores = load_matches(game)
+            loaded = time.perf_counter()
+            player_ids, ratings = recompute(player1, player2, scores, k, initial, bot_rating)
+            computed = time.perf_counter()
+            self.stdout.write(f'{game}: {len(player1)} matches loaded in {loaded - start:.2f}s, '
+                              f'{len(player_ids)} ratings computed in {computed - loaded:.2f}s')
+
+            if options['dry_run']:
+                for index in ratings.argsort()[::-1][:10].tolist():
+                    self.stdout.write(f'  player {player_ids[index]}: {ratings[index]:.1f}')
+                continue
+            save_ratings(game, player_ids, ratings, initial)
+            LEADERBOARD.invalidate(game)
+            RESPONSE_CACHE.invalidate_all()
+            self.stdout.write(f'{game}: ratings saved in {time.perf_counter() - computed:.2f}s')
@@ -0,0 +1,230 @@
+"""
+Description: Synthetic dataset for the endpoint benchmarks.
+
+Main content:
+1. class: Command(BaseCommand)
+
+Usage: python manage.py seed_benchmark --users 100000 --matches 10000000 --friends 20 [--days 365] [--seed 42]
+Seeds --users accounts (see benchmark_signup), one Pong and one Tris Player
+each, --matches matches split between the two games and a friendship graph
+of --friends friends per user (one request in ten still pending). Players
+have a heavy-tailed activity, so some of them have very long histories,
+like the real ones. Matches and friendships are written with COPY on
+PostgreSQL (executemany elsewhere) in chunks of --chunk-size rows generated
+with NumPy; the player counters are applied at the end with one UPDATE,
+the monthly partitions are created (partition_matches) and the rollups and
+the ratings are rebuilt from the new history.
+Every step only adds what is missing, so the command can be rerun with
+larger numbers. Run it against a development database only.
+"""
+
+import csv
+import io
+import time
+from datetime import timedelta
+import numpy as np
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+from authn.leaderboard import LEADERBOARD, GAMES
+from authn.matches import BOT_UID, MODES, MODE_COUNTERS
+from authn.models import User, Player, Match, Friendship
+from authn.response_cache import RESPONSE_CACHE
+from authn.management.commands.benchmark_signup import EMAIL_DOMAIN, Command as SignupBenchmark
+
+PLAYER_BATCH_SIZE = 10000
+# Frequenza delle modalità: locale, bot, torneo
+MODE_WEIGHTS = (0.5, 0.3, 0.2)
+PONG_WINNING_SCORE = 5
+TRIS_DRAW_RATE = 0.1
+PENDING_RATE = 0.1
+COUNTERS = ('TOTP', 'TOTW', 'PVPP', 'PVPW', 'PVEP', 'PVEW', 'TMAP', 'TMAW')
+
+def bench_users():
+    return User.objects.filter(email__endswith=f'@{EMAIL_DOMAIN}')
+
+def insert_rows(table, columns, rows):
+    """Insert rows (tuples) into table: COPY on PostgreSQL, executemany otherwise."""
+    quoted = ', '.join(connection.ops.quote_name(column) for column in columns)
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            buffer = io.StringIO()
+            # None -> campo vuoto non quotato, cioè NULL per COPY csv
+            csv.writer(buffer).writerows(rows)
+            buffer.seek(0)
+            cursor.copy_expert(f'COPY {table} ({quoted}) FROM STDIN WITH (FORMAT csv)', buffer)
+        else:
+            placeholders = ', '.join(['%s'] * len(columns))
+            cursor.executemany(f'INSERT INTO {table} ({quoted}) VALUES ({placeholders})', rows)
+
+class Command(BaseCommand):
+    help = 'Seed users, players, matches and friendships at scale for the endpoint benchmarks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100000, help='Benchmark users')
+        parser.add_argument('--matches', type=int, default=10000000, help='Matches, split between the games')
+        parser.add_argument('--friends', type=int, default=20, help='Friends per user (even)')
+        parser.add_argument('--days', type=int, default=365, help='Days of match history')
+        parser.add_argument('--chunk-size', type=int, default=200000, help='Rows generated and written at a time')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed')
+        parser.add_argument('--skip-derived', action='store_true', help="Don't rebuild rollups and ratings")
+
+    def handle(self, *args, **options):
+        if options['users'] < 2:
+            raise CommandError('At least 2 users are needed')
+        rng = np.random.default_rng(options['seed'])
+        start = time.perf_counter()
+
+        SignupBenchmark(stdout=self.stdout, stderr=self.stderr).seed(options['users'])
+        user_ids = np.array(bench_users().order_by('id').values_list('id', flat=True)[:options['users']])
+
+        added = 0
+        for game in GAMES:
+            player_ids = self.seed_players(game, user_ids)
+            added += self.seed_matches(game, player_ids, options['matches'] // len(GAMES), options['days'],
+                                       options['chunk_size'], rng)
+        self.seed_friendships(user_ids, options['friends'], options['chunk_size'], rng)
+
+        # Le partite datate prima delle partizioni esistenti finiscono nel default: vanno nei loro mesi
+        if added and connection.vendor == 'postgresql':
+            call_command('partition_matches', stdout=self.stdout)
+        if added and not options['skip_derived']:
+            call_command('backfill_rollups', stdout=self.stdout)
+            call_command('recompute_ratings', stdout=self.stdout)
+        LEADERBOARD.invalidate()
+        RESPONSE_CACHE.invalidate_all()
+        self.stdout.write(f'Dataset ready in {time.perf_counter() - start:.1f}s')
+
+    def seed_players(self, game, user_ids):
+        """Create the missing players of game; return their ids, aligned with user_ids."""
+        existing = dict(Player.objects.filter(user_id__in=user_ids.tolist(), game_type=game)
+                        .values_list('user_id', 'id'))
+        missing = [Player(user_id=user_id, game_type=game) for user_id in user_ids.tolist() if user_id not in existing]
+        if missing:
+            Player.objects.bulk_create(missing, batch_size=PLAYER_BATCH_SIZE, ignore_conflicts=True)
+            existing = dict(Player.objects.filter(user_id__in=user_ids.tolist(), game_type=game)
+                            .values_list('user_id', 'id'))
+            self.stdout.write(f'{game}: {len(missing)} players created')
+        return np.array([existing[user_id] for user_id in user_ids.tolist()])
+
+    def seed_matches(self, game, player_ids, count, days, chunk_size, rng):
+        existing = Match.objects.filter(game=game, player1__user__email__endswith=f'@{EMAIL_DOMAIN}').count()
+        if existing >= count:
+            self.stdout.write(f'{game}: {existing} benchmark matches already present')
+            return 0
+
+        start = time.perf_counter()
+        players = len(player_ids)
+        # Attività a coda lunga: pochi giocatori con moltissime partite
+        activity = rng.pareto(1.5, players) + 1
+        activity /= activity.sum()
+        counters = {name: np.zeros(players, dtype=np.int64) for name in COUNTERS}
+        now = timezone.now().replace(tzinfo=None)
+        first_day = np.datetime64(now - timedelta(days=days), 'us')
+        columns = ['player1_id', 'player2_id', 'bot_name', 'game', 'mode',
+                   'player1_result', 'player2_result', 'winner', 'date']
+
+        for offset in range(existing, count, chunk_size):
+            size = min(chunk_size, count - offset)
+            player1 = rng.choice(players, size, p=activity)
+            player2 = rng.choice(players, size, p=activity)
+            # Mai contro sé stessi
+            same = player1 == player2
+            player2[same] = (player2[same] + 1) % players
+            mode = rng.choice(len(MODES), size, p=MODE_WEIGHTS)
+            bot = mode == MODES.index('bot')
+
+            if game == 'pong':
+                loser = rng.integers(0, PONG_WINNING_SCORE, size)
+                first_wins = rng.random(size) < 0.5
+                score1 = np.where(first_wins, PONG_WINNING_SCORE, loser)
+                score2 = np.where(first_wins, loser, PONG_WINNING_SCORE)
+            else:
+                outcome = rng.random(size)
+                score1 = (outcome < (1 - TRIS_DRAW_RATE) / 2).astype(np.int64)
+                score2 = ((outcome >= (1 - TRIS_DRAW_RATE) / 2) & (outcome < 1 - TRIS_DRAW_RATE)).astype(np.int64)
+            winner = np.where(score1 > score2, 'player1', np.where(score1 < score2, 'player2', 'draw'))
+            seconds = rng.integers(0, days * 86400, size)
+            dates = np.char.replace(np.datetime_as_string(first_day + seconds * 1000000), 'T', ' ')
+
+            self.count_results(counters, mode, bot, player1, player2, score1, score2, players)
+            human2 = np.where(bot, None, player_ids[player2].astype(object))
+            rows = zip(
+                player_ids[player1].tolist(), human2.tolist(), np.where(bot, BOT_UID, None).tolist(),
+                [game] * size, np.array(MODES)[mode].tolist(), score1.tolist(), score2.tolist(),
+                winner.tolist(), dates.tolist()
+            )
+            with transaction.atomic():
+                insert_rows(Match._meta.db_table, columns, rows)
+            done = offset + size
+            elapsed = time.perf_counter() - start
+            self.stdout.write(f'{game}: {done}/{count} matches ({(done - existing) / elapsed:.0f}/s)')
+
+        self.apply_counters(player_ids, counters)
+        return count - existing
+
+    def count_results(self, counters, mode, bot, player1, player2, score1, score2, players):
+        """Add the counters of a chunk, with the same rules as matches._apply_result."""
+        def add(name, who, mask):
+            counters[name] += np.bincount(who[mask], minlength=players)
+
+        everything = np.ones(len(mode), dtype=bool)
+        human = ~bot
+        won1, won2 = score1 > score2, score2 > score1
+        add('TOTP', player1, everything)
+        add('TOTP', player2, human)
+        add('TOTW', player1, won1)
+        add('TOTW', player2, human & won2)
+        for index, name in enumerate(MODES):
+            played, won = MODE_COUNTERS[name]
+            in_mode = mode == index
+            add(played, player1, in_mode)
+            add(won, player1, in_mode & won1)
+            # Le statistiche per modalità del bot non vengono registrate
+            if name != 'bot':
+                add(played, player2, in_mode)
+                add(won, player2, in_mode & won2)
+
+    def apply_counters(self, player_ids, counters):
+        quote = connection.ops.quote_name
+        table = quote(Player._meta.db_table)
+        assignments = ', '.join(f'{quote(name)} = {table}.{quote(name)} + bench_counters.{quote(name)}'
+                                for name in COUNTERS)
+        columns = ', '.join(f'{quote(name)} integer' for name in COUNTERS)
+        rows = zip(player_ids.tolist(), *(counters[name].tolist() for name in COUNTERS))
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f'CREATE TEMPORARY TABLE bench_counters (id bigint PRIMARY KEY, {columns})')
+            insert_rows('bench_counters', ['id', *COUNTERS], rows)
+            # Un solo UPDATE per tutti i giocatori
+            cursor.execute(f'UPDATE {table} SET {assignments} FROM bench_counters WHERE {table}.id = bench_counters.id')
+            cursor.execute('DROP TABLE bench_counters')
+
+    def seed_friendships(self, user_ids, friends, chunk_size, rng):
+        users = len(user_ids)
+        if Friendship.objects.filter(sender__email__endswith=f'@{EMAIL_DOMAIN}').exists():
+            self.stdout.write('Benchmark friendships already present')
+            return
+        # Ogni utente chiede l'amicizia agli utenti a distanza k (k < users / 2): nessuna coppia ripetuta
+        half = min(friends // 2, (users - 1) // 2)
+        if half < 1:
+            return
+        offsets = rng.choice(np.arange(1, (users + 1) // 2), half, replace=False)
+        created_at = timezone.now().replace(tzinfo=None).isoformat(sep=' ')
+        columns = ['sender_id', 'receiver_id', 'status', 'created_at', 'updated_at']
+        start = time.perf_counter()
+        written = 0
+        for k in offsets.tolist():
+            for first in range(0, users, chunk_size):
+                senders = np.arange(first, min(first + chunk_size, users))
+                receivers = (senders + k) % users
+                pending = rng.random(len(senders)) < PENDING_RATE
+                rows = zip(
+                    user_ids[senders].tolist(), user_ids[receivers].tolist(),
+                    np.where(pending, 'pending', 'accepted').tolist(),
+                    [created_at] * len(senders), [created_at] * len(senders)
+                )
+                with transaction.atomic():
+                    insert_rows(Friendship._meta.db_table, columns, rows)
+                written += len(senders)
+        self.stdout.write(f'{written} friendships in {time.perf_counter() - start:.1f}s')
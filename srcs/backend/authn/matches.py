@@ -0,0 +1,158 @@
+"""
+Description: Write path for match results (single and batch).
+
+Main content:
+1. function: parse_result(data)
+2. function: record_matches(game, results)
+
+Every result is validated first, then all the uids are resolved with one query,
+the counters and the Elo rating of each player are applied with one aggregated
+UPDATE, the matches are inserted with bulk_create and added to the daily
+rollups, all inside a single transaction.
+"""
+
+import logging
+from collections import Counter, defaultdict
+from django.db import transaction
+from django.db.models import F
+from .models import User, Player, Match
+from .leaderboard import LEADERBOARD
+from .ratings import rate, rating_params
+from .rollups import apply_matches
+from .response_cache import RESPONSE_CACHE, player_resource, matches_resource, leaderboard_resource
+
+LOGGER = logging.getLogger('web')
+
+BOT_UID = 'AM'
+MODES = ('local', 'bot', 'tournament')
+# Contatori aggiornati per ogni modalità: (partite giocate, partite vinte)
+MODE_COUNTERS = {
+    'local': ('PVPP', 'PVPW'),
+    'tournament': ('TMAP', 'TMAW'),
+    'bot': ('PVEP', 'PVEW'),
+}
+
+def parse_result(data):
+    """Validate a raw match result and return it normalized, or raise ValueError."""
+    if not isinstance(data, dict):
+        raise ValueError('Invalid match result')
+    player1_uid = data.get('player1_uid')
+    player2_uid = data.get('player2_uid')
+    mode = data.get('mode')
+    p1_score = data.get('p1_score')
+    p2_score = data.get('p2_score')
+
+    if any(value is None for value in [player1_uid, player2_uid, mode, p1_score, p2_score]):
+        raise ValueError('Missing required fields')
+    mode = str(mode).lower()
+    if mode not in MODES:
+        raise ValueError(f'Invalid mode: {mode}')
+    try:
+        p1_score, p2_score = int(p1_score), int(p2_score)
+    except (TypeError, ValueError):
+        raise ValueError('Scores must be integers')
+    if p1_score < 0 or p2_score < 0:
+        raise ValueError('Scores must be positive')
+
+    return {
+        'player1_uid': player1_uid,
+        'player2_uid': player2_uid,
+        'mode': mode,
+        'p1_score': p1_score,
+        'p2_score': p2_score,
+    }
+
+def _resolve_players(game, uids):
+    """Map every uid to its Player id, creating the missing players in bulk."""
+    users = dict(User.objects.filter(uid__in=uids).values_list('uid', 'id'))
+    missing = set(uids) - users.keys()
+    if missing:
+        raise User.DoesNotExist(f'User matching uid {", ".join(sorted(missing))} does not exist')
+
+    players = dict(Player.objects.filter(user_id__in=users.values(), game_type=game).values_list('user_id', 'id'))
+    to_create = [Player(user_id=user_id, game_type=game) for user_id in users.values() if user_id not in players]
+    if to_create:
+        Player.objects.bulk_create(to_create, ignore_conflicts=True)
+        players = dict(Player.objects.filter(user_id__in=users.values(), game_type=game).values_list('user_id', 'id'))
+        LOGGER.info('%s %s players created', len(to_create), game)
+    return {uid: players[user_id] for uid, user_id in users.items()}
+
+def _apply_result(deltas, result, player1_id, player2_id):
+    p1_score, p2_score = result['p1_score'], result['p2_score']
+    played, won = MODE_COUNTERS[result['mode']]
+
+    if p1_score > p2_score:
+        winner = 'player1'
+    elif p1_score < p2_score:
+        winner = 'player2'
+    else:
+        winner = 'draw'
+
+    deltas[player1_id]['TOTP'] += 1
+    deltas[player1_id][played] += 1
+    if winner == 'player1':
+        deltas[player1_id]['TOTW'] += 1
+        deltas[player1_id][won] += 1
+    # Le statistiche per modalità del bot non vengono registrate
+    if player2_id is not None:
+        deltas[player2_id]['TOTP'] += 1
+        if result['mode'] != 'bot':
+            deltas[player2_id][played] += 1
+        if winner == 'player2':
+            deltas[player2_id]['TOTW'] += 1
+            if result['mode'] != 'bot':
+                deltas[player2_id][won] += 1
+    return winner
+
+def _publish(game, player_ids, stale):
+    # Prima la classifica in memoria, poi le risposte in cache: una GET tra le due
+    # rimetterebbe in cache la classifica di prima della partita
+    for uid, totw, totp, rating in Player.objects.filter(pk__in=player_ids).values_list('user__uid', 'TOTW', 'TOTP', 'rating'):
+        LEADERBOARD.update(game, uid, totw, totp, rating)
+    RESPONSE_CACHE.invalidate(*stale)
+
+def record_matches(game, results):
+    """Save already parsed results for game and return the created matches."""
+    uids = {result['player1_uid'] for result in results}
+    uids |= {result['player2_uid'] for result in results if result['player2_uid'] != BOT_UID}
+
+    k, _, bot_rating = rating_params()
+    with transaction.atomic():
+        players = _resolve_players(game, uids)
+        # Lock dei giocatori in ordine di id (come gli UPDATE) prima di leggere i rating
+        ratings = dict(
+            Player.objects.select_for_update().filter(pk__in=players.values()).order_by('pk').values_list('id', 'rating')
+        )
+        deltas = defaultdict(Counter)
+        matches = []
+        for result in results:
+            player1_id = players[result['player1_uid']]
+            player2_id = None if result['player2_uid'] == BOT_UID else players[result['player2_uid']]
+            winner = _apply_result(deltas, result, player1_id, player2_id)
+            rate(ratings, player1_id, player2_id, winner, k, bot_rating)
+            matches.append(Match(
+                player1_id=player1_id,
+                player2_id=player2_id,
+                bot_name=BOT_UID if player2_id is None else None,
+                game=game,
+                mode=result['mode'],
+                player1_result=result['p1_score'],
+                player2_result=result['p2_score'],
+                winner=winner
+            ))
+
+        # Un solo UPDATE per giocatore, in ordine di id per evitare deadlock
+        for player_id in sorted(deltas):
+            Player.objects.filter(pk=player_id).update(
+                rating=ratings[player_id],
+                **{field: F(field) + value for field, value in deltas[player_id].items()}
+            )
+        matches = Match.objects.bulk_create(matches)
+        apply_matches(matches)
+        # Le risposte in cache dei giocatori coinvolti scadono solo se la transazione va a buon fine
+        stale = [leaderboard_resource(game)]
+        stale += [resource(game, uid) for uid in uids for resource in (player_resource, matches_resource)]
+        transaction.on_commit(lambda: _publish(game, list(deltas), stale))
+
+    LOGGER.info('%s %s matches saved', len(matches), game)
+    return matches
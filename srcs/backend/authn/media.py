@@ -0,0 +1,128 @@
+"""
+Description: Serving of the uploaded media (avatars) with caching headers and ranges.
+
+Main content:
+1. function: serve_media(request, path)
+
+django.conf.urls.static() only works with DEBUG and streams every file through
+Python without validators; whitenoise only knows the files found at startup, not
+the ones uploaded later. This view:
+- hands the file to the front proxy when MEDIA_ACCEL is 'x-accel-redirect'
+  (nginx, internal location MEDIA_ACCEL_PREFIX) or 'x-sendfile' (Apache, lighttpd);
+- otherwise returns a FileResponse, that WSGI servers send with sendfile()
+  (wsgi.file_wrapper) and ASGI servers in blocks, with support for single
+  byte ranges (206, If-Range) and 304 on If-None-Match.
+
+Files under a content hash (avatars/<aa>/<sha256>/...) never change: they get
+a strong ETag derived from the name and 'Cache-Control: immutable' for a year.
+The other files get an ETag from size and mtime and MEDIA_MAX_AGE.
+"""
+
+import mimetypes
+import os
+import re
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.http import parse_etags
+from django.views.decorators.http import require_safe
+
+HASHED_NAME = re.compile(r'^avatars/[0-9a-f]{2}/(?P<digest>[0-9a-f]{64})/(?P<variant>[^/]+)$')
+IMMUTABLE = 'public, max-age=31536000, immutable'
+RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+BLOCK_SIZE = 64 * 1024
+
+def _etag(path, stat):
+    match = HASHED_NAME.match(path)
+    if match:
+        return f'"{match.group("digest")}-{match.group("variant")}"'
+    return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+def _byte_range(header, size):
+    """(start, end) included of a single range, None for the whole file, False if unsatisfiable."""
+    match = RANGE.match(header.strip())
+    # Range multipli o non validi: si risponde con il file intero
+    if match is None or not size:
+        return None
+    first, last = match.groups()
+    if not first:
+        # Ultimi N byte
+        if not last:
+            return None
+        suffix = int(last)
+        if not suffix:
+            return False
+        return max(size - suffix, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size:
+        return False
+    if end < start:
+        return None
+    return start, end
+
+def _read_range(file, start, length):
+    with file:
+        file.seek(start)
+        while length > 0:
+            block = file.read(min(BLOCK_SIZE, length))
+            if not block:
+                break
+            length -= len(block)
+            yield block
+
+@require_safe
+def serve_media(request, path):
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+        stat = os.stat(full_path)
+    except (ValueError, OSError):
+        raise Http404('File not found')
+    if not os.path.isfile(full_path):
+        raise Http404('File not found')
+
+    etag = _etag(path, stat)
+    headers = {
+        'ETag': etag,
+        'Cache-Control': IMMUTABLE if HASHED_NAME.match(path) else
+        f'public, max-age={getattr(settings, "MEDIA_MAX_AGE", 3600)}',
+        'Accept-Ranges': 'bytes',
+    }
+    if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+        response = HttpResponseNotModified()
+        for header, value in headers.items():
+            response[header] = value
+        return response
+
+    content_type = mimetypes.guess_type(full_path)[0] or 'application/octet-stream'
+    accel = getattr(settings, 'MEDIA_ACCEL', '')
+    if accel:
+        # Il proxy invia il file (e gestisce i range); Django risponde solo con gli header
+        response = HttpResponse(content_type=content_type)
+        if accel == 'x-accel-redirect':
+            response['X-Accel-Redirect'] = getattr(settings, 'MEDIA_ACCEL_PREFIX', '/protected-media/') + path
+        else:
+            response['X-Sendfile'] = full_path
+    else:
+        byte_range = None
+        range_header = request.META.get('HTTP_RANGE')
+        # If-Range: il range vale solo se il file è ancora quello indicato
+        if range_header and request.META.get('HTTP_IF_RANGE', etag) == etag:
+            byte_range = _byte_range(range_header, stat.st_size)
+        if byte_range is False:
+            response = HttpResponse(status=416, content_type=content_type)
+            response['Content-Range'] = f'bytes */{stat.st_size}'
+        elif byte_range is not None:
+            start, end = byte_range
+            length = end - start + 1
+            response = StreamingHttpResponse(
+                _read_range(open(full_path, 'rb'), start, length) if request.method == 'GET' else [],
+                status=206, content_type=content_type
+            )
+            response['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+            response['Content-Length'] = str(length)
+        else:
+            response = FileResponse(open(full_path, 'rb'), content_type=content_type)
+    for header, value in headers.items():
+        response[header] = value
+    return response
@@ -0,0 +1,240 @@
+"""
+Description: Per-view request metrics (latency, queries, response size) in Prometheus format.
+
+Main content:
+1. object: METRICS
+2. function: instrument(connection)
+3. function: render(snapshot)
+
+Every resolved view ('PongGamesView.get', 'FriendView.get', ...) gets:
+- authn_request_duration_seconds: histogram of the latency;
+- authn_request_queries: histogram of the DB queries per request (an N+1
+  moves the requests to the high buckets), authn_request_query_seconds_total;
+- authn_response_size_bytes: histogram of the body size;
+- authn_requests_total by status class.
+
+The request path takes no lock: every thread writes to its own dict of
+counters, the threads' dicts are only merged when the metrics are read. The
+dicts of the threads that ended (thread-per-request servers, recycled pools)
+are folded into one total and dropped, so they don't pile up.
+The queries are counted by an execute wrapper installed on every DB
+connection, through a ContextVar, so the ones run by the async views in
+sync_to_async threads are counted too.
+
+Each process writes its totals to METRICS_DIR/<pid>.json every
+METRICS_FLUSH_INTERVAL seconds; MetricsView sums the files of all the
+workers. The files not updated for METRICS_STALE_AFTER seconds (stopped
+workers) are removed.
+"""
+
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from django.conf import settings
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+# [numero di query, secondi] della richiesta in corso
+REQUEST_QUERIES = ContextVar('request_queries', default=None)
+
+def _count_queries(execute, sql, params, many, context):
+    counter = REQUEST_QUERIES.get()
+    if counter is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        counter[0] += 1
+        counter[1] += time.perf_counter() - start
+
+def instrument(connection, **kwargs):
+    """Count the queries of connection (connection_created receiver, idempotent)."""
+    if _count_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_count_queries)
+
+def _histogram(buckets):
+    # Conteggi per bucket (+Inf compreso), somma
+    return [[0] * (len(buckets) + 1), 0]
+
+def _entry():
+    return {
+        'status': {},
+        'duration': _histogram(LATENCY_BUCKETS),
+        'queries': _histogram(QUERY_BUCKETS),
+        'query_seconds': 0.0,
+        'size': _histogram(SIZE_BUCKETS),
+    }
+
+def _observe(histogram, buckets, value):
+    histogram[0][bisect_left(buckets, value)] += 1
+    histogram[1] += value
+
+class Metrics:
+    def __init__(self):
+        self.local = threading.local()
+        # [(thread, store)] dei thread vivi; i totali di quelli terminati in retired
+        self.stores = []
+        self.retired = {}
+        self.stores_lock = threading.Lock()
+        self.flusher = None
+
+    def _store(self):
+        store = getattr(self.local, 'store', None)
+        if store is None:
+            store = self.local.store = {}
+            # Solo alla prima richiesta di ogni thread
+            with self.stores_lock:
+                self._prune()
+                self.stores.append((threading.current_thread(), store))
+                if self.flusher is None and self.directory():
+                    self.flusher = threading.Thread(target=self._flush_loop, name='metrics', daemon=True)
+                    self.flusher.start()
+        return store
+
+    def observe(self, view, status_code, duration, queries, query_seconds, size):
+        store = self._store()
+        entry = store.get(view)
+        if entry is None:
+            entry = store[view] = _entry()
+        status_class = f'{status_code // 100}xx'
+        entry['status'][status_class] = entry['status'].get(status_class, 0) + 1
+        _observe(entry['duration'], LATENCY_BUCKETS, duration)
+        _observe(entry['queries'], QUERY_BUCKETS, queries)
+        entry['query_seconds'] += query_seconds
+        if size is not None:
+            _observe(entry['size'], SIZE_BUCKETS, size)
+
+    def _prune(self):
+        # Un thread terminato non scrive più: il suo dict confluisce in retired (lock già preso)
+        alive = []
+        for thread, store in self.stores:
+            if thread.is_alive():
+                alive.append((thread, store))
+            else:
+                for view, entry in store.items():
+                    merge_entry(self.retired, view, entry)
+        self.stores = alive
+
+    def snapshot(self):
+        """Totals of this process: {view: entry}."""
+        total = {}
+        with self.stores_lock:
+            self._prune()
+            stores = [store for _, store in self.stores]
+            for view, entry in self.retired.items():
+                merge_entry(total, view, entry)
+        for store in stores:
+            # dict.copy() è atomica rispetto al thread che scrive
+            for view, entry in store.copy().items():
+                merge_entry(total, view, entry)
+        return total
+
+    def directory(self):
+        return getattr(settings, 'METRICS_DIR', None)
+
+    def flush(self):
+        directory = self.directory()
+        if not directory:
+            return
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f'{os.getpid()}.json')
+        temporary = f'{path}.tmp'
+        with open(temporary, 'w') as file:
+            json.dump(self.snapshot(), file)
+        # Chi legge non vede mai un file scritto a metà
+        os.replace(temporary, path)
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(getattr(settings, 'METRICS_FLUSH_INTERVAL', 5))
+            try:
+                self.flush()
+            except OSError:
+                pass
+
+    def collect(self):
+        """Totals of all the workers (only this process without METRICS_DIR)."""
+        directory = self.directory()
+        if not directory:
+            return self.snapshot()
+        self.flush()
+        total = {}
+        stale_after = getattr(settings, 'METRICS_STALE_AFTER', 300)
+        now = time.time()
+        for name in os.listdir(directory):
+            if not name.endswith('.json'):
+                continue
+            path = os.path.join(directory, name)
+            try:
+                if now - os.path.getmtime(path) > stale_after:
+                    os.remove(path)
+                    continue
+                with open(path) as file:
+                    snapshot = json.load(file)
+            except (OSError, ValueError):
+                continue
+            for view, entry in snapshot.items():
+                merge_entry(total, view, entry)
+        return total
+
+def merge_entry(total, view, entry):
+    target = total.get(view)
+    if target is None:
+        target = total[view] = _entry()
+    for status_class, count in entry['status'].copy().items():
+        target['status'][status_class] = target['status'].get(status_class, 0) + count
+    for name in ('duration', 'queries', 'size'):
+        counts, value = entry[name]
+        target[name][0] = [a + b for a, b in zip(target[name][0], counts)]
+        target[name][1] += value
+    target['query_seconds'] += entry['query_seconds']
+
+def _label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_bucket(bound):
+    return f'{bound:g}'
+
+def _render_histogram(lines, name, buckets, views, key):
+    lines.append(f'# TYPE {name} histogram')
+    for view, entry in views:
+        counts, value = entry[key]
+        label = _label(view)
+        cumulative = 0
+        for bound, count in zip(buckets, counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{view="{label}",le="{_format_bucket(bound)}"}} {cumulative}')
+        cumulative += counts[-1]
+        lines.append(f'{name}_bucket{{view="{label}",le="+Inf"}} {cumulative}')
+        lines.append(f'{name}_sum{{view="{label}"}} {value:g}')
+        lines.append(f'{name}_count{{view="{label}"}} {cumulative}')
+
+def render(snapshot):
+    """Prometheus text exposition (version 0.0.4) of a snapshot."""
+    views = sorted(snapshot.items())
+    lines = [
+        '# HELP authn_requests_total Requests by view and status class.',
+        '# TYPE authn_requests_total counter',
+    ]
+    for view, entry in views:
+        for status_class, count in sorted(entry['status'].items()):
+            lines.append(f'authn_requests_total{{view="{_label(view)}",status="{status_class}"}} {count}')
+    lines.append('# HELP authn_request_duration_seconds Latency of the requests by view.')
+    _render_histogram(lines, 'authn_request_duration_seconds', LATENCY_BUCKETS, views, 'duration')
+    lines.append('# HELP authn_request_queries DB queries per request by view.')
+    _render_histogram(lines, 'authn_request_queries', QUERY_BUCKETS, views, 'queries')
+    lines.append('# HELP authn_request_query_seconds_total Time spent in DB queries by view.')
+    lines.append('# TYPE authn_request_query_seconds_total counter')
+    for view, entry in views:
+        lines.append(f'authn_request_query_seconds_total{{view="{_label(view)}"}} {entry["query_seconds"]:g}')
+    lines.append('# HELP authn_response_size_bytes Size of the response bodies by view.')
+    _render_histogram(lines, 'authn_response_size_bytes', SIZE_BUCKETS, views, 'size')
+    return '\n'.join(lines) + '\n'
+
+METRICS = Metrics()
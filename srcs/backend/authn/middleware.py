@@ -0,0 +1,129 @@
+"""
+Description: Middleware of the authn app.
+
+Main content:
+1. class: RequestLogMiddleware
+2. class: MetricsMiddleware
+
+RequestLogMiddleware gives every request an id (the X-Request-ID of the proxy
+if valid, a new one otherwise), exposes the request fields to the log records
+through jsonlog.REQUEST_CONTEXT and writes one access record per request with
+view, status, latency and user uid. It works for both the sync and the async
+views.
+
+MetricsMiddleware records latency, DB queries and response size of every
+resolved view in metrics.METRICS, exposed by MetricsView.
+"""
+
+import logging
+import re
+import time
+import uuid
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.utils.functional import SimpleLazyObject, empty
+from .jsonlog import REQUEST_CONTEXT
+from .metrics import METRICS, REQUEST_QUERIES
+
+LOGGER = logging.getLogger('web.request')
+
+REQUEST_ID = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+def _user_uid(request):
+    # Solo se l'utente è già stato risolto: nessuna query per il log
+    user = getattr(request, 'user', None)
+    if isinstance(user, SimpleLazyObject) and user._wrapped is empty:
+        return None
+    if user is None or not user.is_authenticated:
+        return None
+    return user.uid
+
+def _view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return None
+    view_class = getattr(match.func, 'view_class', None)
+    return view_class.__name__ if view_class else match.func.__name__
+
+class RequestLogMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def _start(self, request):
+        request_id = request.META.get('HTTP_X_REQUEST_ID', '')
+        if not REQUEST_ID.match(request_id):
+            request_id = uuid.uuid4().hex
+        request.request_id = request_id
+        return REQUEST_CONTEXT.set({
+            'http.request.id': request_id,
+            'http.request.method': request.method,
+            'url.path': request.path,
+        }), time.perf_counter_ns()
+
+    def _finish(self, request, response, token, start):
+        duration = time.perf_counter_ns() - start
+        response['X-Request-ID'] = request.request_id
+        LOGGER.info('%s %s %s', request.method, request.path, response.status_code, extra={'ecs': {
+            'event.dataset': 'authn.request',
+            'event.duration': duration,
+            'http.response.status_code': response.status_code,
+            'authn.view': _view_name(request),
+            'user.id': _user_uid(request),
+        }})
+        REQUEST_CONTEXT.reset(token)
+        return response
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token, start = self._start(request)
+        return self._finish(request, self.get_response(request), token, start)
+
+    async def __acall__(self, request):
+        token, start = self._start(request)
+        return self._finish(request, await self.get_response(request), token, start)
+
+def _response_size(response):
+    if not response.streaming:
+        return len(response.content)
+    length = response.get('Content-Length')
+    return int(length) if length and length.isdigit() else None
+
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def _start(self):
+        counter = [0, 0.0]
+        return counter, REQUEST_QUERIES.set(counter), time.perf_counter()
+
+    def _finish(self, request, response, counter, token, start):
+        duration = time.perf_counter() - start
+        REQUEST_QUERIES.reset(token)
+        # Letto da benchmark_endpoints per i budget di query
+        request.db_queries = counter[0]
+        view = _view_name(request)
+        # Richieste non risolte (404 dell'URLconf): nessuna view da misurare
+        if view is not None:
+            METRICS.observe(f'{view}.{request.method.lower()}', response.status_code, duration,
+                            counter[0], counter[1], _response_size(response))
+        return response
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        counter, token, start = self._start()
+        return self._finish(request, self.get_response(request), counter, token, start)
+
+    async def __acall__(self, request):
+        counter, token, start = self._start()
+        return self._finish(request, await self.get_response(request), counter, token, start)
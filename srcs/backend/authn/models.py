@@ -5,10 +5,17 @@ Main content:
 1. UserManager(BaseUserManager)
 2. class: User(AbstractBaseUser, PermissionsMixin)
 3. class: Friendship(models.Model)
+4. class: DiscriminatorPool(models.Model)
+5. class: Tournament(models.Model)
+6. class: TournamentEntry(models.Model)
+7. class: Round(models.Model)
+8. class: Pairing(models.Model)
+9. class: PlayerDailyStats(models.Model)
 """
 
-import random
 from django.db import models
+from django.db.models.functions import Upper
+from django.contrib.postgres.indexes import GinIndex, OpClass
 from django.utils.translation import gettext_lazy as _
 from django.contrib.auth.password_validation import validate_password  
 from django.contrib.auth.models import BaseUserManager, AbstractBaseUser, PermissionsMixin
@@ -27,16 +34,14 @@ class UserManager(BaseUserManager):
         except Exception as e:
             raise ValueError(_('Password is not valid: ') + str(e))
         if not user.uid and not user.is_superuser:
-            user.uid = username + '#' + str(self.generate_uid())
+            user.uid = username + '#' + self.generate_uid(username)
         user.save()
         return user
 
-    def generate_uid(self):
-        while True:
-            number = random.randint(10, 9999)
-            uid = f"{number:04d}"
-            if not User.objects.filter(uid__endswith=uid).exists():
-                return uid
+    def generate_uid(self, username):
+        # Discriminatore riservato atomicamente dal pool (vedi uids.py)
+        from .uids import ALLOCATOR
+        return ALLOCATOR.allocate(username)
 
     def create_superuser(self, email, username, password=None, **extra_fields):
         extra_fields.setdefault('is_staff', True)
@@ -53,7 +58,8 @@ class UserManager(BaseUserManager):
         for key, value in extra_fields.items():
             setattr(user, key, value)
             if key == 'username':
-                user.uid = value + '#' + str(user.uid.split('#')[1])
+                from .uids import ALLOCATOR
+                user.uid = ALLOCATOR.rename(user, value)
         user.save()
         return user
 
@@ -67,7 +73,7 @@ class User(AbstractBaseUser, PermissionsMixin):
     image = models.ImageField(upload_to='images/', blank=True, default='images/default-avatar.jpg')
     language = models.CharField(max_length=2, choices=[('en', 'English'), ('it', 'Italian'), ('es', 'Spanish')], default='en')
     
-    uid = models.CharField(max_length=15, unique=True)
+    uid = models.CharField(max_length=20, unique=True)
     status = models.CharField(max_length=10, choices=[('online', 'Online'), ('offline', 'Offline')], default='offline')
     friends = models.ManyToManyField('self', through='Friendship', symmetrical=False)
     
@@ -83,10 +89,23 @@ class User(AbstractBaseUser, PermissionsMixin):
     class Meta:
         verbose_name = _('user')
         verbose_name_plural = _('users')
+        indexes = [
+            # Indici pg_trgm per la ricerca dei giocatori (icontains/istartswith e similarità)
+            GinIndex(OpClass(Upper('username'), name='gin_trgm_ops'), name='user_username_upper_trgm'),
+            GinIndex(fields=['username'], opclasses=['gin_trgm_ops'], name='user_username_trgm'),
+            # Prefisso delle query troppo corte per i trigrammi (vedi search.py)
+            models.Index(OpClass(Upper('username'), name='text_pattern_ops'), name='user_username_upper_prefix'),
+        ]
 
     def __str__(self):
         return self.email
 
+    def get_session_auth_hash(self):
+        # Utente di sessions.USER_CACHE: la password non è caricata, l'HMAC arriva dalla cache
+        if 'password' not in self.__dict__ and getattr(self, '_session_auth_hash', None):
+            return self._session_auth_hash
+        return super().get_session_auth_hash()
+
 class Friendship(models.Model):
     sender = models.ForeignKey(User, related_name='sent_friend_requests', on_delete=models.CASCADE)
     receiver = models.ForeignKey(User, related_name='received_friend_requests', on_delete=models.CASCADE)
@@ -97,6 +116,15 @@ class Friendship(models.Model):
     class Meta:
         constraints = [models.UniqueConstraint(fields=['sender', 'receiver'], name='unique_friendship')]
 
+class DiscriminatorPool(models.Model):
+    # Un pool per username (o uno globale): contatore dei discriminatori assegnati
+    scope = models.CharField(max_length=20, unique=True)
+    width = models.PositiveSmallIntegerField(default=4)
+    next_value = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.scope} - {self.width} digits - {self.next_value}"
+
 class Player(models.Model):
     GAME_CHOICES = [
         ('pong', 'Pong'),
@@ -114,16 +142,25 @@ class Player(models.Model):
     PVEW = models.PositiveIntegerField(default=0, verbose_name='Bot Matches Won')
     TMAP = models.PositiveIntegerField(default=0, verbose_name='Tournaments Matches Played')
     TMAW = models.PositiveIntegerField(default=0, verbose_name='Tournaments Matches Won')
+    # Elo, aggiornato ad ogni partita (vedi ratings.py)
+    rating = models.FloatField(default=1500.0, verbose_name='Rating')
 
     class Meta:
         constraints = [models.UniqueConstraint(fields=['user', 'game_type'], name='unique_user_game_type')]
+        indexes = [
+            # Solo i giocatori in classifica (TOTP > 0, vedi leaderboard.py)
+            models.Index(fields=['game_type', '-rating'], include=['user', 'TOTW', 'TOTP'],
+                         condition=models.Q(TOTP__gt=0), name='player_ranked'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.game_type}"
 
 class Match(models.Model):
-    player1 = models.ForeignKey(Player, on_delete=models.CASCADE, related_name='matches_as_player1')
-    player2 = models.ForeignKey(Player, on_delete=models.CASCADE, related_name='matches_as_player2', null=True, blank=True)
+    # Tabella partizionata per mese su Postgres (vedi partition_matches): gli
+    # indici dello storico sostituiscono quelli delle FK
+    player1 = models.ForeignKey(Player, on_delete=models.CASCADE, related_name='matches_as_player1', db_index=False)
+    player2 = models.ForeignKey(Player, on_delete=models.CASCADE, related_name='matches_as_player2', null=True, blank=True, db_index=False)
     bot_name = models.CharField(max_length=10, null=True, blank=True, verbose_name='Bot Name')
     game = models.CharField(max_length=10, choices=[('pong', 'Pong'), ('tris', 'Tris')], verbose_name='Game Type')
     mode = models.CharField(max_length=10, choices=[('local', 'Local'), ('bot', 'Bot'), ('tournament', 'Tournament')], verbose_name='Game Mode')
@@ -132,7 +169,106 @@ class Match(models.Model):
     winner = models.CharField(max_length=10, choices=[('player1', 'Player 1'), ('player2', 'Player 2'), ('draw', 'Draw')], verbose_name='Winner')
     date = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Storico di un giocatore in ciascuno dei due posti, nell'ordine di keyset_page
+            models.Index(fields=['player1', 'game', '-date', '-id'], name='match_player1_history'),
+            models.Index(fields=['player2', 'game', '-date', '-id'], condition=models.Q(player2__isnull=False),
+                         name='match_player2_history'),
+        ]
+
     def __str__(self):
         if self.bot_name:
             return f"{self.player1.user.username} vs {self.bot_name} - Winner: {self.winner}"
-        return f"{self.player1.user.username} vs {self.player2.user.username} - Winner: {self.winner}"
\ No newline at end of file
+        return f"{self.player1.user.username} vs {self.player2.user.username} - Winner: {self.winner}"
+
+
+class Tournament(models.Model):
+    STATUS_CHOICES = [
+        ('running', 'Running'),
+        ('finished', 'Finished'),
+    ]
+    name = models.CharField(max_length=50)
+    game = models.CharField(max_length=10, choices=[('pong', 'Pong'), ('tris', 'Tris')], verbose_name='Game Type')
+    created_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='tournaments_created')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='running')
+    max_rounds = models.PositiveSmallIntegerField()
+    current_round = models.PositiveSmallIntegerField(default=0)
+    winner = models.ForeignKey('TournamentEntry', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.game}) - round {self.current_round}/{self.max_rounds}"
+
+class TournamentEntry(models.Model):
+    # Classifica del torneo: aggiornata con F() ad ogni risultato, mai ricalcolata
+    tournament = models.ForeignKey(Tournament, on_delete=models.CASCADE, related_name='entries')
+    player = models.ForeignKey(Player, on_delete=models.CASCADE, related_name='tournament_entries')
+    seed = models.PositiveIntegerField()
+    score = models.PositiveIntegerField(default=0)
+    wins = models.PositiveIntegerField(default=0)
+    draws = models.PositiveIntegerField(default=0)
+    losses = models.PositiveIntegerField(default=0)
+    point_diff = models.IntegerField(default=0)
+    had_bye = models.BooleanField(default=False)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['tournament', 'player'], name='unique_tournament_player')]
+        indexes = [
+            # Ordine della classifica: punti, differenza punti, seed
+            models.Index(fields=['tournament', '-score', '-point_diff', 'seed'], name='tournament_standings'),
+        ]
+
+    def __str__(self):
+        return f"{self.player} - {self.score} pts"
+
+class Round(models.Model):
+    tournament = models.ForeignKey(Tournament, on_delete=models.CASCADE, related_name='rounds')
+    number = models.PositiveSmallIntegerField()
+    # Partite ancora senza risultato: il turno finisce quando arriva a 0
+    pending = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['tournament', 'number'], name='unique_tournament_round')]
+
+    def __str__(self):
+        return f"{self.tournament.name} - round {self.number}"
+
+class Pairing(models.Model):
+    tournament = models.ForeignKey(Tournament, on_delete=models.CASCADE, related_name='pairings')
+    round = models.ForeignKey(Round, on_delete=models.CASCADE, related_name='pairings')
+    entry1 = models.ForeignKey(TournamentEntry, on_delete=models.CASCADE, related_name='+')
+    # Vuoto per il bye
+    entry2 = models.ForeignKey(TournamentEntry, on_delete=models.CASCADE, related_name='+', null=True, blank=True)
+    entry1_result = models.PositiveIntegerField(null=True, blank=True)
+    entry2_result = models.PositiveIntegerField(null=True, blank=True)
+    winner = models.CharField(max_length=10, choices=[('player1', 'Player 1'), ('player2', 'Player 2'), ('draw', 'Draw')], null=True, blank=True)
+    # Nessun vincolo nel DB: la PK della tabella partizionata è (id, date)
+    match = models.ForeignKey(Match, on_delete=models.SET_NULL, null=True, blank=True, related_name='+', db_constraint=False)
+
+    def __str__(self):
+        return f"{self.round} - {self.entry1_id} vs {self.entry2_id or 'bye'}"
+
+
+class PlayerDailyStats(models.Model):
+    # Rollup giornaliero per giocatore e modalità ('all' = tutte le modalità insieme)
+    player = models.ForeignKey(Player, on_delete=models.CASCADE, related_name='daily_stats')
+    day = models.DateField()
+    mode = models.CharField(max_length=10)
+    played = models.PositiveIntegerField(default=0)
+    won = models.PositiveIntegerField(default=0)
+    drawn = models.PositiveIntegerField(default=0)
+    points_for = models.PositiveIntegerField(default=0)
+    points_against = models.PositiveIntegerField(default=0)
+    # Vittorie consecutive a inizio giornata, a fine giornata e serie migliore del giorno
+    win_streak_start = models.PositiveIntegerField(default=0)
+    win_streak_end = models.PositiveIntegerField(default=0)
+    best_win_streak = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        # Serve anche le query per intervallo di giorni di un giocatore
+        constraints = [models.UniqueConstraint(fields=['player', 'day', 'mode'], name='unique_player_day_mode')]
+
+    def __str__(self):
+        return f"{self.player} - {self.day} {self.mode}: {self.won}/{self.played}"
@@ -0,0 +1,73 @@
+"""
+Description: Keyset (cursor) pagination helpers for the match history.
+
+Main content:
+1. function: encode_cursor(date, pk)
+2. function: decode_cursor(cursor)
+3. function: keyset_page(querysets, cursor, page_size)
+
+Pages are ordered by (date, id) descending; the cursor stores the last row seen,
+so every page is an indexed range query instead of an OFFSET scan. A filter on
+two columns (player1 OR player2) is split in one range per index, merged here.
+"""
+
+import base64
+import heapq
+from datetime import datetime
+from django.db import models
+
+def encode_cursor(date, pk):
+    raw = f'{date.isoformat()}|{pk}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    """Return (date, pk) or raise ValueError if the cursor is malformed.
+
+    encode_cursor only writes aware dates: a naive one can't be compared with the
+    dates of the table nor of the archive, so it's malformed too.
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        date, pk = base64.urlsafe_b64decode(padded.encode()).decode().split('|')
+        date, pk = datetime.fromisoformat(date), int(pk)
+    except (TypeError, UnicodeDecodeError, ValueError) as e:
+        raise ValueError(f'Invalid cursor: {cursor}') from e
+    if date.utcoffset() is None:
+        raise ValueError(f'Invalid cursor: {cursor} (naive date)')
+    return date, pk
+
+def keyset_page(querysets, cursor, page_size):
+    """Return (rows, next_cursor) for the page that follows cursor.
+
+    querysets is a queryset or a list of querysets (one per index, like the two
+    player slots of Match): each one is read as an ordered range and the ranges
+    are merged. A row found by more than one of them (player1 == player2) is
+    returned once.
+    """
+    if isinstance(querysets, models.QuerySet):
+        querysets = [querysets]
+    after = None
+    if cursor:
+        date, pk = decode_cursor(cursor)
+        after = models.Q(date__lt=date) | models.Q(date=date, id__lt=pk)
+
+    # Un elemento in più per sapere se esiste una pagina successiva
+    ranges = []
+    for queryset in querysets:
+        queryset = queryset.order_by('-date', '-id')
+        if after is not None:
+            queryset = queryset.filter(after)
+        ranges.append(list(queryset[:page_size + 1]))
+    rows = []
+    for row in heapq.merge(*ranges, key=lambda row: (row.date, row.id), reverse=True):
+        # Le copie della stessa riga sono adiacenti nel merge
+        if rows and rows[-1].id == row.id:
+            continue
+        rows.append(row)
+        if len(rows) > page_size:
+            break
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = encode_cursor(rows[-1].date, rows[-1].id)
+    return rows, next_cursor
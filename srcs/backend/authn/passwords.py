@@ -0,0 +1,78 @@
+"""
+Description: Login credentials check with the password hashing on a bounded pool.
+
+Main content:
+1. function: hash_workers()
+2. object: HASH_EXECUTOR
+3. function: check_login(email, password)
+4. function: acheck_login(email, password)
+
+A login reads the user once and runs the password hasher once (the old path
+ran it twice: check_password() and then authenticate()). The hash is computed
+on HASH_EXECUTOR: at most PASSWORD_HASH_WORKERS hashes run at the same time in
+a process, so a login storm queues there instead of taking every request thread
+(or blocking the event loop of the async views). The pool threads only hash and
+never open database connections; the rare upgrade of an old hash is saved by
+the caller.
+"""
+
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, make_password
+from .models import User
+
+def hash_workers():
+    """Size of HASH_EXECUTOR: PASSWORD_HASH_WORKERS, or one per core when it's 0."""
+    return getattr(settings, 'PASSWORD_HASH_WORKERS', None) or os.cpu_count() or 1
+
+HASH_EXECUTOR = ThreadPoolExecutor(max_workers=hash_workers(), thread_name_prefix='password-hash')
+
+# Messaggi di errore (gli stessi della vecchia Login.post)
+INVALID_EMAIL = 'Invalid email'
+INVALID_PASSWORD = 'Invalid password'
+AUTHENTICATION_FAILED = 'Authentication failed'
+
+def _verify(password, encoded):
+    """(correct, must be rehashed) for password against the stored hash."""
+    upgrade = []
+    correct = check_password(password, encoded, setter=upgrade.append)
+    return correct, bool(upgrade)
+
+def _user_error(user, correct):
+    if not correct:
+        return INVALID_PASSWORD
+    # Come ModelBackend.user_can_authenticate()
+    if not getattr(user, 'is_active', True):
+        return AUTHENTICATION_FAILED
+    return None
+
+def check_login(email, password):
+    """Return (user, None) if the credentials are valid, else (None, error message)."""
+    user = User.objects.filter(email=email.strip().lower()).first()
+    if user is None:
+        return None, INVALID_EMAIL
+    correct, upgrade = HASH_EXECUTOR.submit(_verify, password, user.password).result()
+    error = _user_error(user, correct)
+    if error:
+        return None, error
+    if upgrade:
+        # Hash con i parametri attuali (costoso anche questo: nel pool)
+        user.password = HASH_EXECUTOR.submit(make_password, password).result()
+        user.save(update_fields=['password'])
+    return user, None
+
+async def acheck_login(email, password):
+    user = await User.objects.filter(email=email.strip().lower()).afirst()
+    if user is None:
+        return None, INVALID_EMAIL
+    loop = asyncio.get_running_loop()
+    correct, upgrade = await loop.run_in_executor(HASH_EXECUTOR, _verify, password, user.password)
+    error = _user_error(user, correct)
+    if error:
+        return None, error
+    if upgrade:
+        user.password = await loop.run_in_executor(HASH_EXECUTOR, make_password, password)
+        await user.asave(update_fields=['password'])
+    return user, None
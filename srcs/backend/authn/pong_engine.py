@@ -0,0 +1,230 @@
+"""
+Description: Headless Pong simulation, same physics as the frontend (pong2src.js).
+
+Main content:
+1. class: Paddle
+2. class: Ball
+3. class: PongState
+4. function: reset_ball(state, last_scorer)
+5. function: step(state)
+6. function: bot_target(state)
+
+The field has the 19:10 ratio of the canvas with a fixed size, and all speeds
+are the frontend ones expressed per frame, so one step is one 60 Hz frame.
+All the state objects use __slots__ and are allocated once per room: a step
+only mutates numbers, and snapshot() refills the same list every tick.
+"""
+
+import math
+import random
+
+TICK_RATE = 60
+FIELD_WIDTH = 1900.0
+FIELD_HEIGHT = 1000.0
+WINNING_SCORE = 11
+
+PADDLE_WIDTH = FIELD_WIDTH * 0.013
+PADDLE_HEIGHT = FIELD_HEIGHT * 0.15
+PADDLE_MARGIN = 10.0
+PADDLE_SPEED = FIELD_HEIGHT * 0.0086
+BALL_RADIUS = FIELD_WIDTH * 0.008
+BALL_SPEED = FIELD_WIDTH * 0.008
+MAX_SPEED = FIELD_WIDTH * 0.016
+MIN_SPEED = FIELD_WIDTH * 0.008
+SPEED_STEP = FIELD_WIDTH * 0.0025
+HITS_PER_SPEEDUP = 10
+SERVE_DELAY = TICK_RATE  # 1 secondo, come il setTimeout del frontend
+MAX_BOUNCE_ANGLE = math.pi / 4
+
+# Il bot (AM) ricalcola la destinazione della palla una volta al secondo
+BOT_UPDATE_TICKS = TICK_RATE
+BOT_DEAD_ZONE = 10.0
+
+class Paddle:
+    __slots__ = ('x', 'y', 'dy')
+
+    def __init__(self, x):
+        self.x = x
+        self.y = FIELD_HEIGHT / 2 - PADDLE_HEIGHT / 2
+        self.dy = 0.0
+
+class Ball:
+    __slots__ = ('x', 'y', 'dx', 'dy')
+
+    def __init__(self):
+        self.x = FIELD_WIDTH / 2
+        self.y = FIELD_HEIGHT / 2
+        self.dx = 0.0
+        self.dy = 0.0
+
+class PongState:
+    __slots__ = ('ball', 'player1', 'player2', 'scores', 'hits', 'max_speed', 'min_speed', 'serve_speed',
+                 'serve_timer', 'last_scorer', 'tick', 'ended', 'winning_score', 'bot', 'bot_target', 'random',
+                 '_snapshot')
+
+    def __init__(self, bot=False, seed=None, winning_score=WINNING_SCORE):
+        self.ball = Ball()
+        self.player1 = Paddle(PADDLE_MARGIN)
+        self.player2 = Paddle(FIELD_WIDTH - PADDLE_WIDTH - PADDLE_MARGIN)
+        self.scores = [0, 0]
+        self.hits = 0
+        self.max_speed = MAX_SPEED
+        self.min_speed = MIN_SPEED
+        self.serve_speed = BALL_SPEED
+        self.serve_timer = 0
+        self.last_scorer = None
+        self.tick = 0
+        self.ended = False
+        self.winning_score = winning_score
+        self.bot = bot
+        self.bot_target = FIELD_HEIGHT / 2
+        self.random = random.Random(seed)
+        self._snapshot = [0, 0.0, 0.0, 0.0, 0.0, 0, 0]
+        reset_ball(self, None)
+
+    def set_direction(self, side, direction):
+        """direction: -1 (su), 0 (fermo), 1 (giù) per il giocatore side (1 o 2)."""
+        paddle = self.player1 if side == 1 else self.player2
+        paddle.dy = PADDLE_SPEED * max(-1, min(1, int(direction)))
+
+    @property
+    def winner(self):
+        if not self.ended:
+            return None
+        return 'player1' if self.scores[0] > self.scores[1] else 'player2'
+
+    def snapshot(self):
+        """[tick, ball x, ball y, paddle1 y, paddle2 y, score1, score2] (stessa lista ad ogni chiamata)."""
+        snapshot = self._snapshot
+        snapshot[0] = self.tick
+        snapshot[1] = round(self.ball.x, 1)
+        snapshot[2] = round(self.ball.y, 1)
+        snapshot[3] = round(self.player1.y, 1)
+        snapshot[4] = round(self.player2.y, 1)
+        snapshot[5] = self.scores[0]
+        snapshot[6] = self.scores[1]
+        return snapshot
+
+def reset_ball(state, last_scorer):
+    ball = state.ball
+    ball.x = FIELD_WIDTH / 2
+    ball.y = FIELD_HEIGHT / 2
+    ball.dx = 0.0
+    ball.dy = 0.0
+    for paddle in (state.player1, state.player2):
+        paddle.dy = 0.0
+        paddle.y = FIELD_HEIGHT / 2 - PADDLE_HEIGHT / 2
+    state.serve_speed = BALL_SPEED
+    state.max_speed = MAX_SPEED
+    state.min_speed = MIN_SPEED
+    state.last_scorer = last_scorer
+    state.serve_timer = SERVE_DELAY
+    state.bot_target = FIELD_HEIGHT / 2
+
+def _serve(state):
+    ball, speed = state.ball, state.serve_speed
+    if state.last_scorer == 'player1':
+        ball.dx = speed
+    elif state.last_scorer == 'player2':
+        ball.dx = -speed
+    else:
+        ball.dx = speed if state.random.random() < 0.5 else -speed
+    ball.dy = speed if state.random.random() < 0.5 else -speed
+
+def _impact(state, paddle):
+    ball = state.ball
+    normalized = (ball.y - (paddle.y + PADDLE_HEIGHT / 2)) / (PADDLE_HEIGHT / 2)
+    angle = normalized * MAX_BOUNCE_ANGLE
+    speed = state.max_speed - abs(normalized) * (state.max_speed - state.min_speed)
+    ball.dx = speed * math.cos(angle)
+    ball.dy = speed * math.sin(angle)
+
+def _touches(ball, paddle):
+    return (ball.x - BALL_RADIUS < paddle.x + PADDLE_WIDTH and ball.x + BALL_RADIUS > paddle.x and
+            ball.y + BALL_RADIUS > paddle.y and ball.y - BALL_RADIUS < paddle.y + PADDLE_HEIGHT)
+
+def bot_target(state):
+    """Destination of the ball on the bot side, as calculateBallDestination()."""
+    ball = state.ball
+    if ball.dx <= 0:
+        return FIELD_HEIGHT / 2
+    x, y, dx, dy = ball.x, ball.y, ball.dx, ball.dy
+    limit = state.player2.x + PADDLE_WIDTH
+    while limit > x and x < FIELD_WIDTH:
+        x += dx
+        y += dy
+        if y + BALL_RADIUS >= FIELD_HEIGHT or y - BALL_RADIUS <= 0:
+            dy = -dy
+    if abs(math.atan2(dy, dx)) > math.pi / 5 and ball.x < FIELD_WIDTH / 2 + FIELD_WIDTH / 5:
+        return FIELD_HEIGHT / 2
+    return y
+
+def _move_bot(state):
+    if state.tick % BOT_UPDATE_TICKS == 0:
+        state.bot_target = bot_target(state)
+    paddle = state.player2
+    center = paddle.y + PADDLE_HEIGHT / 2
+    if center < state.bot_target - BOT_DEAD_ZONE:
+        paddle.dy = PADDLE_SPEED
+    elif center > state.bot_target + BOT_DEAD_ZONE:
+        paddle.dy = -PADDLE_SPEED
+    else:
+        paddle.dy = 0.0
+
+def step(state):
+    """Advance the simulation by one frame; returns True when the match has ended."""
+    if state.ended:
+        return True
+    state.tick += 1
+    ball = state.ball
+
+    if state.serve_timer:
+        state.serve_timer -= 1
+        if state.serve_timer == 0:
+            _serve(state)
+
+    ball.x += ball.dx
+    ball.y += ball.dy
+    if state.bot and ball.dx != 0:
+        _move_bot(state)
+
+    for paddle in (state.player1, state.player2):
+        paddle.y += paddle.dy
+        if paddle.y < 0:
+            paddle.y = 0.0
+        elif paddle.y + PADDLE_HEIGHT > FIELD_HEIGHT:
+            paddle.y = FIELD_HEIGHT - PADDLE_HEIGHT
+
+    # Rimbalzi sui muri
+    if ball.y + BALL_RADIUS > FIELD_HEIGHT:
+        ball.dy = -ball.dy
+        ball.y = FIELD_HEIGHT - BALL_RADIUS
+    if ball.y - BALL_RADIUS < 0:
+        ball.dy = -ball.dy
+        ball.y = BALL_RADIUS
+
+    # Collisioni con le racchette
+    if _touches(ball, state.player1):
+        state.hits += 1
+        _impact(state, state.player1)
+        ball.dx = abs(ball.dx)
+    if _touches(ball, state.player2):
+        state.hits += 1
+        _impact(state, state.player2)
+        ball.dx = -abs(ball.dx)
+    if state.hits >= HITS_PER_SPEEDUP:
+        state.hits = 0
+        state.max_speed += SPEED_STEP
+        state.min_speed += SPEED_STEP
+        state.serve_speed += SPEED_STEP
+
+    # Goal
+    if ball.x < 0 or ball.x > FIELD_WIDTH:
+        scorer = 'player2' if ball.x < 0 else 'player1'
+        state.scores[0 if scorer == 'player1' else 1] += 1
+        state.hits = 0
+        if max(state.scores) >= state.winning_score:
+            state.ended = True
+            return True
+        reset_ball(state, scorer)
+    return False
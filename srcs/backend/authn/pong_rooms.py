@@ -0,0 +1,196 @@
+"""
+Description: Server-side Pong rooms driven by a single fixed-timestep loop.
+
+Main content:
+1. class: PongRoom
+2. class: RoomManager
+3. object: ROOMS
+
+All the rooms of a process are advanced by one asyncio task at TICK_RATE (60)
+steps per second: no task or timer per room, so thousands of rooms share one
+event loop. A late tick is caught up with at most PONG_MAX_CATCH_UP extra steps,
+then the clock is reset instead of spiralling. When a match ends the result is
+saved with record_matches in the executor, so the score is decided by the server
+and not posted by the browser.
+
+A local room is created by its first player, who names the opponent: only that
+uid can take the other side (admits), so nobody can sit in someone else's match
+by guessing its room id. A bot room has no other seat.
+
+Sockets only need an async send(text_data=...) method (the consumer, or a fake
+socket in the benchmark). A room lives in the process that created it, so the
+proxy must keep the two players of a room on the same worker.
+"""
+
+import asyncio
+import json
+import logging
+from django.conf import settings
+from .executor import run_sync
+from .matches import BOT_UID, parse_result, record_matches
+from .pong_engine import PongState, TICK_RATE, step
+
+LOGGER = logging.getLogger('web')
+
+ROOM_MODES = ('local', 'bot')
+
+class PongRoom:
+    __slots__ = ('room_id', 'mode', 'state', 'players', 'invited', 'sockets', 'started')
+
+    def __init__(self, room_id, mode, winning_score=None, invited=None):
+        self.room_id = room_id
+        self.mode = mode
+        if winning_score is None:
+            self.state = PongState(bot=mode == 'bot')
+        else:
+            self.state = PongState(bot=mode == 'bot', winning_score=winning_score)
+        # uid del giocatore di sinistra e di destra
+        self.players = [None, BOT_UID if mode == 'bot' else None]
+        # uid dell'avversario invitato dal creatore (None contro il bot)
+        self.invited = invited
+        # socket -> lato (1 o 2)
+        self.sockets = {}
+        self.started = False
+
+    @property
+    def full(self):
+        return None not in self.players
+
+class RoomManager:
+    def __init__(self, record=True):
+        self._rooms = {}
+        self._task = None
+        self._finishing = set()
+        self._record = record
+        # Statistiche del loop, lette dal benchmark
+        self.ticks = 0
+        self.late_ticks = 0
+        self.dropped_ticks = 0
+
+    @property
+    def max_rooms(self):
+        return getattr(settings, 'PONG_MAX_ROOMS', 5000)
+
+    def __len__(self):
+        return len(self._rooms)
+
+    def admits(self, room_id, uid, mode='local', opponent=None):
+        """Whether uid can join room_id: as the creator (naming opponent in local mode) or as the invited player."""
+        room = self._rooms.get(room_id)
+        if room is None:
+            # Contro il bot da soli, in locale solo con un avversario invitato
+            return mode in ROOM_MODES and (mode == 'bot' or (bool(opponent) and opponent != uid))
+        return not room.full and uid == room.invited and uid not in room.players
+
+    async def join(self, room_id, socket, uid, mode='local', winning_score=None, opponent=None):
+        """Add a player to a room (created on demand); return its side, or None if it can't join."""
+        if not self.admits(room_id, uid, mode, opponent):
+            return None
+        room = self._rooms.get(room_id)
+        if room is None:
+            if len(self._rooms) >= self.max_rooms:
+                return None
+            room = self._rooms[room_id] = PongRoom(room_id, mode, winning_score,
+                                                   invited=opponent if mode == 'local' else None)
+
+        side = room.players.index(None) + 1
+        room.players[side - 1] = uid
+        room.sockets[socket] = side
+        if room.full:
+            room.started = True
+            await self._broadcast(room, json.dumps({'type': 'start', 'players': room.players}))
+        self._ensure_running()
+        return side
+
+    async def leave(self, room_id, socket):
+        """Remove a socket; a match abandoned before the end is closed without a result."""
+        room = self._rooms.get(room_id)
+        if room is None or socket not in room.sockets:
+            return
+        side = room.sockets.pop(socket)
+        if not room.started:
+            room.players[side - 1] = None
+        if room.sockets and room.started:
+            await self._broadcast(room, json.dumps({'type': 'abandoned', 'side': side}))
+        if room.started or not room.sockets:
+            self._rooms.pop(room_id, None)
+            LOGGER.info('Pong room %s closed', room_id)
+
+    def move(self, room_id, socket, direction):
+        room = self._rooms.get(room_id)
+        if room is None or not room.started:
+            return
+        side = room.sockets.get(socket)
+        if side is not None:
+            room.state.set_direction(side, direction)
+
+    def _ensure_running(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        interval = 1 / TICK_RATE
+        max_catch_up = getattr(settings, 'PONG_MAX_CATCH_UP', 3)
+        next_tick = loop.time()
+        while self._rooms:
+            finished = await self._tick()
+            for room in finished:
+                self._rooms.pop(room.room_id, None)
+                # Riferimento tenuto fino alla fine del salvataggio del risultato
+                task = loop.create_task(self._finish(room))
+                self._finishing.add(task)
+                task.add_done_callback(self._finishing.discard)
+
+            next_tick += interval
+            delay = next_tick - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+            self.late_ticks += 1
+            # Troppo indietro: si perdono dei tick invece di accumulare ritardo
+            if -delay > interval * max_catch_up:
+                self.dropped_ticks += int(-delay / interval)
+                next_tick = loop.time()
+            await asyncio.sleep(0)
+
+    async def _tick(self):
+        self.ticks += 1
+        finished = []
+        sends = []
+        for room in self._rooms.values():
+            if not room.started:
+                continue
+            if step(room.state):
+                finished.append(room)
+            message = json.dumps({'type': 'state', 'data': room.state.snapshot()}, separators=(',', ':'))
+            sends.extend(socket.send(text_data=message) for socket in room.sockets)
+        if sends:
+            await asyncio.gather(*sends, return_exceptions=True)
+        return finished
+
+    async def _finish(self, room):
+        state = room.state
+        message = {'type': 'end', 'winner': state.winner, 'scores': list(state.scores)}
+        if self._record:
+            result = parse_result({
+                'player1_uid': room.players[0],
+                'player2_uid': room.players[1],
+                'mode': room.mode,
+                'p1_score': state.scores[0],
+                'p2_score': state.scores[1],
+            })
+            try:
+                await run_sync(record_matches, 'pong', [result])
+            except Exception as e:
+                LOGGER.error('Pong room %s: result not saved: %s', room.room_id, e)
+                message['saved'] = False
+            else:
+                message['saved'] = True
+                LOGGER.info('Pong room %s finished %s-%s', room.room_id, state.scores[0], state.scores[1])
+        await self._broadcast(room, json.dumps(message))
+
+    async def _broadcast(self, room, message):
+        await asyncio.gather(*(socket.send(text_data=message) for socket in room.sockets), return_exceptions=True)
+
+ROOMS = RoomManager()
@@ -0,0 +1,154 @@
+"""
+Description: Heartbeat-based presence (online/offline status) of the users.
+
+Main content:
+1. class: PresenceRegistry
+2. object: PRESENCE
+3. function: check_shared_cache()
+
+A heartbeat only refreshes a cache entry that expires after PRESENCE_TTL
+seconds, so a user who closes the tab goes offline on its own. Status changes
+are queued in memory and written by a background thread with at most one
+UPDATE per status value every PRESENCE_FLUSH_INTERVAL seconds, instead of a
+full-row save for every login, logout and profile update.
+
+The heartbeats live in the cache, the users to expire in the set of the process
+that saw them go online: with more than one server process (WEB_CONCURRENCY)
+the cache must be shared (REDIS_URL), or every process would see its own
+statuses. check_shared_cache refuses to start otherwise.
+"""
+
+import logging
+import threading
+import time
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import close_old_connections
+from .models import User
+
+LOGGER = logging.getLogger('web')
+
+ONLINE = 'online'
+OFFLINE = 'offline'
+
+class PresenceRegistry:
+    key_prefix = 'presence:'
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._watched = set()
+        self._thread = None
+
+    @property
+    def ttl(self):
+        return getattr(settings, 'PRESENCE_TTL', 90)
+
+    @property
+    def flush_interval(self):
+        return getattr(settings, 'PRESENCE_FLUSH_INTERVAL', 10)
+
+    def _key(self, uid):
+        return f'{self.key_prefix}{uid}'
+
+    def _queue(self, uid, status):
+        with self._lock:
+            self._pending[uid] = status
+            if status == ONLINE:
+                self._watched.add(uid)
+            else:
+                self._watched.discard(uid)
+        self._start()
+
+    def heartbeat(self, uid):
+        if cache.get(self._key(uid)) is None:
+            self._queue(uid, ONLINE)
+        cache.set(self._key(uid), time.time(), self.ttl)
+
+    def online(self, uid):
+        cache.set(self._key(uid), time.time(), self.ttl)
+        self._queue(uid, ONLINE)
+
+    def offline(self, uid):
+        cache.delete(self._key(uid))
+        self._queue(uid, OFFLINE)
+
+    def rename(self, old_uid, new_uid):
+        last_seen = cache.get(self._key(old_uid))
+        cache.delete(self._key(old_uid))
+        with self._lock:
+            self._pending.pop(old_uid, None)
+            self._watched.discard(old_uid)
+        if last_seen is not None:
+            self.online(new_uid)
+
+    def statuses(self, uids):
+        """Return {uid: status} for uids, without touching the database."""
+        alive = cache.get_many([self._key(uid) for uid in uids])
+        return {uid: ONLINE if self._key(uid) in alive else OFFLINE for uid in uids}
+
+    def status(self, uid):
+        return ONLINE if cache.get(self._key(uid)) is not None else OFFLINE
+
+    def _expire(self):
+        # Gli utenti senza heartbeat recente tornano offline
+        with self._lock:
+            watched = list(self._watched)
+        if not watched:
+            return
+        alive = cache.get_many([self._key(uid) for uid in watched])
+        with self._lock:
+            for uid in watched:
+                if self._key(uid) not in alive and uid in self._watched:
+                    self._watched.discard(uid)
+                    self._pending[uid] = OFFLINE
+
+    def flush(self):
+        """Write the queued status changes with one UPDATE per status value."""
+        self._expire()
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        by_status = {}
+        for uid, status in pending.items():
+            by_status.setdefault(status, []).append(uid)
+        try:
+            for status, uids in by_status.items():
+                User.objects.filter(uid__in=uids).exclude(status=status).update(status=status)
+        except Exception as e:
+            LOGGER.error('Error flushing presence: %s', e)
+            with self._lock:
+                for uid, status in pending.items():
+                    self._pending.setdefault(uid, status)
+            return 0
+        return len(pending)
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            finally:
+                close_old_connections()
+
+    def _start(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='presence-flusher', daemon=True)
+                self._thread.start()
+
+PRESENCE = PresenceRegistry()
+
+def check_shared_cache():
+    """Raise ImproperlyConfigured if more than one server process uses a per-process cache."""
+    workers = getattr(settings, 'WEB_CONCURRENCY', 1)
+    if workers > 1 and isinstance(caches['default'], LocMemCache):
+        raise ImproperlyConfigured(
+            f'WEB_CONCURRENCY is {workers} but the cache is local memory: '
+            'set REDIS_URL so that presence and the cached responses are shared by the workers'
+        )
@@ -0,0 +1,143 @@
+"""
+Description: Elo ratings of the players, one per game.
+
+Main content:
+1. function: rate(ratings, player1_id, player2_id, winner, k, bot_rating)
+2. function: load_matches(game)
+3. function: recompute(player1, player2, scores, k, initial, bot_rating)
+4. function: save_ratings(game, player_ids, ratings, initial)
+
+Ratings are updated inside record_matches, in the same transaction as the
+counters. The full recompute gives exactly the same numbers without touching
+ORM objects: the matches are read as integer arrays and split in "waves" where
+no player appears twice, keeping the order of the matches of every player;
+each wave is then a handful of vectorized NumPy operations.
+"""
+
+import numpy as np
+from django.conf import settings
+from django.db import connection, transaction
+from .models import Player, Match
+from .archive import ARCHIVE, WINNERS
+
+# Punteggio del player1 per ogni valore di winner
+SCORES = {'player1': 1.0, 'draw': 0.5, 'player2': 0.0}
+UPDATE_BATCH_SIZE = 10000
+
+def rating_params():
+    """(k, initial rating, rating of the bot AM) from the settings."""
+    return (
+        getattr(settings, 'RATING_K', 32.0),
+        Player._meta.get_field('rating').default,
+        getattr(settings, 'RATING_BOT', 1500.0),
+    )
+
+def rate(ratings, player1_id, player2_id, winner, k, bot_rating):
+    """Apply one match to ratings (player id -> rating); player2_id is None for the bot."""
+    rating1 = ratings[player1_id]
+    rating2 = bot_rating if player2_id is None else ratings[player2_id]
+    expected = 1 / (1 + 10 ** ((rating2 - rating1) / 400))
+    delta = k * (SCORES[winner] - expected)
+    ratings[player1_id] = rating1 + delta
+    if player2_id is not None:
+        ratings[player2_id] = rating2 - delta
+
+def load_matches(game, chunk_size=500000):
+    """Return (player1, player2, score) arrays of all the matches of game, in save order.
+
+    player2 is -1 for the bot and score is the result of player1 (1, 0.5, 0).
+    The archived matches (archive.py) come first, in their place by id.
+    """
+    chunks = []
+    # Cursore lato server su Postgres: le righe arrivano a blocchi, non tutte insieme
+    with transaction.atomic(), connection.chunked_cursor() as cursor:
+        cursor.execute(
+            f'SELECT id, player1_id, COALESCE(player2_id, -1), '
+            f"CASE winner WHEN 'player1' THEN 2 WHEN 'draw' THEN 1 ELSE 0 END "
+            f'FROM {Match._meta.db_table} WHERE game = %s ORDER BY id',
+            [game]
+        )
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            chunks.append(np.array(rows, dtype=np.int64))
+
+    ids, player1, player2, winner = ARCHIVE.matches(game)
+    if len(ids):
+        # Stessa codifica del CASE: 2 vince player1, 1 pareggio, 0 vince player2
+        codes = np.array([{'player1': 2, 'draw': 1, 'player2': 0}[name] for name in WINNERS], dtype=np.int64)
+        chunks.insert(0, np.column_stack([ids, player1, player2, codes[winner]]))
+    if not chunks:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, np.empty(0)
+    data = np.concatenate(chunks)
+    if len(ids):
+        data = data[np.argsort(data[:, 0], kind='stable')]
+    return data[:, 1], data[:, 2], data[:, 3] / 2
+
+def _waves(player1, player2, bot):
+    """Wave of each match: one more than the last wave of both its players."""
+    last = [0] * (bot + 1)
+    waves = []
+    append = waves.append
+    for a, b in zip(player1.tolist(), player2.tolist()):
+        wave = last[a]
+        if b != bot and last[b] > wave:
+            wave = last[b]
+        wave += 1
+        last[a] = wave
+        if b != bot:
+            last[b] = wave
+        append(wave)
+    return np.array(waves, dtype=np.int64)
+
+def recompute(player1, player2, scores, k, initial, bot_rating):
+    """Replay every match; return (player ids, ratings) of the players that played."""
+    if not len(player1):
+        return np.empty(0, dtype=np.int64), np.empty(0)
+    # Indici densi 0..n-1, il bot diventa l'indice n
+    # (gli id sono interi limitati: una tabella di lookup evita l'ordinamento di np.unique)
+    has_opponent = player2 >= 0
+    present = np.zeros(max(player1.max(), player2.max()) + 1, dtype=bool)
+    present[player1] = True
+    present[player2[has_opponent]] = True
+    player_ids = np.flatnonzero(present)
+    bot = len(player_ids)
+    lookup = np.full(len(present), bot, dtype=np.int64)
+    lookup[player_ids] = np.arange(bot)
+    index1 = lookup[player1]
+    index2 = np.where(has_opponent, lookup[player2], bot)
+
+    waves = _waves(index1, index2, bot)
+    order = np.argsort(waves, kind='stable')
+    index1, index2, scores = index1[order], index2[order], scores[order]
+    bounds = np.concatenate([[0], np.cumsum(np.bincount(waves)[1:])])
+
+    ratings = np.full(bot + 1, initial, dtype=np.float64)
+    ratings[bot] = bot_rating
+    for start, end in zip(bounds[:-1].tolist(), bounds[1:].tolist()):
+        a, b = index1[start:end], index2[start:end]
+        rating1, rating2 = ratings[a], ratings[b]
+        delta = k * (scores[start:end] - 1 / (1 + 10 ** ((rating2 - rating1) / 400)))
+        ratings[a] = rating1 + delta
+        ratings[b] = rating2 - delta
+        # Il rating del bot non cambia
+        ratings[bot] = bot_rating
+    return player_ids, ratings[:bot]
+
+def save_ratings(game, player_ids, ratings, initial):
+    """Write the recomputed ratings (initial for players without matches) in batches."""
+    table = Player._meta.db_table
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'UPDATE {table} SET rating = %s WHERE game_type = %s', [initial, game])
+        for start in range(0, len(player_ids), UPDATE_BATCH_SIZE):
+            ids = player_ids[start:start + UPDATE_BATCH_SIZE].tolist()
+            values = ratings[start:start + UPDATE_BATCH_SIZE].tolist()
+            placeholders = ', '.join(['(%s, %s)'] * len(ids))
+            params = [param for pair in zip(ids, values) for param in pair]
+            cursor.execute(
+                f'UPDATE {table} SET rating = v.rating FROM (VALUES {placeholders}) AS v(id, rating) '
+                f'WHERE {table}.id = v.id',
+                params
+            )
@@ -0,0 +1,171 @@
+"""
+Description: Cache of the read endpoints' responses, with ETags and invalidation on write.
+
+Main content:
+1. class: ResponseCache
+2. function: cached_response(resource)
+3. function: acached_response(resource, factory)
+4. object: RESPONSE_CACHE
+5. functions: user_resource, player_resource, matches_resource, leaderboard_resource, friend_requests_resource
+
+Every cached response belongs to a resource ('user:<uid>', 'player:<game>:<uid>',
+'leaderboard:<game>', ...). A resource has a version token in the shared cache
+and the writes that change it (record_matches, InfoView.put, FriendRequestView)
+replace the token: old entries are never read again and expire on their own.
+
+Entries carry a strong ETag (hash of the JSON body): a matching If-None-Match
+gets a 304 without body. After RESPONSE_CACHE_TTL seconds an entry is stale but
+is still served for RESPONSE_CACHE_STALE seconds more, while a single request
+(the one that takes the revalidation lock) recomputes it.
+"""
+
+import hashlib
+import json
+import time
+import uuid
+from functools import wraps
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponseNotModified
+from django.utils.http import parse_etags
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+# Header copiati nella risposta servita dalla cache
+CACHED_HEADERS = ('X-Total-Count',)
+
+class ResponseCache:
+    prefix = 'response:'
+
+    @property
+    def ttl(self):
+        return getattr(settings, 'RESPONSE_CACHE_TTL', 60)
+
+    @property
+    def stale(self):
+        return getattr(settings, 'RESPONSE_CACHE_STALE', 300)
+
+    def _version_keys(self, resource):
+        return f'{self.prefix}epoch', f'{self.prefix}v:{resource}'
+
+    def _entry_key(self, resource, versions, request):
+        epoch_key, version_key = self._version_keys(resource)
+        # La variante comprende la view (path) e i parametri della query
+        query = '&'.join(f'{key}={value}' for key, value in sorted(request.GET.items()))
+        variant = hashlib.sha1(f'{request.path}?{query}'.encode()).hexdigest()[:16]
+        return f'{self.prefix}{resource}:{versions.get(epoch_key, 0)}:{versions.get(version_key, 0)}:{variant}'
+
+    def invalidate(self, *resources):
+        token = uuid.uuid4().hex
+        cache.set_many({self._version_keys(resource)[1]: token for resource in resources}, None)
+
+    def invalidate_all(self):
+        """After bulk rewrites (ratings recompute, backfills) that touch every resource."""
+        cache.set(f'{self.prefix}epoch', uuid.uuid4().hex, None)
+
+    @staticmethod
+    def _not_modified(request, etag):
+        return etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))
+
+    def _respond(self, request, entry, factory):
+        if self._not_modified(request, entry['etag']):
+            response = HttpResponseNotModified()
+        else:
+            response = factory(entry['data'], entry['status'])
+            for header, value in entry['headers'].items():
+                response[header] = value
+        response['ETag'] = entry['etag']
+        response['Cache-Control'] = f'private, max-age=0, stale-while-revalidate={self.stale}'
+        return response
+
+    def _entry(self, response):
+        # Response DRF (data non ancora renderizzati) o JsonResponse delle view async
+        data = response.data if hasattr(response, 'data') else json.loads(response.content)
+        body = json.dumps(data, cls=JSONEncoder, sort_keys=True, separators=(',', ':'))
+        return {
+            'etag': f'"{hashlib.sha1(body.encode()).hexdigest()}"',
+            'status': response.status_code,
+            'data': json.loads(body),
+            'headers': {header: response[header] for header in CACHED_HEADERS if response.has_header(header)},
+            'stored_at': time.time(),
+        }
+
+    def _fresh(self, entry):
+        return time.time() - entry['stored_at'] < self.ttl
+
+    def serve(self, request, resource, compute, factory):
+        """Response for request from the cache, or from compute() when missing or stale."""
+        versions = cache.get_many(self._version_keys(resource))
+        key = self._entry_key(resource, versions, request)
+        entry = cache.get(key)
+        # Entry scaduta: la ricalcola solo chi prende il lock, gli altri ricevono quella vecchia
+        if entry is not None and (self._fresh(entry) or not cache.add(f'{key}:lock', 1, self.ttl)):
+            return self._respond(request, entry, factory)
+        return self._store(request, key, compute(), factory)
+
+    async def aserve(self, request, resource, compute, factory):
+        versions = await cache.aget_many(self._version_keys(resource))
+        key = self._entry_key(resource, versions, request)
+        entry = await cache.aget(key)
+        if entry is not None and (self._fresh(entry) or not await cache.aadd(f'{key}:lock', 1, self.ttl)):
+            return self._respond(request, entry, factory)
+        response = await compute()
+        # Solo le risposte 200 vengono messe in cache
+        if response.status_code != 200:
+            return response
+        entry = self._entry(response)
+        await cache.aset(key, entry, self.ttl + self.stale)
+        await cache.adelete(f'{key}:lock')
+        return self._respond(request, entry, factory)
+
+    def _store(self, request, key, response, factory):
+        if response.status_code != 200:
+            return response
+        entry = self._entry(response)
+        cache.set(key, entry, self.ttl + self.stale)
+        cache.delete(f'{key}:lock')
+        return self._respond(request, entry, factory)
+
+RESPONSE_CACHE = ResponseCache()
+
+def _drf_response(data, status_code):
+    return Response(data, status=status_code)
+
+def cached_response(resource):
+    """Decorator for the get() of a DRF view; resource(view, request) names the cached resource."""
+    def decorator(method):
+        @wraps(method)
+        def wrapper(view, request, *args, **kwargs):
+            name = resource(view, request)
+            if name is None:
+                return method(view, request, *args, **kwargs)
+            return RESPONSE_CACHE.serve(request, name, lambda: method(view, request, *args, **kwargs), _drf_response)
+        return wrapper
+    return decorator
+
+def acached_response(resource, factory):
+    """Same as cached_response for the async views, with factory building their responses."""
+    def decorator(method):
+        @wraps(method)
+        async def wrapper(view, request, *args, **kwargs):
+            name = resource(view, request)
+            if name is None:
+                return await method(view, request, *args, **kwargs)
+            return await RESPONSE_CACHE.aserve(request, name, lambda: method(view, request, *args, **kwargs), factory)
+        return wrapper
+    return decorator
+
+def user_resource(uid):
+    return f'user:{uid}'
+
+def player_resource(game, uid):
+    return f'player:{game}:{uid}'
+
+def matches_resource(game, uid):
+    return f'matches:{game}:{uid}'
+
+def leaderboard_resource(game):
+    return f'leaderboard:{game}'
+
+def friend_requests_resource(uid):
+    return f'friend_requests:{uid}'
@@ -0,0 +1,128 @@
+"""
+Description: Daily per-player match rollups and the analytics read from them.
+
+Main content:
+1. function: apply_matches(matches)
+2. function: player_stats(player, mode, start, end)
+
+Every saved match adds one row per player, mode and day (and one for mode
+'all'), in the same transaction as record_matches: the Player rows of both
+players are already locked there, so two requests never create the same row.
+The analytics read at most one row per day of the range through the
+(player, day, mode) unique index, whatever the number of matches.
+
+Win streaks cross day boundaries thanks to the streak at the start and at the
+end of each day, stored with the best streak of the day.
+"""
+
+from django.utils import timezone
+from .models import PlayerDailyStats
+
+MODE_ALL = 'all'
+COUNTER_FIELDS = ['played', 'won', 'drawn', 'points_for', 'points_against',
+                  'win_streak_start', 'win_streak_end', 'best_win_streak']
+
+def match_day(date):
+    return timezone.localdate(date) if timezone.is_aware(date) else date.date()
+
+def add_result(row, outcome, points_for, points_against):
+    """Add one result ('won', 'drawn' or 'lost') at the end of the day of row."""
+    if outcome == 'won':
+        if row.win_streak_start == row.played:
+            row.win_streak_start += 1
+        row.win_streak_end += 1
+        row.best_win_streak = max(row.best_win_streak, row.win_streak_end)
+        row.won += 1
+    else:
+        row.win_streak_end = 0
+        if outcome == 'drawn':
+            row.drawn += 1
+    row.played += 1
+    row.points_for += points_for
+    row.points_against += points_against
+
+def match_sides(match):
+    """(player id, outcome, points for, points against) of each human player of a match."""
+    if match.winner == 'draw':
+        outcomes = ('drawn', 'drawn')
+    elif match.winner == 'player1':
+        outcomes = ('won', 'lost')
+    else:
+        outcomes = ('lost', 'won')
+    sides = [(match.player1_id, outcomes[0], match.player1_result, match.player2_result)]
+    if match.player2_id is not None:
+        sides.append((match.player2_id, outcomes[1], match.player2_result, match.player1_result))
+    return sides
+
+def apply_matches(matches):
+    """Add already saved matches (in save order) to the rollups."""
+    updates = []
+    for match in matches:
+        day = match_day(match.date)
+        for player_id, outcome, points_for, points_against in match_sides(match):
+            updates.append(((player_id, day, match.mode), outcome, points_for, points_against))
+            updates.append(((player_id, day, MODE_ALL), outcome, points_for, points_against))
+    if not updates:
+        return
+
+    keys = {key for key, *_ in updates}
+    rows = {
+        (row.player_id, row.day, row.mode): row
+        for row in PlayerDailyStats.objects.filter(
+            player_id__in={key[0] for key in keys}, day__in={key[1] for key in keys}
+        )
+    }
+    existing = set(rows)
+    for key, outcome, points_for, points_against in updates:
+        row = rows.get(key)
+        if row is None:
+            row = rows[key] = PlayerDailyStats(player_id=key[0], day=key[1], mode=key[2])
+        add_result(row, outcome, points_for, points_against)
+
+    PlayerDailyStats.objects.bulk_create([row for key, row in rows.items() if key not in existing])
+    updated = [row for key, row in rows.items() if key in existing and key in keys]
+    if updated:
+        PlayerDailyStats.objects.bulk_update(updated, COUNTER_FIELDS)
+
+def player_stats(player, mode, start, end):
+    """Per-day series, totals and win streaks of player between start and end (included)."""
+    rows = PlayerDailyStats.objects.filter(player=player, day__gte=start, day__lte=end).order_by('day') \
+        .values('day', 'mode', *COUNTER_FIELDS)
+
+    series = []
+    modes = {}
+    current = best = 0
+    for row in rows:
+        if row['mode'] != MODE_ALL:
+            totals = modes.setdefault(row['mode'], {'played': 0, 'won': 0, 'drawn': 0})
+            for field in totals:
+                totals[field] += row[field]
+        if row['mode'] != mode:
+            continue
+
+        played, won = row['played'], row['won']
+        series.append({
+            'day': row['day'].isoformat(),
+            'played': played,
+            'won': won,
+            'drawn': row['drawn'],
+            'lost': played - won - row['drawn'],
+            'win_rate': round(won / played, 3) if played else None,
+            'points_for': row['points_for'],
+            'points_against': row['points_against'],
+        })
+        # La serie in corso continua solo se il giorno inizia con una vittoria
+        best = max(best, row['best_win_streak'], current + row['win_streak_start'])
+        current = current + played if row['win_streak_start'] == played else row['win_streak_end']
+
+    played = sum(day['played'] for day in series)
+    won = sum(day['won'] for day in series)
+    return {
+        'series': series,
+        'modes': modes,
+        'played': played,
+        'won': won,
+        'win_rate': round(won / played, 3) if played else None,
+        'current_win_streak': current,
+        'best_win_streak': max(best, current),
+    }
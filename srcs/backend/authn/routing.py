@@ -0,0 +1,14 @@
+"""
+Description: WebSocket routes of the authn app.
+
+Main content:
+1. array: websocket_urlpatterns
+"""
+
+from django.urls import path
+from .consumers import PresenceConsumer, PongConsumer
+
+websocket_urlpatterns = [
+    path('ws/presence/', PresenceConsumer.as_asgi(), name='ws_presence'),
+    path('ws/pong/<str:room_id>/', PongConsumer.as_asgi(), name='ws_pong'),
+]
@@ -0,0 +1,166 @@
+"""
+Description: Player search by username (prefix and typo-tolerant).
+
+Main content:
+1. function: trigrams(text)
+2. class: NgramIndex
+3. function: search_players(query, exclude_uid, offset, limit)
+
+On Postgres the search uses the pg_trgm GIN indexes declared on User. With any
+other database it falls back to an in-process trigram index, loaded once and
+kept up to date by the signup and profile views. A query shorter than a trigram
+has nothing for the trigram indexes to narrow down: it's a prefix search only,
+on the user_username_upper_prefix B-tree index.
+"""
+
+import bisect
+import threading
+import time
+from collections import Counter
+from django.conf import settings
+from django.db import connection, models
+from django.db.models.functions import Upper
+from .models import User
+
+MIN_SIMILARITY = 0.3
+# Lunghezza minima della query per la ricerca per similarità
+MIN_TRIGRAM_LENGTH = 3
+
+def trigrams(text):
+    padded = f'  {text.lower()} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def use_trigram_backend():
+    backend = getattr(settings, 'SEARCH_BACKEND', 'auto')
+    if backend == 'auto':
+        return connection.vendor == 'postgresql'
+    return backend == 'trigram'
+
+class NgramIndex:
+    """Inverted trigram index over usernames, kept in process memory."""
+
+    def __init__(self, max_age=None):
+        self._lock = threading.RLock()
+        self._max_age = max_age
+        self._loaded_at = None
+        self._postings = {}
+        self._users = {}
+        self._sorted = []
+
+    @property
+    def max_age(self):
+        if self._max_age is not None:
+            return self._max_age
+        return getattr(settings, 'SEARCH_INDEX_MAX_AGE', 300)
+
+    def _ensure_loaded(self):
+        if self._loaded_at is None or (self.max_age and time.monotonic() - self._loaded_at > self.max_age):
+            self._postings, self._users = {}, {}
+            for uid, username in User.objects.values_list('uid', 'username').iterator():
+                self._index(uid, username)
+            # Un solo ordinamento alla fine invece di un insort per utente
+            self._sorted = sorted((username.lower(), uid) for uid, username in self._users.items())
+            self._loaded_at = time.monotonic()
+
+    def _index(self, uid, username):
+        self._users[uid] = username
+        for gram in trigrams(username):
+            self._postings.setdefault(gram, set()).add(uid)
+
+    def _add(self, uid, username):
+        self._index(uid, username)
+        bisect.insort(self._sorted, (username.lower(), uid))
+
+    def _remove(self, uid):
+        username = self._users.pop(uid, None)
+        if username is None:
+            return
+        for gram in trigrams(username):
+            postings = self._postings.get(gram)
+            if postings:
+                postings.discard(uid)
+        index = bisect.bisect_left(self._sorted, (username.lower(), uid))
+        if index < len(self._sorted) and self._sorted[index] == (username.lower(), uid):
+            del self._sorted[index]
+
+    def add(self, uid, username):
+        with self._lock:
+            if self._loaded_at is not None:
+                self._remove(uid)
+                self._add(uid, username)
+
+    def remove(self, uid):
+        with self._lock:
+            if self._loaded_at is not None:
+                self._remove(uid)
+
+    def rename(self, old_uid, new_uid, username):
+        with self._lock:
+            if self._loaded_at is not None:
+                self._remove(old_uid)
+                self._add(new_uid, username)
+
+    def search(self, query, exclude_uid=None, offset=0, limit=10):
+        query = query.lower()
+        with self._lock:
+            self._ensure_loaded()
+
+            # Prefisso: range sulla lista ordinata degli username, sempre in testa
+            prefix = []
+            position = bisect.bisect_left(self._sorted, (query,))
+            while position < len(self._sorted) and len(prefix) < offset + limit:
+                name, uid = self._sorted[position]
+                if not name.startswith(query):
+                    break
+                if uid != exclude_uid:
+                    prefix.append(uid)
+                position += 1
+            if len(prefix) >= offset + limit or len(query) < MIN_TRIGRAM_LENGTH:
+                return prefix[offset:offset + limit]
+
+            # Similarità: coefficiente di Jaccard sui trigrammi condivisi
+            query_grams = trigrams(query)
+            shared = Counter()
+            for gram in query_grams:
+                shared.update(self._postings.get(gram, ()))
+            matched = set(prefix)
+            scores = []
+            for uid, count in shared.items():
+                if uid in matched or uid == exclude_uid:
+                    continue
+                username = self._users[uid]
+                similarity = count / (len(query_grams) + len(trigrams(username)) - count)
+                if similarity >= MIN_SIMILARITY or query in username.lower():
+                    scores.append((-similarity, uid))
+
+        scores.sort()
+        ranked = prefix + [uid for _, uid in scores]
+        return ranked[offset:offset + limit]
+
+SEARCH_INDEX = NgramIndex()
+
+def search_players(query, exclude_uid=None, offset=0, limit=10):
+    """Return the uids matching query, best matches first."""
+    if not use_trigram_backend():
+        return SEARCH_INDEX.search(query, exclude_uid, offset, limit)
+
+    from django.contrib.postgres.search import TrigramSimilarity
+
+    if len(query) < MIN_TRIGRAM_LENGTH:
+        # Solo prefisso, sull'indice user_username_upper_prefix
+        players = User.objects.filter(username__istartswith=query).exclude(uid=exclude_uid) \
+            .order_by(Upper('username'), 'uid')
+        return list(players.values_list('uid', flat=True)[offset:offset + limit])
+
+    # Le lookup icontains/trigram_similar usano gli indici GIN pg_trgm di User
+    players = User.objects.filter(
+        models.Q(username__icontains=query) | models.Q(username__trigram_similar=query)
+    ).exclude(uid=exclude_uid).annotate(
+        similarity=TrigramSimilarity('username', query),
+        prefix=models.Case(
+            models.When(username__istartswith=query, then=models.Value(1)),
+            default=models.Value(0),
+            output_field=models.IntegerField()
+        )
+    ).order_by('-prefix', '-similarity', 'uid')
+    return list(players.values_list('uid', flat=True)[offset:offset + limit])
@@ -7,11 +7,19 @@ Main content:
 
 from rest_framework import serializers
 from .models import User, Friendship, Player, Match
+from .presence import PRESENCE
+from .avatars import avatar_urls
 
 class UserSerializer(serializers.ModelSerializer):
+    # URL delle miniature per misura e formato (vedi avatars.py)
+    image_variants = serializers.SerializerMethodField()
+
     class Meta:
         model = User
-        fields = ['uid', 'username', 'email', 'description', 'image', 'language']
+        fields = ['uid', 'username', 'email', 'description', 'image', 'image_variants', 'language']
+
+    def get_image_variants(self, obj):
+        return avatar_urls(obj.image)
 
 class LoginSerializer(serializers.ModelSerializer):
     class Meta:
@@ -19,9 +27,22 @@ class LoginSerializer(serializers.ModelSerializer):
         fields = ['uid', 'language']
 
 class FriendSerializer(serializers.ModelSerializer):
+    # Lo stato arriva dal registro di presenza (passato nel context per evitare una lettura per riga)
+    status = serializers.SerializerMethodField()
+    image_variants = serializers.SerializerMethodField()
+
     class Meta:
         model = User
-        fields = ['uid', 'username', 'status']
+        fields = ['uid', 'username', 'status', 'image_variants']
+
+    def get_image_variants(self, obj):
+        return avatar_urls(obj.image)
+
+    def get_status(self, obj):
+        statuses = self.context.get('presence')
+        if statuses is not None:
+            return statuses.get(obj.uid, 'offline')
+        return PRESENCE.status(obj.uid)
 
 class FriendRequestSerializer(serializers.ModelSerializer):
     sender_uid = serializers.CharField(source='sender.uid', read_only=True)
@@ -34,13 +55,7 @@ class PlayerSerializer(serializers.ModelSerializer):
     player_uid = serializers.CharField(source='user.uid', read_only=True)
     class Meta:
         model = Player
-        fields = ['player_uid', 'TOTP', 'TOTW', 'TW', 'PVPP', 'PVPW', 'PVEP', 'PVEW', 'TMAP', 'TMAW'] 
-
-class LeaderboardSerializer(serializers.ModelSerializer):
-    player_uid = serializers.CharField(source='user.uid', read_only=True)
-    class Meta:
-        model = Player
-        fields = ['player_uid', 'TOTP', 'TOTW']
+        fields = ['player_uid', 'TOTP', 'TOTW', 'TW', 'PVPP', 'PVPW', 'PVEP', 'PVEW', 'TMAP', 'TMAW', 'rating'] 
 
 class MatchSerializer(serializers.ModelSerializer):
     player1_uid = serializers.CharField(source='player1.user.uid', read_only=True)
@@ -49,9 +64,4 @@ class MatchSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Match
-        fields = ['player1_uid', 'player2_uid', 'bot_name', 'player1_result', 'player2_result', 'mode', 'winner', 'date']
-
-class SearchPlayerSerializer(serializers.ModelSerializer):
-    class Meta:
-        model = User
-        fields = ['uid']
\ No newline at end of file
+        fields = ['player1_uid', 'player2_uid', 'bot_name', 'player1_result', 'player2_result', 'mode', 'winner', 'date']
\ No newline at end of file
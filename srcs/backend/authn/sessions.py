@@ -0,0 +1,224 @@
+"""
+Description: Fast path for sessions and for the authenticated user.
+
+Main content:
+1. class: LocalLRU
+2. class: SessionStore (SESSION_ENGINE = 'authn.sessions')
+3. class: UserCache
+4. class: CachedModelBackend
+5. class: AuthenticationMiddleware
+6. function: invalidate_user(sender, instance, **kwargs)
+7. object: USER_CACHE
+
+With the default settings every authenticated request reads django_session and
+then authn_user. Here a session is read from a small per-process LRU, then
+from the shared cache (cached_db engine, written through to the database), and
+the user the same way by primary key: a warm request runs no query before the
+view. request.user and request.auser() share a single memo.
+
+The cached user has every field but the password: the hash never reaches the
+shared cache. The session check uses the HMAC of it computed when the user is
+cached, and user.password is loaded from the database only if it's read.
+Saving or deleting a User (signals connected in AuthnConfig.ready) evicts it
+from both levels. The LRU of other processes is not reachable, so its entries
+live only SESSION_LOCAL_TTL / USER_CACHE_LOCAL_TTL seconds: that is the
+longest a logout or a password change takes to reach every worker.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from functools import partial
+from django.conf import settings
+from django.contrib import auth
+from django.contrib.auth import middleware
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.sessions.backends import cached_db
+from django.core.cache import cache
+from django.db import router
+from .models import User
+
+class LocalLRU:
+    """Thread-safe per-process LRU with a time to live on every entry."""
+
+    def __init__(self, size, ttl):
+        self.size = size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        if self.size <= 0 or self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+LOCAL_SESSIONS = LocalLRU(
+    getattr(settings, 'SESSION_LOCAL_SIZE', 10000),
+    getattr(settings, 'SESSION_LOCAL_TTL', 5)
+)
+
+class SessionStore(cached_db.SessionStore):
+    """cached_db sessions with the per-process LRU in front of the shared cache."""
+
+    def load(self):
+        key = self.cache_key
+        data = LOCAL_SESSIONS.get(key)
+        if data is None:
+            data = super().load()
+            # Sessione inesistente o scaduta: non viene ricordata
+            if data:
+                LOCAL_SESSIONS.set(key, data)
+        # Copia: la sessione viene modificata dalla richiesta
+        return dict(data)
+
+    async def aload(self):
+        key = await self.acache_key()
+        data = LOCAL_SESSIONS.get(key)
+        if data is None:
+            data = await super().aload()
+            if data:
+                LOCAL_SESSIONS.set(key, data)
+        return dict(data)
+
+    def save(self, must_create=False):
+        super().save(must_create)
+        LOCAL_SESSIONS.delete(self.cache_key)
+
+    async def asave(self, must_create=False):
+        await super().asave(must_create)
+        LOCAL_SESSIONS.delete(await self.acache_key())
+
+    def delete(self, session_key=None):
+        if session_key is None:
+            session_key = self.session_key
+        if session_key is not None:
+            LOCAL_SESSIONS.delete(self.cache_key_prefix + session_key)
+        super().delete(session_key)
+
+    async def adelete(self, session_key=None):
+        if session_key is None:
+            session_key = self.session_key
+        if session_key is not None:
+            LOCAL_SESSIONS.delete(self.cache_key_prefix + session_key)
+        await super().adelete(session_key)
+
+class UserCache:
+    key_prefix = 'auth:user:'
+
+    def __init__(self):
+        self.local = LocalLRU(
+            getattr(settings, 'USER_CACHE_LOCAL_SIZE', 10000),
+            getattr(settings, 'USER_CACHE_LOCAL_TTL', 5)
+        )
+
+    @property
+    def timeout(self):
+        return getattr(settings, 'USER_CACHE_TTL', 300)
+
+    def _key(self, user_id):
+        return f'{self.key_prefix}{user_id}'
+
+    @staticmethod
+    def _entry(user):
+        """(fields without the password, session auth hash) of user."""
+        # Valori semplici: un FieldFile (image) porterebbe con sé l'istanza intera
+        fields = {field.attname: field.get_prep_value(getattr(user, field.attname))
+                  for field in User._meta.concrete_fields if field.attname != 'password'}
+        return fields, user.get_session_auth_hash()
+
+    @staticmethod
+    def _user(entry):
+        # Ogni richiesta riceve la sua istanza (request.user può essere modificato);
+        # la password resta un campo differito
+        fields, session_auth_hash = entry
+        user = User.from_db(router.db_for_read(User), list(fields), list(fields.values()))
+        user._session_auth_hash = session_auth_hash
+        return user
+
+    def get(self, user_id):
+        """User with primary key user_id, or None if it doesn't exist."""
+        key = self._key(user_id)
+        entry = self.local.get(key)
+        if entry is None:
+            entry = cache.get(key)
+            if entry is None:
+                user = User.objects.filter(pk=user_id).first()
+                if user is None:
+                    return None
+                entry = self._entry(user)
+                cache.set(key, entry, self.timeout)
+            self.local.set(key, entry)
+        return self._user(entry)
+
+    async def aget(self, user_id):
+        key = self._key(user_id)
+        entry = self.local.get(key)
+        if entry is None:
+            entry = await cache.aget(key)
+            if entry is None:
+                user = await User.objects.filter(pk=user_id).afirst()
+                if user is None:
+                    return None
+                entry = self._entry(user)
+                await cache.aset(key, entry, self.timeout)
+            self.local.set(key, entry)
+        return self._user(entry)
+
+    def invalidate(self, *user_ids):
+        keys = [self._key(user_id) for user_id in user_ids]
+        self.local.delete(*keys)
+        cache.delete_many(keys)
+
+USER_CACHE = UserCache()
+
+class CachedModelBackend(ModelBackend):
+    """ModelBackend that resolves the user of a session through USER_CACHE."""
+
+    def get_user(self, user_id):
+        user = USER_CACHE.get(user_id)
+        return user if user is not None and self.user_can_authenticate(user) else None
+
+    async def aget_user(self, user_id):
+        user = await USER_CACHE.aget(user_id)
+        return user if user is not None and self.user_can_authenticate(user) else None
+
+def invalidate_user(sender, instance, **kwargs):
+    USER_CACHE.invalidate(instance.pk)
+
+async def _auser(request):
+    # Stesso memo di request.user: l'utente viene risolto una sola volta per richiesta
+    if not hasattr(request, '_cached_user'):
+        request._cached_user = await auth.aget_user(request)
+    return request._cached_user
+
+class AuthenticationMiddleware(middleware.AuthenticationMiddleware):
+    """Django's AuthenticationMiddleware with one user memo for request.user and request.auser()."""
+
+    def process_request(self, request):
+        super().process_request(request)
+        request.auser = partial(_auser, request)
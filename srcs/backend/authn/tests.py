@@ -0,0 +1,344 @@
+"""
+Description: Tests of the authn app.
+
+Main content:
+1. function: create_user(username)
+2. class: CacheTestCase(TestCase)
+3. class: MatchCursorTests(CacheTestCase)
+4. class: NgramSearchTests(TestCase)
+5. class: SharedCacheCheckTests(SimpleTestCase)
+6. class: PongRoomInviteTests(SimpleTestCase)
+7. class: TrisBotBudgetTests(SimpleTestCase)
+8. class: SwissPairingTests(SimpleTestCase)
+9. class: SwissTournamentTests(CacheTestCase)
+10. class: RatingsRecomputeTests(CacheTestCase)
+11. class: TournamentWinTests(CacheTestCase)
+12. class: UserCacheTests(CacheTestCase)
+13. class: DroppedLogTests(SimpleTestCase)
+"""
+
+import asyncio
+import base64
+import logging
+import os
+import pickle
+import random
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime, timezone as dt_timezone
+import numpy as np
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.test import SimpleTestCase, TestCase, override_settings
+from authn.models import User, Player, Match, Tournament, Pairing
+from authn.jsonlog import QueueHandler
+from authn.matches import BOT_UID, record_matches
+from authn.pagination import encode_cursor, decode_cursor, keyset_page
+from authn.pong_rooms import RoomManager
+from authn.presence import check_shared_cache
+from authn.ratings import load_matches, rating_params, recompute
+from authn.search import NgramIndex
+from authn.sessions import USER_CACHE
+from authn.tournaments import swiss_pairings, create_tournament, start_round, record_result, standings
+from authn.tris_solver import bot_move
+
+def create_user(username):
+    return User.objects.create_user(f'{username}@example.com', username, 'Str0ng-Passw0rd!')
+
+class CacheTestCase(TestCase):
+    # Il database torna indietro a ogni test, la cache no: gli stessi uid ritroverebbero le risposte vecchie
+    def setUp(self):
+        cache.clear()
+
+@override_settings(ALLOWED_HOSTS=['*'])
+class MatchCursorTests(CacheTestCase):
+    NAIVE_CURSOR = base64.urlsafe_b64encode(b'2024-01-01T00:00:00|5').decode().rstrip('=')
+
+    def test_cursor_round_trip(self):
+        date = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+        self.assertEqual(decode_cursor(encode_cursor(date, 5)), (date, 5))
+
+    def test_naive_cursor_is_rejected(self):
+        with self.assertRaises(ValueError):
+            decode_cursor(self.NAIVE_CURSOR)
+
+    def test_self_match_is_returned_once(self):
+        player = Player.objects.create(user=create_user('alice'), game_type='pong')
+        other = Player.objects.create(user=create_user('bob'), game_type='pong')
+        for player2 in (other, player, other, player, other):
+            Match.objects.create(game='pong', mode='local', player1=player, player2=player2, winner='player1')
+        matches = Match.objects.filter(game='pong')
+        seen, cursor = [], None
+        while True:
+            rows, cursor = keyset_page([matches.filter(player1=player), matches.filter(player2=player)], cursor, 3)
+            seen += [row.id for row in rows]
+            if cursor is None:
+                break
+        self.assertEqual(seen, sorted(matches.values_list('id', flat=True), reverse=True))
+
+    def test_naive_cursor_is_a_bad_request(self):
+        self.client.force_login(create_user('alice'))
+        response = self.client.get('/pong/games/', {'cursor': self.NAIVE_CURSOR}, secure=True)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['message'], 'Invalid cursor')
+
+class NgramSearchTests(TestCase):
+    def setUp(self):
+        self.uids = {user.username: user.uid for user in map(create_user, ('alice', 'alfred', 'malia', 'bob'))}
+
+    def test_short_query_is_prefix_only(self):
+        index = NgramIndex()
+        self.assertEqual(index.search('al'), [self.uids['alfred'], self.uids['alice']])
+        self.assertEqual(index.search('b'), [self.uids['bob']])
+        self.assertEqual(index.search('li'), [])
+
+    def test_long_query_adds_similar_names(self):
+        index = NgramIndex()
+        self.assertEqual(index.search('ali')[:1], [self.uids['alice']])
+        self.assertIn(self.uids['malia'], index.search('ali'))
+        self.assertEqual(index.search('ali', exclude_uid=self.uids['alice'])[:1], [self.uids['malia']])
+
+class SharedCacheCheckTests(SimpleTestCase):
+    def test_one_worker_can_use_local_memory(self):
+        with override_settings(WEB_CONCURRENCY=1):
+            check_shared_cache()
+
+    @override_settings(WEB_CONCURRENCY=3)
+    def test_workers_need_a_shared_cache(self):
+        with self.assertRaises(ImproperlyConfigured):
+            check_shared_cache()
+
+class _Socket:
+    async def send(self, text_data):
+        pass
+
+class PongRoomInviteTests(SimpleTestCase):
+    def _joins(self, *calls):
+        async def run():
+            manager = RoomManager(record=False)
+            sides = [await manager.join(room_id, _Socket(), uid, mode, winning_score=10 ** 9, opponent=opponent)
+                     for room_id, uid, mode, opponent in calls]
+            for room in list(manager._rooms):
+                for socket in list(manager._rooms[room].sockets):
+                    await manager.leave(room, socket)
+            return sides
+        return asyncio.run(run())
+
+    def test_only_the_invited_player_joins(self):
+        self.assertEqual(self._joins(('r1', 'alice', 'local', 'bob'), ('r1', 'mallory', 'local', None),
+                                     ('r1', 'bob', 'local', None), ('r1', 'mallory', 'local', None)),
+                         [1, None, 2, None])
+
+    def test_local_room_needs_an_opponent(self):
+        self.assertEqual(self._joins(('r1', 'alice', 'local', None), ('r1', 'alice', 'local', 'alice'),
+                                     ('r1', 'alice', 'tournament', 'bob')), [None, None, None])
+
+    def test_bot_room_has_no_other_seat(self):
+        self.assertEqual(self._joins(('r1', 'alice', 'bot', None), ('r1', 'bob', 'bot', None)), [1, None])
+
+class TrisBotBudgetTests(SimpleTestCase):
+    # Margine sul TRIS_TIME_BUDGET per la profondità 0 e la lettura della tavola
+    MAX_SECONDS = 2.0
+
+    def _timed_move(self, size, k):
+        board = [[None] * size for _ in range(size)]
+        board[0][0] = 'X'
+        start = time.monotonic()
+        move = bot_move(board, 'O', 'perfect', k)
+        return move, time.monotonic() - start
+
+    @override_settings(TRIS_MAX_CELLS=49, TRIS_TIME_BUDGET=0.5)
+    def test_large_board_answers_within_budget(self):
+        for k in (4, 7):
+            move, elapsed = self._timed_move(7, k)
+            self.assertLess(elapsed, self.MAX_SECONDS, f'7x7 k={k} took {elapsed:.2f}s')
+            self.assertIsNotNone(move)
+            self.assertNotEqual(move, (0, 0))
+
+    def test_board_larger_than_max_cells_is_rejected(self):
+        with self.assertRaises(ValueError):
+            self._timed_move(7, 4)
+
+    def test_3x3_blocks_the_win(self):
+        board = [['X', 'X', None], [None, 'O', None], [None, None, None]]
+        self.assertEqual(bot_move(board, 'O'), (0, 2))
+
+class SwissPairingTests(SimpleTestCase):
+    @staticmethod
+    def _played(*pairs):
+        played = defaultdict(set)
+        for a, b in pairs:
+            played[a].add(b)
+            played[b].add(a)
+        return played
+
+    def _assert_no_rematch(self, pairs, played):
+        for a, b in pairs:
+            self.assertNotIn(b, played[a], f'rematch {a}-{b}')
+
+    def test_top_half_meets_bottom_half(self):
+        pairs, bye = swiss_pairings([1, 2, 3, 4], dict.fromkeys([1, 2, 3, 4], 0), self._played(), set())
+        self.assertEqual(sorted(pairs), [(1, 3), (2, 4)])
+        self.assertIsNone(bye)
+
+    def test_rematch_is_avoided(self):
+        played = self._played((1, 3), (2, 4))
+        pairs, _ = swiss_pairings([1, 2, 3, 4], dict.fromkeys([1, 2, 3, 4], 3), played, set())
+        self.assertEqual(len(pairs), 2)
+        self._assert_no_rematch(pairs, played)
+
+    def test_rematch_is_repaired_by_swapping_opponents(self):
+        # 1 ha già incontrato tutta la metà bassa: resta fuori e va scambiato con la coppia di 2
+        played = self._played((1, 3), (1, 4))
+        pairs, _ = swiss_pairings([1, 2, 3, 4], dict.fromkeys([1, 2, 3, 4], 3), played, set())
+        self.assertEqual(sorted(player for pair in pairs for player in pair), [1, 2, 3, 4])
+        self._assert_no_rematch(pairs, played)
+
+    def test_unavoidable_rematch_is_accepted(self):
+        played = self._played((1, 2))
+        pairs, _ = swiss_pairings([1, 2], {1: 3, 2: 0}, played, set())
+        self.assertEqual(pairs, [(1, 2)])
+
+    def test_bye_goes_to_the_lowest_player_without_one(self):
+        ranking = [1, 2, 3, 4, 5]
+        _, bye = swiss_pairings(ranking, dict.fromkeys(ranking, 0), self._played(), {5})
+        self.assertEqual(bye, 4)
+        _, bye = swiss_pairings(ranking, dict.fromkeys(ranking, 0), self._played(), set(ranking))
+        self.assertEqual(bye, 5)
+
+    def test_odd_group_floats_down(self):
+        scores = {1: 6, 2: 6, 3: 6, 4: 3, 5: 3, 6: 3}
+        pairs, _ = swiss_pairings([1, 2, 3, 4, 5, 6], scores, self._played(), set())
+        self.assertIn((1, 2), pairs)
+        partner = {a: b for pair in pairs for a, b in (pair, pair[::-1])}
+        # Il più in basso del gruppo da 6 punti gioca contro uno da 3
+        self.assertEqual(scores[partner[3]], 3)
+        self.assertEqual(len(pairs), 3)
+
+@override_settings(ALLOWED_HOSTS=['*'])
+class SwissTournamentTests(CacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self.users = [create_user(name) for name in ('alice', 'bob', 'carol', 'dave')]
+
+    def test_results_update_the_standings_and_finish(self):
+        alice = self.users[0]
+        self.client.force_login(alice)
+        info = lambda: self.client.get('/pong/info/', {'uid': alice.uid}, secure=True).json()['data']['TW']
+        tournament = create_tournament(alice, 'pong', 'Cup', [user.uid for user in self.users], max_rounds=1)
+        round_ = start_round(tournament)
+        pairings = {
+            (pairing.entry1.player.user.username, pairing.entry2.player.user.username): pairing.id
+            for pairing in Pairing.objects.filter(round=round_).select_related('entry1__player__user', 'entry2__player__user')
+        }
+        self.assertEqual(set(pairings), {('alice', 'carol'), ('bob', 'dave')})
+        self.assertEqual(info(), 0)
+
+        record_result(pairings[('alice', 'carol')], 5, 1)
+        with self.assertRaises(ValueError):
+            record_result(pairings[('alice', 'carol')], 5, 1)
+        self.assertEqual(Tournament.objects.get(pk=tournament.pk).status, 'running')
+        with self.captureOnCommitCallbacks(execute=True):
+            record_result(pairings[('bob', 'dave')], 5, 3)
+
+        rows = standings(tournament)
+        self.assertEqual([row['player_uid'] for row in rows], [user.uid for user in (alice, self.users[1], self.users[3], self.users[2])])
+        self.assertEqual([(row['score'], row['point_diff'], row['rank']) for row in rows],
+                         [(3, 4, 1), (3, 2, 2), (0, -2, 3), (0, -4, 4)])
+        tournament.refresh_from_db()
+        self.assertEqual(tournament.status, 'finished')
+        self.assertEqual(tournament.winner.player.user, alice)
+        self.assertEqual(Player.objects.get(user=alice, game_type='pong').TW, 1)
+        self.assertEqual(info(), 1)
+        with self.assertRaises(ValueError):
+            start_round(tournament)
+
+class RatingsRecomputeTests(CacheTestCase):
+    def test_recompute_matches_the_incremental_ratings(self):
+        uids = [create_user(f'player{index}').uid for index in range(8)]
+        generator = random.Random(42)
+        with tempfile.TemporaryDirectory() as archive, override_settings(ARCHIVE_DIR=archive):
+            # Più batch, con partite contro il bot e pareggi
+            for _ in range(10):
+                results = []
+                for _ in range(generator.randint(1, 20)):
+                    player1, player2 = generator.sample(uids, 2)
+                    if generator.random() < 0.2:
+                        player2, mode = BOT_UID, 'bot'
+                    else:
+                        mode = generator.choice(['local', 'tournament'])
+                    results.append({'player1_uid': player1, 'player2_uid': player2, 'mode': mode,
+                                    'p1_score': generator.randint(0, 3), 'p2_score': generator.randint(0, 3)})
+                record_matches('pong', results)
+            player_ids, ratings = recompute(*load_matches('pong'), *rating_params())
+
+        stored = dict(Player.objects.filter(game_type='pong').values_list('id', 'rating'))
+        self.assertEqual(sorted(stored), player_ids.tolist())
+        np.testing.assert_allclose(ratings, [stored[player_id] for player_id in player_ids.tolist()], rtol=0, atol=1e-9)
+
+@override_settings(ALLOWED_HOSTS=['*'])
+class TournamentWinTests(CacheTestCase):
+    def test_win_refreshes_the_cached_player(self):
+        user = create_user('alice')
+        self.client.force_login(user)
+        for game in ('pong', 'tris'):
+            url = f'/{game}/info/'
+            self.assertEqual(self.client.get(url, {'uid': user.uid}, secure=True).json()['data']['TW'], 0)
+            for _ in range(2):
+                response = self.client.post(url, {'uid': user.uid}, content_type='application/json', secure=True)
+                self.assertEqual(response.status_code, 200)
+            self.assertEqual(self.client.get(url, {'uid': user.uid}, secure=True).json()['data']['TW'], 2)
+
+@override_settings(ALLOWED_HOSTS=['*'])
+class UserCacheTests(CacheTestCase):
+    def setUp(self):
+        super().setUp()
+        USER_CACHE.local.clear()
+        self.user = create_user('alice')
+
+    def test_password_hash_is_not_cached(self):
+        user = USER_CACHE.get(self.user.pk)
+        self.assertEqual((user.uid, user.email, user.image.name), (self.user.uid, self.user.email, self.user.image.name))
+        self.assertNotIn(self.user.password.encode(), pickle.dumps(cache.get(USER_CACHE._key(self.user.pk))))
+        # Caricata solo quando viene letta
+        with self.assertNumQueries(1):
+            self.assertEqual(user.password, self.user.password)
+
+    def test_cached_session_needs_no_query(self):
+        self.client.force_login(self.user)
+        self.client.get('/is-authenticated/', secure=True)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/is-authenticated/', secure=True).json()['data']['uid'], self.user.uid)
+
+    def test_password_change_ends_the_other_sessions(self):
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get('/is-authenticated/', secure=True).status_code, 200)
+        self.user.set_password('An0ther-Passw0rd!')
+        self.user.save()
+        self.assertEqual(self.client.get('/is-authenticated/', secure=True).status_code, 401)
+
+class DroppedLogTests(SimpleTestCase):
+    def test_dropped_records_are_reported(self):
+        with tempfile.TemporaryDirectory() as directory:
+            handler = QueueHandler(os.path.join(directory, 'web.log'), queue_size=2)
+            # Senza listener la coda si riempie
+            handler.listener.stop()
+            record = lambda n: logging.makeLogRecord({'name': 'web', 'msg': f'record {n}'})
+            for n in range(5):
+                handler.handle(record(n))
+            self.assertEqual(handler.dropped, 3)
+            self.assertEqual([handler.queue.get_nowait().msg for _ in range(2)], ['record 0', 'record 1'])
+
+            handler.handle(record(5))
+            queued = [handler.queue.get_nowait() for _ in range(2)]
+            self.assertEqual(queued[0].msg, 'record 5')
+            self.assertEqual(queued[1].ecs, {'labels.dropped_records': 3})
+            self.assertEqual(queued[1].levelname, 'WARNING')
+            # Già segnalati: nessun altro avviso
+            handler.handle(record(6))
+            self.assertEqual(handler.queue.get_nowait().msg, 'record 6')
+            self.assertTrue(handler.queue.empty())
+            handler.listener.start()
+            handler.listener.stop()
+            handler.listener.start()
@@ -0,0 +1,280 @@
+"""
+Description: Swiss tournaments: pairing, results and standings.
+
+Main content:
+1. function: swiss_pairings(ranking, scores, played, had_bye)
+2. function: create_tournament(user, game, name, uids, max_rounds)
+3. function: start_round(tournament)
+4. function: record_result(pairing, p1_score, p2_score)
+5. function: standings(tournament, offset, limit)
+
+Pairing works on the ranking (one indexed query per round) split in score
+groups: the top half of each group meets the bottom half (Dutch system), the
+players that can't be paired float down to the next group. Previous opponents
+are kept in one set per player, so avoiding a rematch is an O(1) check. The few
+pairs left with a rematch at the end are repaired by swapping opponents with the
+already made pair of minimum cost (difference of score), a local weighted
+matching that stays close to O(n log n) per round instead of the O(n^3) of an
+exact matching over thousands of entrants.
+
+Every result updates the two entries with F() expressions and decrements the
+pending counter of the round: standings are never recomputed.
+"""
+
+import logging
+import math
+from collections import defaultdict
+from django.db import transaction
+from django.db.models import F
+from .models import User, Player, Tournament, TournamentEntry, Round, Pairing
+from .matches import record_matches
+from .response_cache import RESPONSE_CACHE, player_resource
+
+LOGGER = logging.getLogger('web')
+
+WIN_POINTS = 3
+DRAW_POINTS = 1
+# Coppie già fatte esaminate per riparare un rematch
+REPAIR_WINDOW = 64
+
+def _pair_group(group, played, pairs):
+    """Pair the top half of group with the bottom half; return the players left."""
+    half = len(group) // 2
+    top, bottom = group[:half], group[half:]
+    used = set()
+    first = 0
+    left = []
+    for player in top:
+        opponents = played[player]
+        while first < len(bottom) and bottom[first] in used:
+            first += 1
+        for index in range(first, len(bottom)):
+            candidate = bottom[index]
+            if candidate not in used and candidate not in opponents:
+                pairs.append((player, candidate))
+                used.add(candidate)
+                break
+        else:
+            left.append(player)
+    return left + [candidate for candidate in bottom if candidate not in used]
+
+def _repair(leftover, pairs, played, scores):
+    """Pair the leftovers, swapping opponents with existing pairs to avoid rematches."""
+    result = []
+    while len(leftover) > 1:
+        player = leftover.pop(0)
+        opponents = played[player]
+        partner = next((candidate for candidate in leftover if candidate not in opponents), None)
+        if partner is not None:
+            leftover.remove(partner)
+            result.append((player, partner))
+            continue
+
+        # Scambio a costo minimo con una delle ultime coppie: (a, b) + (player, other) -> (a, player) + (b, other)
+        other = leftover[0]
+        best, best_cost = None, None
+        for index in range(len(pairs) - 1, max(-1, len(pairs) - 1 - REPAIR_WINDOW), -1):
+            first, second = pairs[index]
+            for a, b in ((first, second), (second, first)):
+                if player in played[a] or other in played[b]:
+                    continue
+                cost = abs(scores[a] - scores[player]) + abs(scores[b] - scores[other])
+                if best_cost is None or cost < best_cost:
+                    best, best_cost = (index, a, b), cost
+        leftover.pop(0)
+        if best is None:
+            # Nessuno scambio possibile: si accetta il rematch
+            result.append((player, other))
+            continue
+        index, a, b = best
+        pairs[index] = (a, player)
+        result.append((b, other))
+    pairs.extend(result)
+    return leftover
+
+def swiss_pairings(ranking, scores, played, had_bye):
+    """Pair the entries of ranking (best first); return (pairs, bye entry or None)."""
+    ranking = list(ranking)
+    bye = None
+    if len(ranking) % 2:
+        # Bye al giocatore più in basso che non l'ha ancora avuto
+        for index in range(len(ranking) - 1, -1, -1):
+            if ranking[index] not in had_bye:
+                bye = ranking.pop(index)
+                break
+        else:
+            bye = ranking.pop()
+
+    pairs = []
+    floaters = []
+    start = 0
+    while start < len(ranking):
+        end = start
+        while end < len(ranking) and scores[ranking[end]] == scores[ranking[start]]:
+            end += 1
+        group = floaters + ranking[start:end]
+        if len(group) % 2 and end < len(ranking):
+            # Il più in basso scende nel gruppo successivo
+            floaters = [group.pop()]
+        else:
+            floaters = []
+        floaters = _pair_group(group, played, pairs) + floaters
+        start = end
+    _repair(floaters, pairs, played, scores)
+    return pairs, bye
+
+def create_tournament(user, game, name, uids, max_rounds=None):
+    """Create the tournament with one entry per uid (seeded in the given order)."""
+    if len(uids) < 2:
+        raise ValueError('At least 2 players are required')
+    if len(set(uids)) != len(uids):
+        raise ValueError('Duplicate players')
+    if max_rounds is None:
+        max_rounds = math.ceil(math.log2(len(uids))) + 1
+    if max_rounds < 1:
+        raise ValueError('At least one round is required')
+
+    users = dict(User.objects.filter(uid__in=uids).values_list('uid', 'id'))
+    missing = set(uids) - users.keys()
+    if missing:
+        raise User.DoesNotExist(f'User matching uid {", ".join(sorted(missing))} does not exist')
+
+    with transaction.atomic():
+        Player.objects.bulk_create(
+            [Player(user_id=user_id, game_type=game) for user_id in users.values()],
+            ignore_conflicts=True
+        )
+        players = dict(Player.objects.filter(user_id__in=users.values(), game_type=game).values_list('user_id', 'id'))
+        tournament = Tournament.objects.create(name=name, game=game, created_by=user, max_rounds=max_rounds)
+        TournamentEntry.objects.bulk_create([
+            TournamentEntry(tournament=tournament, player_id=players[users[uid]], seed=seed)
+            for seed, uid in enumerate(uids, start=1)
+        ])
+    LOGGER.info('Tournament %s created with %s players', tournament.id, len(uids))
+    return tournament
+
+def start_round(tournament):
+    """Pair the next round; raise ValueError if the current one is still running."""
+    with transaction.atomic():
+        tournament = Tournament.objects.select_for_update().get(pk=tournament.pk)
+        if tournament.status == 'finished':
+            raise ValueError('Tournament already finished')
+        if tournament.current_round >= tournament.max_rounds:
+            raise ValueError('All the rounds have been played')
+        if Round.objects.filter(tournament=tournament, number=tournament.current_round, pending__gt=0).exists():
+            raise ValueError('The current round is not finished')
+
+        rows = TournamentEntry.objects.filter(tournament=tournament).order_by('-score', '-point_diff', 'seed') \
+            .values_list('id', 'score', 'had_bye')
+        ranking, scores, had_bye = [], {}, set()
+        for entry_id, score, bye in rows:
+            ranking.append(entry_id)
+            scores[entry_id] = score
+            if bye:
+                had_bye.add(entry_id)
+        played = defaultdict(set)
+        for entry1_id, entry2_id in Pairing.objects.filter(tournament=tournament, entry2__isnull=False) \
+                .values_list('entry1_id', 'entry2_id'):
+            played[entry1_id].add(entry2_id)
+            played[entry2_id].add(entry1_id)
+
+        pairs, bye = swiss_pairings(ranking, scores, played, had_bye)
+        tournament.current_round += 1
+        tournament.save(update_fields=['current_round'])
+        new_round = Round.objects.create(tournament=tournament, number=tournament.current_round, pending=len(pairs))
+        pairings = [Pairing(tournament=tournament, round=new_round, entry1_id=a, entry2_id=b) for a, b in pairs]
+        if bye is not None:
+            # Il bye vale una vittoria, senza partita
+            pairings.append(Pairing(tournament=tournament, round=new_round, entry1_id=bye, winner='player1'))
+            TournamentEntry.objects.filter(pk=bye).update(
+                score=F('score') + WIN_POINTS, wins=F('wins') + 1, had_bye=True
+            )
+        Pairing.objects.bulk_create(pairings)
+
+    LOGGER.info('Tournament %s: round %s paired (%s matches)', tournament.id, new_round.number, len(pairs))
+    if not pairs:
+        _finish_round(tournament.pk)
+    return new_round
+
+def record_result(pairing_id, p1_score, p2_score, user=None):
+    """Save the result of a pairing, its Match and the standings of the two entries."""
+    if p1_score < 0 or p2_score < 0:
+        raise ValueError('Scores must be positive')
+    with transaction.atomic():
+        pairing = Pairing.objects.select_for_update().select_related(
+            'tournament', 'entry1__player__user', 'entry2__player__user'
+        ).get(pk=pairing_id)
+        tournament = pairing.tournament
+        if user is not None and tournament.created_by_id != user.id:
+            raise PermissionError('Only the creator can report the results')
+        if pairing.winner is not None:
+            raise ValueError('Result already recorded')
+
+        if p1_score > p2_score:
+            winner, points = 'player1', (WIN_POINTS, 0)
+        elif p1_score < p2_score:
+            winner, points = 'player2', (0, WIN_POINTS)
+        else:
+            winner, points = 'draw', (DRAW_POINTS, DRAW_POINTS)
+
+        # Stessa scrittura delle partite normali: contatori Player, Match e leaderboard
+        match, = record_matches(tournament.game, [{
+            'player1_uid': pairing.entry1.player.user.uid,
+            'player2_uid': pairing.entry2.player.user.uid,
+            'mode': 'tournament',
+            'p1_score': p1_score,
+            'p2_score': p2_score,
+        }])
+        pairing.entry1_result, pairing.entry2_result = p1_score, p2_score
+        pairing.winner, pairing.match = winner, match
+        pairing.save(update_fields=['entry1_result', 'entry2_result', 'winner', 'match'])
+
+        for entry_id, own, other, gained in ((pairing.entry1_id, p1_score, p2_score, points[0]),
+                                             (pairing.entry2_id, p2_score, p1_score, points[1])):
+            outcome = 'draws' if winner == 'draw' else ('wins' if own > other else 'losses')
+            TournamentEntry.objects.filter(pk=entry_id).update(**{
+                'score': F('score') + gained,
+                'point_diff': F('point_diff') + own - other,
+                outcome: F(outcome) + 1,
+            })
+        Round.objects.filter(pk=pairing.round_id).update(pending=F('pending') - 1)
+        pending = Round.objects.values_list('pending', flat=True).get(pk=pairing.round_id)
+        if not pending:
+            _finish_round(tournament.pk)
+    return pairing
+
+def _finish_round(tournament_id):
+    """Close the tournament after its last round and credit the tournament win."""
+    with transaction.atomic():
+        tournament = Tournament.objects.select_for_update().get(pk=tournament_id)
+        if tournament.current_round < tournament.max_rounds or tournament.status == 'finished':
+            return
+        winner = TournamentEntry.objects.filter(tournament=tournament).order_by('-score', '-point_diff', 'seed') \
+            .select_related('player__user').first()
+        tournament.status = 'finished'
+        tournament.winner = winner
+        tournament.save(update_fields=['status', 'winner'])
+        if winner is not None:
+            Player.objects.filter(pk=winner.player_id).update(TW=F('TW') + 1)
+            # Il Player in cache (GET /<game>/info/) scade dopo il commit, come in record_matches
+            resource = player_resource(tournament.game, winner.player.user.uid)
+            transaction.on_commit(lambda: RESPONSE_CACHE.invalidate(resource))
+    LOGGER.info('Tournament %s finished', tournament_id)
+
+def standings(tournament, offset=0, limit=50):
+    """One page of the ranking, read through the tournament_standings index."""
+    rows = TournamentEntry.objects.filter(tournament=tournament).order_by('-score', '-point_diff', 'seed') \
+        .values('id', 'player__user__uid', 'score', 'wins', 'draws', 'losses', 'point_diff')[offset:offset + limit]
+    return [
+        {
+            'entry_id': row['id'],
+            'player_uid': row['player__user__uid'],
+            'score': row['score'],
+            'wins': row['wins'],
+            'draws': row['draws'],
+            'losses': row['losses'],
+            'point_diff': row['point_diff'],
+            'rank': offset + index + 1,
+        }
+        for index, row in enumerate(rows)
+    ]
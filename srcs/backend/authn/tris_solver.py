@@ -0,0 +1,420 @@
+"""
+Description: Server-side Tris bot (the AM player): exact solver for m,n,k boards.
+
+Main content:
+1. class: Geometry
+2. class: TrisTable
+3. class: MNKSolver
+4. function: bot_move(board, player, difficulty, k)
+5. object: TRIS_TABLE
+
+A position is a pair of bitboards (cells of the player to move, cells of the
+opponent), so the same entry serves X and O and whoever started the round.
+On 3x3 every reachable position is solved once, reduced to its canonical form
+under the 8 symmetries of the square, and stored with the score of each move:
+choosing a move is one table lookup. Larger boards use iterative-deepening
+negamax with alpha-beta pruning and a transposition table, stopped after
+TRIS_TIME_BUDGET seconds with the best move of the deepest complete search.
+
+Scores are from the point of view of the player to move: > 0 win (higher is
+faster), 0 draw, < 0 loss. The difficulty is the probability of playing a
+random legal move instead of one of the best moves.
+"""
+
+import random
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+
+DIFFICULTIES = {
+    'easy': 0.5,
+    'medium': 0.25,
+    'hard': 0.1,
+    'perfect': 0.0,
+}
+DIRECTIONS = ((0, 1), (1, 0), (1, 1), (1, -1))
+WIN_SCORE = 1 << 40
+INFINITY = 1 << 50
+EXACT, LOWER, UPPER = 0, 1, 2
+
+class Geometry:
+    """Winning lines, symmetries and move ordering of an m x n board with k in a row."""
+
+    def __init__(self, rows, cols, k):
+        if rows < 1 or cols < 1 or k < 1 or k > max(rows, cols):
+            raise ValueError(f'Invalid board {rows}x{cols} with k={k}')
+        self.rows = rows
+        self.cols = cols
+        self.k = k
+        self.cells = rows * cols
+        self.full = (1 << self.cells) - 1
+
+        self.lines = []
+        self.lines_by_cell = [[] for _ in range(self.cells)]
+        for row in range(rows):
+            for col in range(cols):
+                for dr, dc in DIRECTIONS:
+                    end_row, end_col = row + dr * (k - 1), col + dc * (k - 1)
+                    if not (0 <= end_row < rows and 0 <= end_col < cols):
+                        continue
+                    cells = [(row + dr * i) * cols + col + dc * i for i in range(k)]
+                    mask = sum(1 << cell for cell in cells)
+                    self.lines.append(mask)
+                    for cell in cells:
+                        self.lines_by_cell[cell].append(mask)
+
+        # Prima le caselle centrali: migliora i tagli dell'alpha-beta
+        center_row, center_col = (rows - 1) / 2, (cols - 1) / 2
+        self.order = sorted(range(self.cells),
+                            key=lambda cell: abs(cell // cols - center_row) + abs(cell % cols - center_col))
+
+        transforms = [
+            lambda r, c: (r, c),
+            lambda r, c: (r, cols - 1 - c),
+            lambda r, c: (rows - 1 - r, c),
+            lambda r, c: (rows - 1 - r, cols - 1 - c),
+        ]
+        if rows == cols:
+            transforms += [
+                lambda r, c: (c, r),
+                lambda r, c: (cols - 1 - c, rows - 1 - r),
+                lambda r, c: (c, rows - 1 - r),
+                lambda r, c: (cols - 1 - c, r),
+            ]
+        # perm[cell] = casella corrispondente nella posizione trasformata
+        self.symmetries = []
+        for transform in transforms:
+            perm = []
+            for cell in range(self.cells):
+                row, col = transform(cell // cols, cell % cols)
+                perm.append(row * cols + col)
+            self.symmetries.append(perm)
+
+    def wins(self, bits, cell):
+        """True if the stones in bits complete a line through cell."""
+        for line in self.lines_by_cell[cell]:
+            if bits & line == line:
+                return True
+        return False
+
+    def has_line(self, bits):
+        for line in self.lines:
+            if bits & line == line:
+                return True
+        return False
+
+    def permute(self, bits, perm):
+        result = 0
+        while bits:
+            low = bits & -bits
+            result |= 1 << perm[low.bit_length() - 1]
+            bits ^= low
+        return result
+
+    def canonical(self, own, opp):
+        """Smallest key among the symmetric positions, with the symmetry that produces it."""
+        best_key, best_perm = None, None
+        for perm in self.symmetries:
+            key = self.permute(own, perm) | (self.permute(opp, perm) << self.cells)
+            if best_key is None or key < best_key:
+                best_key, best_perm = key, perm
+        return best_key, best_perm
+
+    def evaluate(self, own, opp):
+        """Heuristic for the depth-limited search: lines still open for each player."""
+        score = 0
+        for line in self.lines:
+            if not line & opp:
+                score += 1 << (2 * (own & line).bit_count())
+            elif not line & own:
+                score -= 1 << (2 * (opp & line).bit_count())
+        return score
+
+def _pick(scores, difficulty, rng):
+    """Index of the move to play given the score of every legal move (None = occupied)."""
+    legal = [cell for cell, score in enumerate(scores) if score is not None]
+    if not legal:
+        return None
+    if rng.random() < DIFFICULTIES[difficulty]:
+        return rng.choice(legal)
+    best = max(scores[cell] for cell in legal)
+    return rng.choice([cell for cell in legal if scores[cell] == best])
+
+class TrisTable:
+    """Every reachable 3x3 position, canonicalized, with the score of each move."""
+
+    def __init__(self):
+        self.geometry = Geometry(3, 3, 3)
+        self._table = None
+        self._lock = threading.Lock()
+        # Permutazione di ogni configurazione di 9 bit per ogni simmetria: canonical() in O(1)
+        self._permuted = [
+            [self.geometry.permute(bits, perm) for bits in range(1 << 9)]
+            for perm in self.geometry.symmetries
+        ]
+
+    def __len__(self):
+        return len(self.table)
+
+    @property
+    def table(self):
+        if self._table is None:
+            with self._lock:
+                if self._table is None:
+                    table = {}
+                    self._solve(table, 0, 0)
+                    self._table = table
+        return self._table
+
+    def canonical(self, own, opp):
+        best_key, best_index = None, 0
+        for index, permuted in enumerate(self._permuted):
+            key = permuted[own] | (permuted[opp] << 9)
+            if best_key is None or key < best_key:
+                best_key, best_index = key, index
+        return best_key, self.geometry.symmetries[best_index]
+
+    def _solve(self, table, own, opp):
+        """Fill the table from (own, opp) and return the value of the position."""
+        key, _ = self.canonical(own, opp)
+        scores = table.get(key)
+        if scores is None:
+            # Risolve la posizione canonica, così le mosse sono nel suo orientamento
+            own, opp = key & 0x1ff, key >> 9
+            empty = 0x1ff & ~(own | opp)
+            scores = [None] * 9
+            for cell in range(9):
+                bit = 1 << cell
+                if not empty & bit:
+                    continue
+                moved = own | bit
+                left = (empty ^ bit).bit_count()
+                if self.geometry.wins(moved, cell):
+                    scores[cell] = left + 1
+                elif not left:
+                    scores[cell] = 0
+                else:
+                    scores[cell] = -self._solve(table, opp, moved)
+            scores = table[key] = tuple(scores)
+        legal = [score for score in scores if score is not None]
+        return max(legal) if legal else 0
+
+    def scores(self, own, opp):
+        """Score of each of the 9 cells for the player to move (None if occupied)."""
+        key, perm = self.canonical(own, opp)
+        canonical_scores = self.table.get(key)
+        # Posizioni finali (tavola piena o già vinta) non sono nella tabella
+        if canonical_scores is None:
+            return [None] * 9
+        return [canonical_scores[perm[cell]] for cell in range(9)]
+
+    def move(self, own, opp, difficulty='perfect', rng=random):
+        return _pick(self.scores(own, opp), difficulty, rng)
+
+class SearchTimeout(Exception):
+    """The time budget of a search ran out."""
+
+class _Search:
+    """State of one search: its own transposition table, node count and deadline."""
+
+    def __init__(self, geometry, table_size, deadline):
+        self.geometry = geometry
+        self.table = {}
+        self.table_size = table_size
+        self.deadline = deadline
+        self.nodes = 0
+
+    def search(self, own, opp, depth, alpha, beta):
+        self.nodes += 1
+        # Il tempo si controlla ogni 1024 nodi: time.monotonic() non è gratis
+        if not self.nodes & 1023 and self.deadline is not None and time.monotonic() > self.deadline:
+            raise SearchTimeout()
+        geometry = self.geometry
+        key = own | (opp << geometry.cells)
+        alpha_start = alpha
+
+        entry = self.table.get(key)
+        if entry is not None:
+            value, flag, entry_depth = entry
+            if entry_depth >= depth:
+                if flag == EXACT:
+                    return value
+                if flag == LOWER:
+                    alpha = max(alpha, value)
+                else:
+                    beta = min(beta, value)
+                if alpha >= beta:
+                    return value
+
+        empty = geometry.full & ~(own | opp)
+        if not empty:
+            return 0
+        if depth == 0:
+            return geometry.evaluate(own, opp)
+
+        best = -INFINITY
+        left = empty.bit_count() - 1
+        for cell in geometry.order:
+            bit = 1 << cell
+            if not empty & bit:
+                continue
+            moved = own | bit
+            if geometry.wins(moved, cell):
+                score = WIN_SCORE + left
+            elif not left:
+                score = 0
+            else:
+                score = -self.search(opp, moved, depth - 1, -beta, -alpha)
+            if score > best:
+                best = score
+            if best > alpha:
+                alpha = best
+            if alpha >= beta:
+                break
+
+        if best <= alpha_start:
+            flag = UPPER
+        elif best >= beta:
+            flag = LOWER
+        else:
+            flag = EXACT
+        # Tabella piena: le posizioni nuove non vengono più salvate
+        if entry is not None or len(self.table) < self.table_size:
+            self.table[key] = (best, flag, depth)
+        return best
+
+    def scores(self, own, opp, depth):
+        """Score of every cell searching depth plies after the move (None if occupied)."""
+        geometry = self.geometry
+        empty = geometry.full & ~(own | opp)
+        left = empty.bit_count() - 1
+        scores = [None] * geometry.cells
+        for cell in geometry.order:
+            bit = 1 << cell
+            if not empty & bit:
+                continue
+            moved = own | bit
+            if geometry.wins(moved, cell):
+                scores[cell] = WIN_SCORE + left
+            elif not left:
+                scores[cell] = 0
+            else:
+                scores[cell] = -self.search(opp, moved, depth, -INFINITY, INFINITY)
+        return scores
+
+class MNKSolver:
+    """Iterative-deepening negamax with alpha-beta for any m,n,k board.
+
+    Every call searches depth 0, 1, 2, ... up to the full depth (or max_depth)
+    until time_budget seconds have passed, and returns the scores of the deepest
+    iteration completed: depth 0 always completes, so the bot always answers.
+    The searches don't share state, so they run without a lock; only the
+    results of complete searches go to an LRU shared by the requests.
+    """
+
+    def __init__(self, rows, cols, k, cache_size=None, max_depth=None, time_budget=None):
+        self.geometry = Geometry(rows, cols, k)
+        if cache_size is None:
+            cache_size = getattr(settings, 'TRIS_CACHE_SIZE', 200000)
+        if time_budget is None:
+            time_budget = getattr(settings, 'TRIS_TIME_BUDGET', 0.5)
+        self.cache_size = cache_size
+        self.max_depth = max_depth
+        self.time_budget = time_budget
+        self._results = OrderedDict()
+        self._lock = threading.Lock()
+
+    def scores(self, own, opp):
+        """Score of every cell for the player to move (None if occupied)."""
+        key = own | (opp << self.geometry.cells)
+        with self._lock:
+            scores = self._results.get(key)
+            if scores is not None:
+                self._results.move_to_end(key)
+                return list(scores)
+
+        left = (self.geometry.full & ~(own | opp)).bit_count() - 1
+        target = left if self.max_depth is None else min(left, self.max_depth)
+        search = _Search(self.geometry, self.cache_size, None)
+        # Profondità 0: solo l'euristica dopo ogni mossa, sempre completa
+        scores = search.scores(own, opp, 0)
+        search.deadline = time.monotonic() + self.time_budget
+        depth = 0
+        try:
+            while depth < target:
+                scores = search.scores(own, opp, depth + 1)
+                depth += 1
+        except SearchTimeout:
+            pass
+
+        if depth >= target:
+            with self._lock:
+                self._results[key] = tuple(scores)
+                if len(self._results) > self.cache_size:
+                    self._results.popitem(last=False)
+        return scores
+
+    def move(self, own, opp, difficulty='perfect', rng=random):
+        return _pick(self.scores(own, opp), difficulty, rng)
+
+TRIS_TABLE = TrisTable()
+_SOLVERS = {}
+_SOLVERS_LOCK = threading.Lock()
+
+def get_solver(rows, cols, k):
+    with _SOLVERS_LOCK:
+        solver = _SOLVERS.get((rows, cols, k))
+        if solver is None:
+            max_depth = getattr(settings, 'TRIS_MAX_DEPTH', 6)
+            # Le tavole piccole si risolvono esattamente
+            if rows * cols <= 12:
+                max_depth = None
+            solver = _SOLVERS[(rows, cols, k)] = MNKSolver(rows, cols, k, max_depth=max_depth)
+        return solver
+
+def parse_board(board, player):
+    """Convert rows of 'X' / 'O' / null into (own, opp) bitboards; raise ValueError."""
+    if not isinstance(board, list) or not board or not all(isinstance(row, list) for row in board):
+        raise ValueError('Board must be a list of rows')
+    rows, cols = len(board), len(board[0])
+    if any(len(row) != cols for row in board):
+        raise ValueError('All the rows must have the same length')
+    if player not in ('X', 'O'):
+        raise ValueError('Player must be X or O')
+    max_cells = getattr(settings, 'TRIS_MAX_CELLS', 25)
+    if rows * cols > max_cells:
+        raise ValueError(f'Board too large (max {max_cells} cells)')
+
+    own = opp = 0
+    for row_index, row in enumerate(board):
+        for col_index, value in enumerate(row):
+            bit = 1 << (row_index * cols + col_index)
+            if value in (None, ''):
+                continue
+            if value == player:
+                own |= bit
+            elif value in ('X', 'O'):
+                opp |= bit
+            else:
+                raise ValueError(f'Invalid cell value: {value}')
+    return rows, cols, own, opp
+
+def bot_move(board, player='O', difficulty='perfect', k=None):
+    """Return (row, col) of the bot move, or None if the round is already over."""
+    if difficulty not in DIFFICULTIES:
+        raise ValueError(f'Invalid difficulty: {difficulty}')
+    rows, cols, own, opp = parse_board(board, player)
+    if k is None:
+        k = min(rows, cols)
+    if (rows, cols, k) == (3, 3, 3):
+        geometry, solver = TRIS_TABLE.geometry, TRIS_TABLE
+    else:
+        solver = get_solver(rows, cols, k)
+        geometry = solver.geometry
+    if geometry.has_line(own) or geometry.has_line(opp):
+        return None
+    cell = solver.move(own, opp, difficulty)
+    if cell is None:
+        return None
+    return cell // cols, cell % cols
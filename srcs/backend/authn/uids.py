@@ -0,0 +1,96 @@
+"""
+Description: Allocator for the numeric discriminator of the user uid (username#1234).
+
+Main content:
+1. function: permute(counter, width)
+2. class: UidAllocator
+3. object: ALLOCATOR
+
+Every pool (one per username, or a single global one) is a row holding a counter.
+Reserving a block of discriminators is a single locked UPDATE of that row, and
+the counter is mapped to a discriminator through a fixed permutation of the
+space, so uids look random but never need a retry loop. When a pool has handed
+out its whole space it widens to one more digit.
+"""
+
+import math
+import threading
+from django.conf import settings
+from django.db import transaction
+from .models import User, DiscriminatorPool
+
+GLOBAL_SCOPE = '*'
+MIN_WIDTH = 4
+FIRST_VALUE = 10
+PERMUTATION_STEP = 7919
+
+def space_size(width):
+    return 10 ** width - FIRST_VALUE
+
+def permute(counter, width):
+    """Map the n-th allocation of a pool to a distinct discriminator of width digits."""
+    size = space_size(width)
+    step = PERMUTATION_STEP
+    while math.gcd(step, size) != 1:
+        step += 1
+    return f'{FIRST_VALUE + (counter * step) % size:0{width}d}'
+
+class UidAllocator:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._blocks = {}
+
+    @property
+    def scope_mode(self):
+        return getattr(settings, 'UID_POOL_SCOPE', 'username')
+
+    @property
+    def block_size(self):
+        # Un blocco di discriminatori riservato per processo riduce le scritture sul pool globale
+        if self.scope_mode == 'global':
+            return getattr(settings, 'UID_GLOBAL_BLOCK_SIZE', 64)
+        return 1
+
+    def _scope(self, username):
+        return GLOBAL_SCOPE if self.scope_mode == 'global' else username
+
+    def _reserve(self, scope, count):
+        """Atomically reserve count consecutive counters; returns (width, first, last)."""
+        with transaction.atomic():
+            pool, _ = DiscriminatorPool.objects.select_for_update().get_or_create(scope=scope)
+            width, first = max(pool.width, MIN_WIDTH), pool.next_value
+            if first >= space_size(width):
+                width, first = width + 1, 0
+            last = min(first + count, space_size(width))
+            pool.width, pool.next_value = width, last
+            pool.save(update_fields=['width', 'next_value'])
+        return width, first, last
+
+    def _next(self, scope):
+        with self._lock:
+            block = self._blocks.get(scope)
+            if block is None or block[1] >= block[2]:
+                block = list(self._reserve(scope, self.block_size))
+                if self.block_size > 1:
+                    self._blocks[scope] = block
+            width, counter = block[0], block[1]
+            block[1] += 1
+        return permute(counter, width)
+
+    def allocate(self, username):
+        """Return a discriminator such that username#discriminator is free."""
+        scope = self._scope(username)
+        while True:
+            discriminator = self._next(scope)
+            # Lookup esatto sull'indice unique di uid: salta solo gli uid legacy già presi
+            if not User.objects.filter(uid=f'{username}#{discriminator}').exists():
+                return discriminator
+
+    def rename(self, user, username):
+        """Return the uid of user after renaming it to username."""
+        discriminator = user.uid.split('#')[1] if '#' in user.uid else None
+        if discriminator and not User.objects.filter(uid=f'{username}#{discriminator}').exclude(pk=user.pk).exists():
+            return f'{username}#{discriminator}'
+        return f'{username}#{self.allocate(username)}'
+
+ALLOCATOR = UidAllocator()
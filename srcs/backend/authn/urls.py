@@ -7,8 +7,14 @@ Main content:
 
 from django.urls import path
 from django.conf import settings
-from django.conf.urls.static import static
-from .views import IsAuthenticatedView, Login, LoginGuest, Logout, Signup, InfoView, CSRFTokenView, FriendView, FriendRequestView, PongInfoView, PongLeaderboardView, PongGamesView, TrisInfoView, TrisLeaderboardView, TrisGamesView, SearchPlayerView
+from .async_views import AsyncLoginView, AsyncInfoView, AsyncPongInfoView, AsyncTrisInfoView, AsyncPongLeaderboardView, AsyncTrisLeaderboardView
+from .views import IsAuthenticatedView, Login, LoginGuest, Logout, Signup, InfoView, PresenceView, CSRFTokenView, FriendView, FriendRequestView, PongInfoView, PongLeaderboardView, PongGamesView, PongGamesBatchView, PongStatsView, TrisInfoView, TrisLeaderboardView, TrisGamesView, TrisGamesBatchView, TrisStatsView, TrisBotMoveView, SearchPlayerView, TournamentView, TournamentRoundView, TournamentResultView, TournamentStandingsView, MetricsView
+
+# Letture frequenti e login servite dalle view async (con ASGI), scritture dalle view DRF
+if settings.ASYNC_READ_VIEWS:
+    Login = AsyncLoginView
+    InfoView, PongInfoView, TrisInfoView = AsyncInfoView, AsyncPongInfoView, AsyncTrisInfoView
+    PongLeaderboardView, TrisLeaderboardView = AsyncPongLeaderboardView, AsyncTrisLeaderboardView
 
 urlpatterns = [
     # Methods: GET
@@ -26,6 +32,8 @@ urlpatterns = [
     # Methods: POST
     path('user-info/', InfoView.as_view(), name='info'),
     # Methods: GET, PUT
+    path('presence/heartbeat/', PresenceView.as_view(), name='presence_heartbeat'),
+    # Methods: POST
     path('friend/', FriendView.as_view(), name='friend'),
     # Methods: GET
     path('friend/request/', FriendRequestView.as_view(), name='friend_request'),
@@ -34,14 +42,34 @@ urlpatterns = [
     # METHODS: GET, POST
     path('pong/games/', PongGamesView.as_view(), name='pong_games'),
     # METHODS: GET, POST
+    path('pong/games/batch/', PongGamesBatchView.as_view(), name='pong_games_batch'),
+    # METHODS: POST
+    path('pong/stats/', PongStatsView.as_view(), name='pong_stats'),
+    # METHODS: GET
     path('pong/leaderboard/', PongLeaderboardView.as_view(), name='pong_leaderboard'),
     # METHODS: GET
     path('tris/info/', TrisInfoView.as_view(), name='tris'),
     # METHODS: GET, POST
     path('tris/games/', TrisGamesView.as_view(), name='tris_games'),
     # METHODS: GET, POST
+    path('tris/games/batch/', TrisGamesBatchView.as_view(), name='tris_games_batch'),
+    # METHODS: POST
+    path('tris/stats/', TrisStatsView.as_view(), name='tris_stats'),
+    # METHODS: GET
+    path('tris/bot/move/', TrisBotMoveView.as_view(), name='tris_bot_move'),
+    # METHODS: POST
     path('tris/leaderboard/', TrisLeaderboardView.as_view(), name='tris_leaderboard'),
     # METHODS: GET
     path('search-player/', SearchPlayerView.as_view(), name='search_player'),
     # METHODS: GET
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    path('tournament/', TournamentView.as_view(), name='tournament'),
+    # METHODS: GET, POST
+    path('tournament/round/', TournamentRoundView.as_view(), name='tournament_round'),
+    # METHODS: POST
+    path('tournament/result/', TournamentResultView.as_view(), name='tournament_result'),
+    # METHODS: POST
+    path('tournament/standings/', TournamentStandingsView.as_view(), name='tournament_standings'),
+    # METHODS: GET
+    path('metrics/', MetricsView.as_view(), name='metrics'),
+    # METHODS: GET
+]
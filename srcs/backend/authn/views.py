@@ -15,34 +15,312 @@ For more information, check the Project documentation.
 """
 
 import logging
-from django.contrib.auth import authenticate, login as auth_login, logout as auth_logout
+from datetime import date, timedelta
+from django.utils import timezone
+from django.contrib.auth import login as auth_login, logout as auth_logout
 from django.middleware.csrf import get_token
 from django.shortcuts import get_object_or_404
 from django.db import models
 from django.conf import settings
+from django.http import HttpResponse
 import requests
 from rest_framework import status
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated, AllowAny
-from rest_framework.authentication import BasicAuthentication, SessionAuthentication, TokenAuthentication
-from .models import User, Friendship, Player, Match
-from .serializers import UserSerializer, FriendSerializer, FriendRequestSerializer, LoginSerializer, PlayerSerializer, LeaderboardSerializer, MatchSerializer, SearchPlayerSerializer
+from rest_framework.permissions import IsAuthenticated, IsAdminUser, AllowAny
+from rest_framework.authentication import SessionAuthentication, TokenAuthentication
+from .models import User, Friendship, Player, Match, Tournament, Pairing
+from .serializers import UserSerializer, FriendSerializer, LoginSerializer, PlayerSerializer, MatchSerializer
+from .leaderboard import LEADERBOARD
+from .pagination import keyset_page, encode_cursor, decode_cursor
+from .archive import ARCHIVE
+from .matches import MODES, parse_result, record_matches
+from .search import SEARCH_INDEX, search_players
+from .uids import ALLOCATOR
+from .friends import FRIEND_GRAPH
+from .presence import PRESENCE
+from .passwords import check_login
+from .avatars import upload_too_large, save_avatar, avatar_urls
+from .authentication import CREDENTIAL_CACHE, CachedBasicAuthentication
+from .tris_solver import bot_move
+from .tournaments import create_tournament, start_round, record_result, standings
+from .rollups import MODE_ALL, player_stats
+from .metrics import METRICS, render as render_metrics
+from .response_cache import (RESPONSE_CACHE, cached_response, user_resource, player_resource, matches_resource,
+                             leaderboard_resource, friend_requests_resource)
 
 LOGGER = logging.getLogger('web')
 
+LEADERBOARD_MAX_PAGE_SIZE = 100
+MATCHES_PAGE_SIZE = 20
+MATCHES_MAX_PAGE_SIZE = 100
+MATCHES_MAX_BATCH_SIZE = 500
+SEARCH_PAGE_SIZE = 10
+SEARCH_MAX_PAGE_SIZE = 50
+TOURNAMENT_MAX_PLAYERS = 10000
+STANDINGS_MAX_PAGE_SIZE = 200
+STATS_DEFAULT_DAYS = 30
+STATS_MAX_DAYS = 366
+
+def user_by_uid(request, uid):
+    """User with the given uid, reusing request.user when it's the caller; raise User.DoesNotExist."""
+    if request.user.is_authenticated and request.user.uid == uid:
+        return request.user
+    return User.objects.get(uid=uid)
+
 def create_response(response):
     if hasattr(response, 'data') and isinstance(response.data, dict):
         response.data['log_index'] = 'authn'
     return response
 
+def get_int_param(params, name, default, minimum=0, maximum=None):
+    try:
+        value = int(params.get(name, default))
+    except (TypeError, ValueError):
+        value = default
+    value = max(minimum, value)
+    if maximum is not None:
+        value = min(maximum, value)
+    return value
+
+# Risorse delle risposte in cache (vedi response_cache.py)
+def cached_user(view, request):
+    uid = request.query_params.get('uid')
+    return user_resource(uid) if uid else None
+
+def cached_player(game):
+    def resource(view, request):
+        uid = request.query_params.get('uid')
+        return player_resource(game, uid) if uid else None
+    return resource
+
+def cached_matches(game):
+    # Senza uid le partite sono quelle dell'utente autenticato
+    return lambda view, request: matches_resource(game, request.query_params.get('uid') or request.user.uid)
+
+def cached_leaderboard(game):
+    return lambda view, request: leaderboard_resource(game)
+
+def cached_friend_requests(view, request):
+    return friend_requests_resource(request.user.uid)
+
+def leaderboard_response(request, game, label):
+    # Rank di un singolo giocatore
+    uid = request.query_params.get('uid')
+    if uid:
+        entry = LEADERBOARD.rank_of(game, uid)
+        if entry is None:
+            LOGGER.info('Player %s not ranked in %s leaderboard', uid, label)
+            return create_response(Response({
+                'message': f'Player not ranked in {label} leaderboard',
+                'data': None
+            }, status=status.HTTP_404_NOT_FOUND))
+        return create_response(Response({
+            'message': f'{label} leaderboard rank retrieved',
+            'data': entry
+        }, status=status.HTTP_200_OK))
+
+    # Pagina della classifica (di default i primi 10)
+    page_size = get_int_param(request.query_params, 'page_size', 10, minimum=1, maximum=LEADERBOARD_MAX_PAGE_SIZE)
+    page = get_int_param(request.query_params, 'page', 1, minimum=1)
+    leaderboard, total = LEADERBOARD.page(game, (page - 1) * page_size, page_size)
+
+    if not leaderboard:
+        LOGGER.info('No players found for %s leaderboard', label)
+        return create_response(Response({
+            'message': f'No players found for {label} leaderboard',
+            'data': [],
+            'total': total
+        }, status=status.HTTP_200_OK))
+
+    LOGGER.info('%s leaderboard retrieved with %s players', label, len(leaderboard))
+    return create_response(Response({
+        'message': f'{label} leaderboard retrieved',
+        'data': leaderboard,
+        'page': page,
+        'page_size': page_size,
+        'total': total
+    }, status=status.HTTP_200_OK))
+
+def matches_response(request, game, label):
+    # Recupera l'UID dell'utente target (se fornito)
+    target_uid = request.query_params.get('uid')
+
+    # Se non è fornito, usa l'utente autenticato
+    if not target_uid:
+        target_user = request.user
+    else:
+        try:
+            target_user = user_by_uid(request, target_uid)
+        except User.DoesNotExist:
+            LOGGER.warning('User with UID %s not found', target_uid)
+            return create_response(Response({
+                'message': 'User not found',
+                'data': []
+            }, status=status.HTTP_404_NOT_FOUND))
+
+    # Crea il Player se non esiste
+    player, created = Player.objects.get_or_create(user=target_user, game_type=game)
+    if created:
+        LOGGER.info('%s player created for user: %s', label, target_user.username)
+
+    # Recupera una pagina di partite con i giocatori già in join (nessuna query per riga):
+    # una query per posto, ognuna sul proprio indice (match_player1/2_history)
+    matches = Match.objects.filter(game=game).select_related('player1__user', 'player2__user')
+    matches = [matches.filter(player1=player), matches.filter(player2=player)]
+    page_size = get_int_param(request.query_params, 'page_size', MATCHES_PAGE_SIZE, minimum=1, maximum=MATCHES_MAX_PAGE_SIZE)
+    cursor = request.query_params.get('cursor')
+    try:
+        matches, next_cursor = keyset_page(matches, cursor, page_size)
+    except ValueError as e:
+        LOGGER.warning(str(e))
+        return create_response(Response({
+            'message': 'Invalid cursor',
+            'data': []
+        }, status=status.HTTP_400_BAD_REQUEST))
+
+    matches_data = MatchSerializer(matches, many=True).data
+    if next_cursor is None:
+        # Storico caldo finito: la pagina continua con le partite archiviate (archive.py),
+        # una in più per sapere se esiste una pagina successiva
+        if matches:
+            after = (matches[-1].date, matches[-1].id)
+        else:
+            after = decode_cursor(cursor) if cursor else None
+        archived, keys = ARCHIVE.history_data(game, player.id, after, page_size - len(matches) + 1)
+        if len(matches) + len(archived) > page_size:
+            archived, keys = archived[:page_size - len(matches)], keys[:page_size - len(matches)]
+            next_cursor = encode_cursor(*keys[-1]) if keys else encode_cursor(matches[-1].date, matches[-1].id)
+        matches_data = list(matches_data) + archived
+
+    # TOTP conta le partite giocate: stima del totale senza COUNT(*)
+    total = player.TOTP
+    if not matches_data:
+        LOGGER.info('No %s matches found for user: %s', label, target_user.username)
+        response = create_response(Response({
+            'message': f'No {label} matches found',
+            'data': [],
+            'next_cursor': None,
+            'total': total
+        }, status=status.HTTP_200_OK))
+        response['X-Total-Count'] = total
+        return response
+
+    for match_data in matches_data:
+        if match_data['bot_name']:  # Aggiungi il nome del bot se presente
+            match_data['player2_name'] = match_data['bot_name']
+
+    LOGGER.info('%s matches retrieved for user: %s', label, target_user.username)
+    response = create_response(Response({
+        'message': f'{label} matches retrieved',
+        'data': matches_data,
+        'next_cursor': next_cursor,
+        'total': total
+    }, status=status.HTTP_200_OK))
+    response['X-Total-Count'] = total
+    return response
+
+def stats_response(request, game, label):
+    target_uid = request.query_params.get('uid')
+    if not target_uid:
+        target_user = request.user
+    else:
+        try:
+            target_user = user_by_uid(request, target_uid)
+        except User.DoesNotExist:
+            LOGGER.warning('User with UID %s not found', target_uid)
+            return create_response(Response(
+                status=status.HTTP_404_NOT_FOUND,
+                data={'message': 'User not found'}
+            ))
+
+    mode = request.query_params.get('mode', MODE_ALL)
+    try:
+        end = date.fromisoformat(request.query_params['to']) if 'to' in request.query_params else timezone.localdate()
+        start = date.fromisoformat(request.query_params['from']) if 'from' in request.query_params \
+            else end - timedelta(days=STATS_DEFAULT_DAYS - 1)
+    except ValueError:
+        return create_response(Response(
+            status=status.HTTP_400_BAD_REQUEST,
+            data={'message': 'Dates must be in YYYY-MM-DD format'}
+        ))
+    if mode != MODE_ALL and mode not in MODES:
+        return create_response(Response(
+            status=status.HTTP_400_BAD_REQUEST,
+            data={'message': f'Invalid mode: {mode}'}
+        ))
+    if start > end or (end - start).days >= STATS_MAX_DAYS:
+        return create_response(Response(
+            status=status.HTTP_400_BAD_REQUEST,
+            data={'message': f'Invalid range (max {STATS_MAX_DAYS} days)'}
+        ))
+
+    # Una riga per giorno dai rollup, indipendente dal numero di partite
+    # (senza Player non ci sono righe e le statistiche sono vuote)
+    player = Player.objects.filter(user=target_user, game_type=game).first()
+    stats = player_stats(player, mode, start, end)
+
+    LOGGER.info('%s stats retrieved for user: %s', label, target_user.username)
+    return create_response(Response({
+        'message': f'{label} stats retrieved',
+        'data': dict(stats, player_uid=target_user.uid, mode=mode, start=start.isoformat(), end=end.isoformat())
+    }, status=status.HTTP_200_OK))
+
+def save_matches_response(game, raw_results, label):
+    try:
+        results = [parse_result(raw) for raw in raw_results]
+        matches = record_matches(game, results)
+    except ValueError as e:
+        LOGGER.warning(str(e))
+        return create_response(Response(
+            status=status.HTTP_400_BAD_REQUEST,
+            data={'message': str(e)}
+        ))
+    except User.DoesNotExist as e:
+        LOGGER.warning(str(e))
+        return create_response(Response(
+            status=status.HTTP_404_NOT_FOUND,
+            data={'message': f'User not found: {str(e)}'}
+        ))
+    except Exception as e:
+        LOGGER.error('Error saving %s matches: %s', label, e)
+        return create_response(Response(
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            data={'message': 'An error occurred while saving the match'}
+        ))
+
+    LOGGER.info('%s %s matches saved successfully', len(matches), label)
+    return create_response(Response(
+        status=status.HTTP_201_CREATED,
+        data={
+            'message': 'Match saved successfully' if len(matches) == 1 else 'Matches saved successfully',
+            'count': len(matches)
+        }
+    ))
+
+def save_matches_batch_response(request, game, label):
+    games = request.data.get('games')
+    if not isinstance(games, list) or not games:
+        LOGGER.warning('Missing games list')
+        return create_response(Response(
+            status=status.HTTP_400_BAD_REQUEST,
+            data={'message': 'A non-empty games list is required'}
+        ))
+    if len(games) > MATCHES_MAX_BATCH_SIZE:
+        LOGGER.warning('Too many games in batch: %s', len(games))
+        return create_response(Response(
+            status=status.HTTP_400_BAD_REQUEST,
+            data={'message': f'At most {MATCHES_MAX_BATCH_SIZE} games per request'}
+        ))
+    return save_matches_response(game, games, label)
+
 class IsAuthenticatedView(APIView):
     permission_classes = [AllowAny]
     
     def get(self, request):
         LOGGER.debug('- IsAuthenticatedView.get()')
-        LOGGER.debug(f"CSRF Cookie: {request.COOKIES.get('csrftoken')}")
-        LOGGER.debug(f"Session ID: {request.COOKIES.get('sessionid')}")
+        LOGGER.debug('CSRF Cookie: %s', request.COOKIES.get('csrftoken'))
+        LOGGER.debug('Session ID: %s', request.COOKIES.get('sessionid'))
         if request.user.is_authenticated:
             return create_response(Response(
                 status=status.HTTP_200_OK,
@@ -62,7 +340,7 @@ class CSRFTokenView(APIView):
         if not csrf_token:
             csrf_token = get_token(request) # Genera il token CSRF
         request.COOKIES.get('csrftoken')
-        LOGGER.debug(f"CSRF Token Generated: {csrf_token}")
+        LOGGER.debug('CSRF Token Generated: %s', csrf_token)
         response = create_response(Response(
             status=status.HTTP_200_OK,
             data={'message': 'CSRF token retrieved', 'data': csrf_token}
@@ -103,13 +381,14 @@ class Signup(APIView):
             LOGGER.info('Creating user')
             user = User.objects.create_user(username=username, email=email, password=password)
             user.save()
+            SEARCH_INDEX.add(user.uid, user.username)
             LOGGER.info('User created')
             return create_response(Response(
                 status=status.HTTP_201_CREATED,
                 data={'message': 'Signup successful'}
             ))
         except Exception as e:
-            LOGGER.error(f'Error creating user: {str(e)}')
+            LOGGER.error('Error creating user: %s', e)
             return create_response(Response(
                 status=status.HTTP_400_BAD_REQUEST,
                 data={'message': str(e)}
@@ -160,50 +439,31 @@ class Login(APIView):
                 data={'message': 'Missing required fields'}
             ))
 
-        # Verifica se l'email esiste
-        try:
-            user = User.objects.get(email=email.strip().lower())
-        except User.DoesNotExist:
-            LOGGER.warning('Email not found')
+        # Una sola query e un solo hash della password (nel pool di passwords.py)
+        user, error = check_login(email, password)
+        if user is None:
+            LOGGER.warning(error)
             return create_response(Response(
                 status=status.HTTP_401_UNAUTHORIZED,
-                data={'message': 'Invalid email'}
+                data={'message': error}
             ))
 
-        # Verifica se la password è corretta
-        if not user.check_password(password):
-            LOGGER.warning('Invalid password')
-            return create_response(Response(
-                status=status.HTTP_401_UNAUTHORIZED,
-                data={'message': 'Invalid password'}
-            ))
-
-        # Autentica l'utente
-        user = authenticate(email=email.strip().lower(), password=password)
-        if user is not None:
-            LOGGER.info('Login successful')
-            auth_login(request, user)
-            user.status = 'online'
-            user.save()
-            return create_response(Response(
-                status=status.HTTP_200_OK,
-                data={'message': 'Login successful'}
-            ))
-        else:
-            LOGGER.warning('Authentication failed')
-            return create_response(Response(
-                status=status.HTTP_401_UNAUTHORIZED,
-                data={'message': 'Authentication failed'}
-            ))
+        LOGGER.info('Login successful')
+        auth_login(request, user, backend=settings.AUTHENTICATION_BACKENDS[0])
+        PRESENCE.online(user.uid)
+        return create_response(Response(
+            status=status.HTTP_200_OK,
+            data={'message': 'Login successful'}
+        ))
 
 class LoginGuest(APIView):
     permission_classes = [IsAuthenticated]
-    authentication_classes = [BasicAuthentication, SessionAuthentication]
+    authentication_classes = [CachedBasicAuthentication, SessionAuthentication]
 
     def post(self, request):
         LOGGER.debug('- LoginGuest.post()')
-        LOGGER.debug(f'Request user: {request.user}')
-        LOGGER.debug(f'Is authenticated: {request.user.is_authenticated}')
+        LOGGER.debug('Request user: %s', request.user)
+        LOGGER.debug('Is authenticated: %s', request.user.is_authenticated)
 
         email = request.data.get('email')
         password = request.data.get('password')
@@ -231,7 +491,7 @@ class LoginGuest(APIView):
                     data={'message': 'Invalid password'}
                 ))
 
-            LOGGER.info(f'Guest login successful for user {guest_user.username}')
+            LOGGER.info('Guest login successful for user %s', guest_user.username)
             return create_response(Response(
                 status=status.HTTP_200_OK,
                 data={
@@ -261,8 +521,7 @@ class Logout(APIView):
                 data={'message': 'Not logged in'}
             ))
 
-        request.user.status = 'offline'
-        request.user.save()
+        PRESENCE.offline(request.user.uid)
 
         LOGGER.info('Clearing session and logging out')
         auth_logout(request)
@@ -273,8 +532,9 @@ class Logout(APIView):
 
 class InfoView(APIView):
     permission_classes = [IsAuthenticated]
-    authentication_classes = [BasicAuthentication, SessionAuthentication]
+    authentication_classes = [CachedBasicAuthentication, SessionAuthentication]
 
+    @cached_response(cached_user)
     def get(self, request):
         LOGGER.debug('- UserInfoView.get()')
         uid = request.query_params.get('uid')
@@ -287,8 +547,8 @@ class InfoView(APIView):
             ))
 
         try:
-            user = User.objects.get(uid=uid)
-            LOGGER.info(f'User info retrieved for UID: {uid}')
+            user = user_by_uid(request, uid)
+            LOGGER.info('User info retrieved for UID: %s', uid)
             return create_response(Response(
                 status=status.HTTP_200_OK,
                 data={
@@ -297,7 +557,7 @@ class InfoView(APIView):
                 }
             ))
         except User.DoesNotExist:
-            LOGGER.warning(f'User with UID {uid} not found')
+            LOGGER.warning('User with UID %s not found', uid)
             return create_response(Response(
                 status=status.HTTP_404_NOT_FOUND,
                 data={'message': 'User not found'}
@@ -306,6 +566,14 @@ class InfoView(APIView):
     def put(self, request):
         LOGGER.debug('- InfoView.put()')
 
+        # Controllo: dimensione dichiarata, prima di leggere il corpo della richiesta
+        if upload_too_large(request):
+            LOGGER.warning('Request too large')
+            return create_response(Response(
+                status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                data={'message': 'Image too large'}
+            ))
+
         # Recupera i dati dalla richiesta
         user_status = request.data.get('status')
         description = request.data.get('description')
@@ -325,20 +593,30 @@ class InfoView(APIView):
             ))
 
         try:
-            if user_status:
-                request.user.status = user_status
-                LOGGER.info('Status updated')
+            # Solo le colonne modificate vengono scritte (lo stato è gestito dal registro di presenza)
+            updated_fields = ['updated_at']
 
             if description is not None:
                 request.user.description = description
+                updated_fields.append('description')
                 LOGGER.info('Description updated')
 
             if image:
-                request.user.image = image
+                # Miniature WebP/JPEG salvate per hash del contenuto
+                try:
+                    request.user.image = save_avatar(image)
+                except ValueError as e:
+                    LOGGER.warning('Invalid image: %s', e)
+                    return create_response(Response(
+                        status=status.HTTP_400_BAD_REQUEST,
+                        data={'message': 'Invalid image'}
+                    ))
+                updated_fields.append('image')
                 LOGGER.info('Image updated')
 
             if language:
                 request.user.language = language
+                updated_fields.append('language')
                 LOGGER.info('Language updated')
 
             if email and username and password:
@@ -357,17 +635,42 @@ class InfoView(APIView):
                         data={'message': 'Email already exists'}
                     ))
 
+                old_uid = request.user.uid
+                # Le credenziali Basic già verificate non valgono più
+                CREDENTIAL_CACHE.invalidate(request.user.email, password)
+                request.user.uid = ALLOCATOR.rename(request.user, username)
                 request.user.email = email
                 request.user.username = username
-                id_part = request.user.uid.split('#')[1]
-                request.user.uid = f"{username}#{id_part}"
+                updated_fields += ['uid', 'email', 'username']
                 if new_password:
                     request.user.set_password(new_password)
+                    updated_fields.append('password')
                     LOGGER.info('New password set')
                 LOGGER.info('Email, username, and password updated')
 
             # Salva le modifiche
-            request.user.save()
+            request.user.save(update_fields=updated_fields)
+            RESPONSE_CACHE.invalidate(user_resource(request.user.uid))
+            if email and username and password:
+                LEADERBOARD.rename(old_uid, request.user.uid)
+                SEARCH_INDEX.rename(old_uid, request.user.uid, request.user.username)
+                neighbours = FRIEND_GRAPH.invalidate_neighbours(request.user)
+                PRESENCE.rename(old_uid, request.user.uid)
+                # Le risposte con il vecchio uid (profilo, partite, classifiche, richieste
+                # di amicizia degli altri utenti) non sono più valide
+                RESPONSE_CACHE.invalidate(
+                    user_resource(old_uid), leaderboard_resource('pong'), leaderboard_resource('tris'),
+                    *(resource(game, uid) for game in ('pong', 'tris') for uid in (old_uid, request.user.uid)
+                      for resource in (player_resource, matches_resource)),
+                    *(friend_requests_resource(uid) for uid in neighbours | {old_uid, request.user.uid})
+                )
+
+            if user_status == 'online':
+                PRESENCE.online(request.user.uid)
+                LOGGER.info('Status updated')
+            elif user_status == 'offline':
+                PRESENCE.offline(request.user.uid)
+                LOGGER.info('Status updated')
             LOGGER.info('User info updated successfully')
 
             if image:
@@ -377,6 +680,7 @@ class InfoView(APIView):
                     data={
                         'message': 'User image updated successfully',
                         'image_url': image_url,
+                        'image_variants': avatar_urls(request.user.image),
                     }
                 ))
 
@@ -386,30 +690,37 @@ class InfoView(APIView):
             ))
 
         except Exception as e:
-            LOGGER.error(f'Error updating user info: {str(e)}')
+            LOGGER.error('Error updating user info: %s', e)
             return create_response(Response(
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 data={'message': 'An error occurred while updating user info'}
             ))
 
+class PresenceView(APIView):
+    permission_classes = [IsAuthenticated]
+    authentication_classes = [CachedBasicAuthentication, SessionAuthentication]
+
+    # Heartbeat: mantiene l'utente online finché il client è connesso
+    def post(self, request):
+        LOGGER.debug('- PresenceView.post()')
+        PRESENCE.heartbeat(request.user.uid)
+        return create_response(Response(
+            status=status.HTTP_200_OK,
+            data={'message': 'Heartbeat received'}
+        ))
+
 class FriendView(APIView):
     permission_classes = [IsAuthenticated]
-    authentication_classes = [BasicAuthentication, SessionAuthentication]
+    authentication_classes = [CachedBasicAuthentication, SessionAuthentication]
 
     # Get friends
     def get(self, request):
         LOGGER.debug('- FriendView.get()')
 
-        uid = request.user.uid
-        
-        user = get_object_or_404(User, uid=uid)
-        friends = (Friendship.objects.filter(sender=user) | Friendship.objects.filter(receiver=user)) & Friendship.objects.filter(status='accepted')
-        friends_data = []
-        for friendship in friends:
-            # Determina chi è l'amico (sender o receiver)
-            friend = friendship.receiver if friendship.sender == user else friendship.sender
-            friend_data = FriendSerializer(friend).data
-            friends_data.append(friend_data)
+        # uid degli amici dalla cache del grafo, dati degli amici in una sola query
+        friend_uids = [uid for uid, _ in FRIEND_GRAPH.get(request.user)['accepted']]
+        friends = User.objects.filter(uid__in=friend_uids).only('uid', 'username', 'image') if friend_uids else []
+        friends_data = FriendSerializer(friends, many=True, context={'presence': PRESENCE.statuses(friend_uids)}).data
 
         LOGGER.info('Accepted friends retrieved')
         return create_response(Response(
@@ -422,25 +733,28 @@ class FriendView(APIView):
 
 class FriendRequestView(APIView):
     permission_classes = [IsAuthenticated]
-    authentication_classes = [BasicAuthentication, SessionAuthentication]
+    authentication_classes = [CachedBasicAuthentication, SessionAuthentication]
 
     # Get friends request
+    @cached_response(cached_friend_requests)
     def get(self, request):
         LOGGER.debug('- FriendRequestView.get()')
 
         uid = request.user.uid
-        user = get_object_or_404(User, uid=uid)
-        friend_requests = (Friendship.objects.filter(receiver=user) | Friendship.objects.filter(sender=user)) & Friendship.objects.filter(status='pending')
-        if not friend_requests.exists():
+        adjacency = FRIEND_GRAPH.get(request.user)
+        friend_requests_data = [
+            {'sender_uid': sender_uid, 'receiver_uid': uid, 'status': 'pending'}
+            for sender_uid, _ in adjacency['incoming']
+        ] + [
+            {'sender_uid': uid, 'receiver_uid': receiver_uid, 'status': 'pending'}
+            for receiver_uid, _ in adjacency['outgoing']
+        ]
+        if not friend_requests_data:
             LOGGER.info('No friend requests found')
             return create_response(Response({
                 'message': 'No friend requests found',
                 'data': []
             }, status=status.HTTP_200_OK))
-        friend_requests_data = []
-        for friendship in friend_requests:
-            friend_request_data = FriendRequestSerializer(friendship).data
-            friend_requests_data.append(friend_request_data)
 
         LOGGER.info('Friend requests retrieved')
         return create_response(Response(
@@ -457,7 +771,7 @@ class FriendRequestView(APIView):
 
         emitter_uid = request.data.get('emitter-uid')
         receiver_uid = request.data.get('receiver-uid')
-        LOGGER.debug(f"Emitter UID: {emitter_uid}, Receiver UID: {receiver_uid}")
+        LOGGER.debug('Emitter UID: %s, Receiver UID: %s', emitter_uid, receiver_uid)
         # Controllo: Campi richiesti
         if not all([emitter_uid, receiver_uid]):
             LOGGER.warning('Missing required fields')
@@ -467,7 +781,8 @@ class FriendRequestView(APIView):
             ))
         
         # Recupera l'emittente e il destinatario
-        emitter = get_object_or_404(User, uid=emitter_uid)
+        # L'emittente è di solito l'utente autenticato: nessuna query
+        emitter = request.user if emitter_uid == request.user.uid else get_object_or_404(User, uid=emitter_uid)
         receiver = get_object_or_404(User, uid=receiver_uid)
         
         # Controllo: Richiesta duplicata
@@ -482,13 +797,15 @@ class FriendRequestView(APIView):
         try:
             friendship = Friendship(sender=emitter, receiver=receiver)
             friendship.save()
+            FRIEND_GRAPH.invalidate(emitter, receiver)
+            RESPONSE_CACHE.invalidate(friend_requests_resource(emitter.uid), friend_requests_resource(receiver.uid))
             LOGGER.info('Friend request sent')
             return create_response(Response(
                 status=status.HTTP_201_CREATED,
                 data={'message': 'Friend request sent'}
             ))
         except Exception as e:
-            LOGGER.error(f'Error sending friend request: {str(e)}')
+            LOGGER.error('Error sending friend request: %s', e)
             return create_response(Response(
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 data={'message': 'An error occurred while sending the friend request'}
@@ -512,27 +829,29 @@ class FriendRequestView(APIView):
         
         # Controllo: Validazione dello stato
         if new_status not in ['accepted', 'rejected']:
-            LOGGER.warning(f'Invalid status: {new_status}')
+            LOGGER.warning('Invalid status: %s', new_status)
             return create_response(Response(
                 status=status.HTTP_400_BAD_REQUEST,
                 data={'message': 'Invalid status'}
             ))
             
         # Recupera l'emittente e il destinatario
-        LOGGER.debug(f"Emitter UID: {emitter_uid}, Receiver UID: {receiver_uid}, New Status: {new_status}")
+        LOGGER.debug('Emitter UID: %s, Receiver UID: %s, New Status: %s', emitter_uid, receiver_uid, new_status)
         sender = get_object_or_404(User, uid=emitter_uid)
         receiver = request.user
         friendship = get_object_or_404(Friendship, sender=sender, receiver=receiver)
         try:
             friendship.status = new_status
             friendship.save()
-            LOGGER.info(f'Friend request status updated to {new_status}')
+            FRIEND_GRAPH.invalidate(sender, receiver)
+            RESPONSE_CACHE.invalidate(friend_requests_resource(sender.uid), friend_requests_resource(receiver.uid))
+            LOGGER.info('Friend request status updated to %s', new_status)
             return create_response(Response(
                 status=status.HTTP_200_OK,
                 data={'message': f'Friend request updated to {new_status}'}
             ))
         except Exception as e:
-            LOGGER.error(f'Error updating friend request: {str(e)}')
+            LOGGER.error('Error updating friend request: %s', e)
             return create_response(Response(
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 data={'message': 'An error occurred while updating the friend request'}
@@ -540,8 +859,9 @@ class FriendRequestView(APIView):
 
 class PongInfoView(APIView):
     permission_classes = [IsAuthenticated]
-    authentication_classes = [BasicAuthentication, SessionAuthentication]
+    authentication_classes = [CachedBasicAuthentication, SessionAuthentication]
 
+    @cached_response(cached_player('pong'))
     def get(self, request):
         LOGGER.debug('- PongInfoView.get()')
 
@@ -556,9 +876,9 @@ class PongInfoView(APIView):
 
         # Recupera l'utente associato all'UID
         try:
-            user = User.objects.get(uid=uid)
+            user = user_by_uid(request, uid)
         except User.DoesNotExist:
-            LOGGER.warning(f'User with UID {uid} not found')
+            LOGGER.warning('User with UID %s not found', uid)
             return create_response(Response(
                 status=status.HTTP_404_NOT_FOUND,
                 data={'message': 'User not found'}
@@ -567,12 +887,12 @@ class PongInfoView(APIView):
         # Crea il Player se non esiste
         pong_player, created = Player.objects.get_or_create(user=user, game_type='pong')
         if created:
-            LOGGER.info(f'Pong player created for user: {user.username}')
+            LOGGER.info('Pong player created for user: %s', user.username)
 
         # Serializza i dati del giocatore
         pong_serializer = PlayerSerializer(pong_player)
 
-        LOGGER.info(f'Pong player info retrieved for user: {user.username}')
+        LOGGER.info('Pong player info retrieved for user: %s', user.username)
         return create_response(Response({
             'message': 'Pong player info retrieved',
             'data': pong_serializer.data
@@ -590,32 +910,32 @@ class PongInfoView(APIView):
             ))
 
         try:
-            user = User.objects.get(uid=uid)
-            pong_player = Player.objects.get(user=user, game_type='pong')
+            user = user_by_uid(request, uid)
+            # Incremento nel database: due vittorie concorrenti non si sovrascrivono
+            if not Player.objects.filter(user=user, game_type='pong').update(TW=models.F('TW') + 1):
+                raise Player.DoesNotExist
+            RESPONSE_CACHE.invalidate(player_resource('pong', user.uid))
 
-            pong_player.TW += 1
-            pong_player.save()
-
-            LOGGER.info(f'Tournament win recorded for user: {user.username}')
+            LOGGER.info('Tournament win recorded for user: %s', user.username)
             return create_response(Response(
                 status=status.HTTP_200_OK,
                 data={'message': 'Tournament win recorded successfully'}
             ))
 
         except User.DoesNotExist:
-            LOGGER.warning(f'User with UID {uid} not found')
+            LOGGER.warning('User with UID %s not found', uid)
             return create_response(Response(
                 status=status.HTTP_404_NOT_FOUND,
                 data={'message': 'User not found'}
             ))
         except Player.DoesNotExist:
-            LOGGER.warning(f'Pong player not found for user with UID {uid}')
+            LOGGER.warning('Pong player not found for user with UID %s', uid)
             return create_response(Response(
                 status=status.HTTP_404_NOT_FOUND,
                 data={'message': 'Pong player not found'}
             ))
         except Exception as e:
-            LOGGER.error(f'Error recording tournament win: {str(e)}')
+            LOGGER.error('Error recording tournament win: %s', e)
             return create_response(Response(
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 data={'message': 'An error occurred while recording the tournament win'}
@@ -623,190 +943,49 @@ class PongInfoView(APIView):
     
 class PongGamesView(APIView):
     permission_classes = [IsAuthenticated]
-    authentication_classes = [BasicAuthentication, SessionAuthentication]
+    authentication_classes = [CachedBasicAuthentication, SessionAuthentication]
 
+    @cached_response(cached_matches('pong'))
     def get(self, request):
         LOGGER.debug('- PongGamesView.get()')
-
-        # Recupera l'UID dell'utente target (se fornito)
-        target_uid = request.query_params.get('uid')
-
-        # Se non è fornito, usa l'utente autenticato
-        if not target_uid:
-            target_user = request.user
-        else:
-            try:
-                target_user = User.objects.get(uid=target_uid)
-            except User.DoesNotExist:
-                LOGGER.warning(f'User with UID {target_uid} not found')
-                return create_response(Response({
-                    'message': 'User not found',
-                    'data': []
-                }, status=status.HTTP_404_NOT_FOUND))
-
-        # Crea il Player se non esiste
-        pong_player, created = Player.objects.get_or_create(user=target_user, game_type='pong')
-        if created:
-            LOGGER.info(f'Pong player created for user: {target_user.username}')
-
-        # Recupera le partite associate al giocatore
-        matches = Match.objects.filter(
-            models.Q(player1=pong_player) | models.Q(player2=pong_player), game='pong').order_by('-date')
-
-        if not matches.exists():
-            LOGGER.info(f'No Pong matches found for user: {target_user.username}')
-            return create_response(Response({
-                'message': 'No Pong matches found',
-                'data': []
-            }, status=status.HTTP_200_OK))
-
-        matches_data = []
-        for match in matches:
-            match_data = MatchSerializer(match).data
-            if match.bot_name:  # Aggiungi il nome del bot se presente
-                match_data['player2_name'] = match.bot_name
-            matches_data.append(match_data)
-
-        LOGGER.info(f'Pong matches retrieved for user: {target_user.username}')
-        return create_response(Response({
-            'message': 'Pong matches retrieved',
-            'data': matches_data
-        }, status=status.HTTP_200_OK))
+        return matches_response(request, 'pong', 'Pong')
 
     def post(self, request):
         LOGGER.debug('- PongGamesView.post()')
+        return save_matches_response('pong', [request.data], 'Pong')
 
-        # Recupera i dati dalla richiesta
-        player1_uid = request.data.get('player1_uid')
-        player2_uid = request.data.get('player2_uid')
-        mode = request.data.get('mode')
-        p1_score = request.data.get('p1_score')
-        p2_score = request.data.get('p2_score')
-
-        if any(value is None for value in [player1_uid, player2_uid, mode, p1_score, p2_score]):
-            LOGGER.warning('Missing required fields')
-            return create_response(Response(
-                status=status.HTTP_400_BAD_REQUEST,
-                data={'message': 'Missing required fields'}
-            ))
+class PongGamesBatchView(APIView):
+    permission_classes = [IsAuthenticated]
+    authentication_classes = [CachedBasicAuthentication, SessionAuthentication]
 
-        try:
-            player1_user = User.objects.get(uid=player1_uid)
-            player1, created = Player.objects.get_or_create(user=player1_user, game_type='pong')
-            if created:
-                LOGGER.info(f'Pong player created for user: {player1_user.username}')
-
-            if player2_uid == 'AM':
-                player2 = None
-                bot_name = "AM"
-            else:
-                player2_user = User.objects.get(uid=player2_uid)
-                player2, created = Player.objects.get_or_create(user=player2_user, game_type='pong')
-                if created:
-                    LOGGER.info(f'Pong player created for user: {player2_user.username}')
-                bot_name = None
-
-            # Aggiorna le statistiche
-            player1.TOTP += 1
-            if player2:
-                player2.TOTP += 1
-
-            if p1_score > p2_score:
-                player1.TOTW += 1
-                winner = 'player1'
-            elif p1_score < p2_score:
-                if player2:
-                    player2.TOTW += 1
-                winner = 'player2'
-
-            # Aggiorna le statistiche in base alla modalità
-            if mode.lower() == 'local':
-                player1.PVPP += 1
-                if player2:
-                    player2.PVPP += 1
-                if p1_score > p2_score:
-                    player1.PVPW += 1
-                elif p1_score < p2_score and player2:
-                    player2.PVPW += 1
-            elif mode.lower() == 'tournament':
-                player1.TMAP += 1
-                if player2:
-                    player2.TMAP += 1
-                if p1_score > p2_score:
-                    player1.TMAW += 1
-                elif p1_score < p2_score and player2:
-                    player2.TMAW += 1
-            elif mode.lower() == 'bot':
-                player1.PVEP += 1
-                if p1_score > p2_score:
-                    player1.PVEW += 1
-
-            # Salva le statistiche aggiornate
-            player1.save()
-            if player2:
-                player2.save()
-
-            # Salva la partita nel database
-            match = Match.objects.create(
-                player1=player1,
-                player2=player2,
-                bot_name=bot_name,
-                game='pong',
-                mode=mode.lower(),
-                player1_result=p1_score,
-                player2_result=p2_score,
-                winner=winner
-            )
-            match.save()
+    # Salva tutte le partite di un torneo in una sola transazione
+    def post(self, request):
+        LOGGER.debug('- PongGamesBatchView.post()')
+        return save_matches_batch_response(request, 'pong', 'Pong')
 
-            LOGGER.info('Match saved successfully')
-            return create_response(Response(
-                status=status.HTTP_201_CREATED,
-                data={'message': 'Match saved successfully'}
-            ))
+class PongStatsView(APIView):
+    permission_classes = [IsAuthenticated]
+    authentication_classes = [CachedBasicAuthentication, SessionAuthentication]
 
-        except User.DoesNotExist as e:
-            if player1_uid:
-                LOGGER.warning(f'User not found for player1_uid: {player1_uid}')
-            if player2_uid:
-                LOGGER.warning(f'User not found for player2_uid: {player2_uid}')
-            return create_response(Response(
-                status=status.HTTP_404_NOT_FOUND,
-                data={'message': f'User not found: {str(e)}'}
-            ))
-        except Exception as e:
-            LOGGER.error(f'Error saving match: {str(e)}')
-            return create_response(Response(
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                data={'message': 'An error occurred while saving the match'}
-            ))
+    @cached_response(cached_matches('pong'))
+    def get(self, request):
+        LOGGER.debug('- PongStatsView.get()')
+        return stats_response(request, 'pong', 'Pong')
 
 class PongLeaderboardView(APIView):
     permission_classes = [AllowAny]  # Permette l'accesso a chiunque, senza autenticazione
 
-    def get(self, _):
+    @cached_response(cached_leaderboard('pong'))
+    def get(self, request):
         LOGGER.debug('- PongLeaderboardView.get()')
-        # Recupera i giocatori di Pong ordinati per vittorie totali (TOTW)
-        leaderboard = Player.objects.filter(game_type='pong', TOTP__gt=0).order_by('-TOTW')[:10]  # Prendi i primi 10
-
-        if not leaderboard.exists():
-            LOGGER.info('No players found for Pong leaderboard')
-            return create_response(Response({
-                'message': 'No players found for Pong leaderboard',
-                'data': []
-            }, status=status.HTTP_200_OK))
-
-        leaderboard_serializer = LeaderboardSerializer(leaderboard, many=True)
-        LOGGER.info(f'Pong leaderboard retrieved with {len(leaderboard)} players')
-        return create_response(Response({
-            'message': 'Pong leaderboard retrieved',
-            'data': leaderboard_serializer.data
-        }, status=status.HTTP_200_OK))
+        # Classifica servita dalla memoria, ordinata per rating Elo
+        return leaderboard_response(request, 'pong', 'Pong')
 
 class TrisInfoView(APIView):
     permission_classes = [IsAuthenticated]
-    authentication_classes = [BasicAuthentication, SessionAuthentication]
+    authentication_classes = [CachedBasicAuthentication, SessionAuthentication]
 
+    @cached_response(cached_player('tris'))
     def get(self, request):
         LOGGER.debug('- TrisInfoView.get()')
 
@@ -820,9 +999,9 @@ class TrisInfoView(APIView):
             ))
 
         try:
-            user = User.objects.get(uid=uid)
+            user = user_by_uid(request, uid)
         except User.DoesNotExist:
-            LOGGER.warning(f'User with UID {uid} not found')
+            LOGGER.warning('User with UID %s not found', uid)
             return create_response(Response(
                 status=status.HTTP_404_NOT_FOUND,
                 data={'message': 'User not found'}
@@ -831,10 +1010,10 @@ class TrisInfoView(APIView):
         # Crea il Player se non esiste
         tris_player, created = Player.objects.get_or_create(user=user, game_type='tris')
         if created:
-            LOGGER.info(f'Tris player created for user: {user.username}')
+            LOGGER.info('Tris player created for user: %s', user.username)
 
         tris_serializer = PlayerSerializer(tris_player)
-        LOGGER.info(f'Tris player info retrieved for user: {user.username}')
+        LOGGER.info('Tris player info retrieved for user: %s', user.username)
         return create_response(Response({
             'message': 'Tris player info retrieved',
             'data': tris_serializer.data
@@ -852,32 +1031,32 @@ class TrisInfoView(APIView):
             ))
 
         try:
-            user = User.objects.get(uid=uid)
-            tris_player = Player.objects.get(user=user, game_type='tris')
+            user = user_by_uid(request, uid)
+            # Incremento nel database: due vittorie concorrenti non si sovrascrivono
+            if not Player.objects.filter(user=user, game_type='tris').update(TW=models.F('TW') + 1):
+                raise Player.DoesNotExist
+            RESPONSE_CACHE.invalidate(player_resource('tris', user.uid))
 
-            tris_player.TW += 1
-            tris_player.save()
-
-            LOGGER.info(f'Tournament win recorded for user: {user.username}')
+            LOGGER.info('Tournament win recorded for user: %s', user.username)
             return create_response(Response(
                 status=status.HTTP_200_OK,
                 data={'message': 'Tournament win recorded successfully'}
             ))
 
         except User.DoesNotExist:
-            LOGGER.warning(f'User with UID {uid} not found')
+            LOGGER.warning('User with UID %s not found', uid)
             return create_response(Response(
                 status=status.HTTP_404_NOT_FOUND,
                 data={'message': 'User not found'}
             ))
         except Player.DoesNotExist:
-            LOGGER.warning(f'Tris player not found for user with UID {uid}')
+            LOGGER.warning('Tris player not found for user with UID %s', uid)
             return create_response(Response(
                 status=status.HTTP_404_NOT_FOUND,
                 data={'message': 'Tris player not found'}
             ))
         except Exception as e:
-            LOGGER.error(f'Error recording tournament win: {str(e)}')
+            LOGGER.error('Error recording tournament win: %s', e)
             return create_response(Response(
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 data={'message': 'An error occurred while recording the tournament win'}
@@ -885,196 +1064,78 @@ class TrisInfoView(APIView):
 
 class TrisGamesView(APIView):
     permission_classes = [IsAuthenticated]
-    authentication_classes = [BasicAuthentication, SessionAuthentication]
+    authentication_classes = [CachedBasicAuthentication, SessionAuthentication]
 
+    @cached_response(cached_matches('tris'))
     def get(self, request):
         LOGGER.debug('- TrisGamesView.get()')
+        return matches_response(request, 'tris', 'Tris')
 
-        # Recupera l'UID dell'utente target (se fornito)
-        target_uid = request.query_params.get('uid')
-
-        # Se non è fornito, usa l'utente autenticato
-        if not target_uid:
-            target_user = request.user
-        else:
-            try:
-                target_user = User.objects.get(uid=target_uid)
-            except User.DoesNotExist:
-                LOGGER.warning(f'User with UID {target_uid} not found')
-                return create_response(Response({
-                    'message': 'User not found',
-                    'data': []
-                }, status=status.HTTP_404_NOT_FOUND))
+    def post(self, request):
+        LOGGER.debug('- TrisGamesView.post()')
+        return save_matches_response('tris', [request.data], 'Tris')
 
-        # Crea il Player se non esiste
-        tris_player, created = Player.objects.get_or_create(user=target_user, game_type='tris')
-        if created:
-            LOGGER.info(f'Tris player created for user: {target_user.username}')
+class TrisGamesBatchView(APIView):
+    permission_classes = [IsAuthenticated]
+    authentication_classes = [CachedBasicAuthentication, SessionAuthentication]
 
-        # Recupera le partite associate al giocatore
-        matches = Match.objects.filter(
-            models.Q(player1=tris_player) | models.Q(player2=tris_player), game='tris').order_by('-date')
+    # Salva tutte le partite di un torneo in una sola transazione
+    def post(self, request):
+        LOGGER.debug('- TrisGamesBatchView.post()')
+        return save_matches_batch_response(request, 'tris', 'Tris')
 
-        if not matches.exists():
-            LOGGER.info(f'No Tris matches found for user: {target_user.username}')
-            return create_response(Response({
-                'message': 'No Tris matches found',
-                'data': []
-            }, status=status.HTTP_200_OK))
+class TrisStatsView(APIView):
+    permission_classes = [IsAuthenticated]
+    authentication_classes = [CachedBasicAuthentication, SessionAuthentication]
 
-        matches_data = []
-        for match in matches:
-            match_data = MatchSerializer(match).data
-            if match.bot_name:  # Aggiungi il nome del bot se presente
-                match_data['player2_name'] = match.bot_name
-            matches_data.append(match_data)
+    @cached_response(cached_matches('tris'))
+    def get(self, request):
+        LOGGER.debug('- TrisStatsView.get()')
+        return stats_response(request, 'tris', 'Tris')
 
-        LOGGER.info(f'Tris matches retrieved for user: {target_user.username}')
-        return create_response(Response({
-            'message': 'Tris matches retrieved',
-            'data': matches_data
-        }, status=status.HTTP_200_OK))
+class TrisBotMoveView(APIView):
+    permission_classes = [IsAuthenticated]
+    authentication_classes = [CachedBasicAuthentication, SessionAuthentication]
 
+    # Mossa del bot AM: {"board": [["X", null, null], ...], "player": "O", "difficulty": "perfect", "k": 3}
     def post(self, request):
-        LOGGER.debug('- TrisGamesView.post()')
-
-        player1_uid = request.data.get('player1_uid')
-        player2_uid = request.data.get('player2_uid')
-        mode = request.data.get('mode')
-        p1_score = request.data.get('p1_score')
-        p2_score = request.data.get('p2_score')
-
-        if any(value is None for value in [player1_uid, player2_uid, mode, p1_score, p2_score]):
-            LOGGER.warning('Missing required fields')
-            return create_response(Response(
-                status=status.HTTP_400_BAD_REQUEST,
-                data={'message': 'Missing required fields'}
-            ))
-
+        LOGGER.debug('- TrisBotMoveView.post()')
+        k = request.data.get('k')
         try:
-            player1_user = User.objects.get(uid=player1_uid)
-            player1, created = Player.objects.get_or_create(user=player1_user, game_type='tris')
-            if created:
-                LOGGER.info(f'Tris player created for user: {player1_user.username}')
-
-            if player2_uid == 'AM':
-                player2 = None
-                bot_name = "AM"
-            else:
-                player2_user = User.objects.get(uid=player2_uid)
-                player2, created = Player.objects.get_or_create(user=player2_user, game_type='tris')
-                if created:
-                    LOGGER.info(f'Tris player created for user: {player2_user.username}')
-                bot_name = None
-
-            player1.TOTP += 1
-            if player2:
-                player2.TOTP += 1
-
-            if p1_score > p2_score:
-                player1.TOTW += 1
-                winner = 'player1'
-                if player2:
-                    LOGGER.info(f'{player1.user.username} won against {player2.user.username}')
-            elif p1_score < p2_score:
-                if player2:
-                    player2.TOTW += 1
-                    winner = 'player2'
-                    LOGGER.info(f'{player2.user.username} won against {player1.user.username}')
-                else:
-                    winner = 'player2'
-                    LOGGER.info(f'{player1.user.username} lost against the bot')
-
-            # Aggiorna le statistiche in base alla modalità
-            if mode.lower() == 'local':
-                player1.PVPP += 1
-                if player2:
-                    player2.PVPP += 1
-                if p1_score > p2_score:
-                    player1.PVPW += 1
-                elif p1_score < p2_score and player2:
-                    player2.PVPW += 1
-            elif mode.lower() == 'tournament':
-                player1.TMAP += 1
-                if player2:
-                    player2.TMAP += 1
-                if p1_score > p2_score:
-                    player1.TMAW += 1
-                elif p1_score < p2_score and player2:
-                    player2.TMAW += 1
-            elif mode.lower() == 'bot':
-                player1.PVEP += 1
-                if p1_score > p2_score:
-                    player1.PVEW += 1
-
-            # Salva le statistiche aggiornate
-            player1.save()
-            if player2:
-                player2.save()
-
-            # Salva la partita nel database
-            match = Match.objects.create(
-                player1=player1,
-                player2=player2,
-                bot_name=bot_name,
-                game='tris',
-                mode=mode.lower(),
-                player1_result=p1_score,
-                player2_result=p2_score,
-                winner=winner
+            move = bot_move(
+                request.data.get('board'),
+                request.data.get('player', 'O'),
+                request.data.get('difficulty', 'perfect'),
+                int(k) if k is not None else None
             )
-
-            match.save()
-            player1.save()
-            if player2:
-                player2.save()
-
-            LOGGER.info('Match saved successfully')
+        except (TypeError, ValueError) as e:
+            LOGGER.warning('Invalid Tris bot request: %s', e)
             return create_response(Response(
-                status=status.HTTP_201_CREATED,
-                data={'message': 'Match saved successfully'}
+                status=status.HTTP_400_BAD_REQUEST,
+                data={'message': str(e)}
             ))
 
-        except User.DoesNotExist as e:
-            if player1_uid:
-                LOGGER.warning(f'User not found for player1_uid: {player1_uid}')
-            if player2_uid:
-                LOGGER.warning(f'User not found for player2_uid: {player2_uid}')
+        if move is None:
             return create_response(Response(
-                status=status.HTTP_404_NOT_FOUND,
-                data={'message': f'User not found: {str(e)}'}
-            ))
-        except Exception as e:
-            LOGGER.error(f'Error saving match: {str(e)}')
-            return create_response(Response(
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                data={'message': 'An error occurred while saving the match'}
+                status=status.HTTP_409_CONFLICT,
+                data={'message': 'The round is already over'}
             ))
+        return create_response(Response(
+            status=status.HTTP_200_OK,
+            data={'message': 'Tris bot move', 'data': {'row': move[0], 'col': move[1]}}
+        ))
 
 class TrisLeaderboardView(APIView):
     permission_classes = [AllowAny]  # Permette l'accesso a chiunque, senza autenticazione
 
-    def get(self, _):
+    @cached_response(cached_leaderboard('tris'))
+    def get(self, request):
         LOGGER.debug('- TrisLeaderboardView.get()')
-        leaderboard = Player.objects.filter(game_type='tris', TOTP__gt=0).order_by('-TOTW')[:10]  # Prendi i primi 10
-
-        if not leaderboard.exists():
-            LOGGER.info('No players found for Tris leaderboard')
-            return create_response(Response({
-                'message': 'No players found for Tris leaderboard',
-                'data': []
-            }, status=status.HTTP_200_OK))
-
-        leaderboard_serializer = LeaderboardSerializer(leaderboard, many=True)
-        LOGGER.info(f'Tris leaderboard retrieved with {len(leaderboard)} players')
-        return create_response(Response({
-            'message': 'Tris leaderboard retrieved',
-            'data': leaderboard_serializer.data
-        }, status=status.HTTP_200_OK))
+        return leaderboard_response(request, 'tris', 'Tris')
     
 class SearchPlayerView(APIView):
     permission_classes = [IsAuthenticated]
-    authentication_classes = [BasicAuthentication, SessionAuthentication]
+    authentication_classes = [CachedBasicAuthentication, SessionAuthentication]
 
     def get(self, request):
         LOGGER.debug('- SearchPlayerView.get()')
@@ -1089,18 +1150,220 @@ class SearchPlayerView(APIView):
                 data={'message': 'Username is required'}
             ))
 
-        # Escludi l'utente autenticato dalla ricerca
-        current_user = request.user
-        players = User.objects.filter(username__icontains=username).exclude(uid=current_user.uid)
-
-        # Serializza i dati dei giocatori trovati
-        players_data = SearchPlayerSerializer(players, many=True).data
+        # Ricerca indicizzata, ordinata per rilevanza, escludendo l'utente autenticato
+        page_size = get_int_param(request.query_params, 'page_size', SEARCH_PAGE_SIZE, minimum=1, maximum=SEARCH_MAX_PAGE_SIZE)
+        page = get_int_param(request.query_params, 'page', 1, minimum=1)
+        uids = search_players(username.strip(), exclude_uid=request.user.uid, offset=(page - 1) * page_size, limit=page_size)
+        players_data = [{'uid': uid} for uid in uids]
 
-        LOGGER.info(f'Players found with username: {username}, count: {len(players_data)}')
+        LOGGER.info('Players found with username: %s, count: %s', username, len(players_data))
         return create_response(Response(
             status=status.HTTP_200_OK,
             data={
                 'message': 'Players found',
-                'data': players_data
+                'data': players_data,
+                'page': page,
+                'page_size': page_size
             }
-        ))
\ No newline at end of file
+        ))
+
+def get_tournament(tournament_id):
+    try:
+        return Tournament.objects.get(pk=int(tournament_id))
+    except (TypeError, ValueError, Tournament.DoesNotExist):
+        return None
+
+class TournamentView(APIView):
+    permission_classes = [IsAuthenticated]
+    authentication_classes = [CachedBasicAuthentication, SessionAuthentication]
+
+    def get(self, request):
+        LOGGER.debug('- TournamentView.get()')
+        tournament = get_tournament(request.query_params.get('id'))
+        if tournament is None:
+            LOGGER.warning('Tournament not found')
+            return create_response(Response(
+                status=status.HTTP_404_NOT_FOUND,
+                data={'message': 'Tournament not found'}
+            ))
+
+        # Partite del turno corrente con gli uid dei giocatori, in una sola query
+        pairings = Pairing.objects.filter(round__tournament=tournament, round__number=tournament.current_round) \
+            .values('id', 'entry1__player__user__uid', 'entry2__player__user__uid',
+                    'entry1_result', 'entry2_result', 'winner').order_by('id')
+        return create_response(Response(
+            status=status.HTTP_200_OK,
+            data={
+                'message': 'Tournament retrieved',
+                'data': {
+                    'id': tournament.id,
+                    'name': tournament.name,
+                    'game': tournament.game,
+                    'status': tournament.status,
+                    'round': tournament.current_round,
+                    'max_rounds': tournament.max_rounds,
+                    'pairings': [
+                        {
+                            'id': pairing['id'],
+                            'player1_uid': pairing['entry1__player__user__uid'],
+                            'player2_uid': pairing['entry2__player__user__uid'],
+                            'p1_score': pairing['entry1_result'],
+                            'p2_score': pairing['entry2_result'],
+                            'winner': pairing['winner'],
+                        }
+                        for pairing in pairings
+                    ],
+                }
+            }
+        ))
+
+    def post(self, request):
+        LOGGER.debug('- TournamentView.post()')
+        game = request.data.get('game')
+        uids = request.data.get('players')
+        name = request.data.get('name') or 'Tournament'
+        rounds = request.data.get('rounds')
+
+        if game not in ('pong', 'tris') or not isinstance(uids, list):
+            LOGGER.warning('Invalid tournament data')
+            return create_response(Response(
+                status=status.HTTP_400_BAD_REQUEST,
+                data={'message': 'Game (pong or tris) and a list of players are required'}
+            ))
+        if len(uids) > TOURNAMENT_MAX_PLAYERS:
+            return create_response(Response(
+                status=status.HTTP_400_BAD_REQUEST,
+                data={'message': f'Too many players (max {TOURNAMENT_MAX_PLAYERS})'}
+            ))
+
+        try:
+            tournament = create_tournament(request.user, game, str(name)[:50], uids,
+                                           int(rounds) if rounds is not None else None)
+        except (TypeError, ValueError) as e:
+            LOGGER.warning(str(e))
+            return create_response(Response(
+                status=status.HTTP_400_BAD_REQUEST,
+                data={'message': str(e)}
+            ))
+        except User.DoesNotExist as e:
+            LOGGER.warning(str(e))
+            return create_response(Response(
+                status=status.HTTP_404_NOT_FOUND,
+                data={'message': f'User not found: {str(e)}'}
+            ))
+
+        return create_response(Response(
+            status=status.HTTP_201_CREATED,
+            data={
+                'message': 'Tournament created',
+                'data': {'id': tournament.id, 'max_rounds': tournament.max_rounds}
+            }
+        ))
+
+class TournamentRoundView(APIView):
+    permission_classes = [IsAuthenticated]
+    authentication_classes = [CachedBasicAuthentication, SessionAuthentication]
+
+    # Accoppia il turno successivo
+    def post(self, request):
+        LOGGER.debug('- TournamentRoundView.post()')
+        tournament = get_tournament(request.data.get('id'))
+        if tournament is None or tournament.created_by_id != request.user.id:
+            LOGGER.warning('Tournament not found')
+            return create_response(Response(
+                status=status.HTTP_404_NOT_FOUND,
+                data={'message': 'Tournament not found'}
+            ))
+
+        try:
+            new_round = start_round(tournament)
+        except ValueError as e:
+            LOGGER.warning(str(e))
+            return create_response(Response(
+                status=status.HTTP_409_CONFLICT,
+                data={'message': str(e)}
+            ))
+
+        return create_response(Response(
+            status=status.HTTP_201_CREATED,
+            data={
+                'message': 'Round paired',
+                'data': {'round': new_round.number, 'matches': new_round.pending}
+            }
+        ))
+
+class TournamentResultView(APIView):
+    permission_classes = [IsAuthenticated]
+    authentication_classes = [CachedBasicAuthentication, SessionAuthentication]
+
+    def post(self, request):
+        LOGGER.debug('- TournamentResultView.post()')
+        try:
+            pairing_id = int(request.data.get('pairing_id'))
+            p1_score = int(request.data.get('p1_score'))
+            p2_score = int(request.data.get('p2_score'))
+        except (TypeError, ValueError):
+            LOGGER.warning('Invalid tournament result')
+            return create_response(Response(
+                status=status.HTTP_400_BAD_REQUEST,
+                data={'message': 'pairing_id, p1_score and p2_score must be integers'}
+            ))
+
+        try:
+            pairing = record_result(pairing_id, p1_score, p2_score, user=request.user)
+        except Pairing.DoesNotExist:
+            return create_response(Response(
+                status=status.HTTP_404_NOT_FOUND,
+                data={'message': 'Pairing not found'}
+            ))
+        except PermissionError as e:
+            return create_response(Response(
+                status=status.HTTP_403_FORBIDDEN,
+                data={'message': str(e)}
+            ))
+        except ValueError as e:
+            LOGGER.warning(str(e))
+            return create_response(Response(
+                status=status.HTTP_409_CONFLICT,
+                data={'message': str(e)}
+            ))
+
+        LOGGER.info('Tournament result saved for pairing %s', pairing.id)
+        return create_response(Response(
+            status=status.HTTP_201_CREATED,
+            data={'message': 'Result saved', 'data': {'winner': pairing.winner}}
+        ))
+
+class TournamentStandingsView(APIView):
+    permission_classes = [IsAuthenticated]
+    authentication_classes = [CachedBasicAuthentication, SessionAuthentication]
+
+    def get(self, request):
+        LOGGER.debug('- TournamentStandingsView.get()')
+        tournament = get_tournament(request.query_params.get('id'))
+        if tournament is None:
+            return create_response(Response(
+                status=status.HTTP_404_NOT_FOUND,
+                data={'message': 'Tournament not found'}
+            ))
+
+        page_size = get_int_param(request.query_params, 'page_size', 50, minimum=1, maximum=STANDINGS_MAX_PAGE_SIZE)
+        page = get_int_param(request.query_params, 'page', 1, minimum=1)
+        return create_response(Response(
+            status=status.HTTP_200_OK,
+            data={
+                'message': 'Tournament standings retrieved',
+                'data': standings(tournament, (page - 1) * page_size, page_size),
+                'page': page,
+                'page_size': page_size
+            }
+        ))
+
+class MetricsView(APIView):
+    permission_classes = [IsAdminUser]
+    authentication_classes = [CachedBasicAuthentication, SessionAuthentication]
+
+    # Metriche per view di tutti i worker, in formato testo Prometheus
+    def get(self, request):
+        LOGGER.debug('- MetricsView.get()')
+        return HttpResponse(render_metrics(METRICS.collect()), content_type='text/plain; version=0.0.4; charset=utf-8')
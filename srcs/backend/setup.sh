@@ -13,6 +13,8 @@ if [ "$DEVELOPMENT" = "True" ]; then
   echo "Running migrations..."
   python manage.py makemigrations
   python manage.py migrate
+  # Match partizionata per mese: conversione al primo avvio, poi i mesi successivi
+  python manage.py partition_matches
 # else
 #   echo "Running in production mode..."
 
@@ -21,6 +23,7 @@ if [ "$DEVELOPMENT" = "True" ]; then
 
 #   echo "Running migrations..."
 #   python manage.py migrate
+#   python manage.py partition_matches
 fi
 
 # Create admin user
@@ -38,8 +41,9 @@ EOF
 # Start the application
 if [ "$DEVELOPMENT" = "True" ]; then
   echo "Starting the application in development mode..."
-  python manage.py runsslserver 0.0.0.0:8000 --certificate /app/certs/server.crt --key /app/certs/server.key
+  # Server ASGI: HTTP e WebSocket sullo stesso event loop
+  uvicorn web.asgi:application --host 0.0.0.0 --port 8000 --reload --ssl-certfile /app/certs/server.crt --ssl-keyfile /app/certs/server.key
 # else
 #   echo "Starting the application in production mode with Gunicorn..."
-#   gunicorn --workers=3 --bind 0.0.0.0:8000 web.wsgi:application
+#   gunicorn --workers=3 --bind 0.0.0.0:8000 -k uvicorn.workers.UvicornWorker web.asgi:application
 fi
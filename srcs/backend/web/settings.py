@@ -15,6 +15,7 @@ import logging.config
 from pathlib import Path
 import dj_database_url
 import socket
+import tempfile
 from logging.handlers import TimedRotatingFileHandler
 
 # INFO: General settings
@@ -32,6 +33,7 @@ USE_L10N = True
 USE_TZ = True
 
 # WSGI_APPLICATION = 'web.wsgi.application'
+ASGI_APPLICATION = 'web.asgi.application'
 
 # INFO: Architecture configuration
 ROOT_URLCONF = 'web.urls'
@@ -44,6 +46,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'corsheaders',
     'rest_framework',
     'rest_framework.authtoken',
@@ -52,6 +55,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'authn.middleware.RequestLogMiddleware',
+    'authn.middleware.MetricsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -87,11 +92,70 @@ DATABASES = {
     )
 }
 
+# INFO: Cache configuration
+# Local memory by default; set REDIS_URL to share the cache between workers
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ.get('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'ft-transcendence',
+            'OPTIONS': {'MAX_ENTRIES': 100000},
+        }
+    }
+
+# Server processes (gunicorn and uvicorn read WEB_CONCURRENCY too): more than one
+# needs REDIS_URL, see authn/presence.py
+WEB_CONCURRENCY = int(os.environ.get('WEB_CONCURRENCY', 1))
+
+# Seconds a user's cached friend adjacency lists are kept
+FRIEND_GRAPH_TTL = int(os.environ.get('FRIEND_GRAPH_TTL', 300))
+
+# Seconds without heartbeat after which a user is considered offline
+PRESENCE_TTL = int(os.environ.get('PRESENCE_TTL', 90))
+# Seconds between two batched writes of the status changes to the database
+PRESENCE_FLUSH_INTERVAL = int(os.environ.get('PRESENCE_FLUSH_INTERVAL', 10))
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 AUTH_USER_MODEL = 'authn.User'
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# Media serving (authn/media.py): '' serves the files from Django, 'x-accel-redirect'
+# (nginx, internal location MEDIA_ACCEL_PREFIX mapped to MEDIA_ROOT) or 'x-sendfile'
+# hands them to the front proxy
+MEDIA_ACCEL = os.environ.get('MEDIA_ACCEL', '')
+MEDIA_ACCEL_PREFIX = os.environ.get('MEDIA_ACCEL_PREFIX', '/protected-media/')
+# Browser cache of the media without a content hash in the name (default avatar)
+MEDIA_MAX_AGE = int(os.environ.get('MEDIA_MAX_AGE', 3600))
+# Avatar thumbnails (square, WebP and JPEG) and upload limits (see authn/avatars.py)
+AVATAR_SIZES = tuple(int(size) for size in os.environ.get('AVATAR_SIZES', '64,128,256').split(','))
+AVATAR_WORKERS = int(os.environ.get('AVATAR_WORKERS', 2))
+AVATAR_MAX_UPLOAD_SIZE = int(os.environ.get('AVATAR_MAX_UPLOAD_SIZE', 5 * 1024 * 1024))
+AVATAR_MAX_PIXELS = int(os.environ.get('AVATAR_MAX_PIXELS', 24000000))
+
+# INFO: Session configuration
+# Sessions in the cache (written through to the database) and the authenticated
+# user resolved through a cache, both behind a per-process LRU (authn/sessions.py)
+AUTH_FAST_PATH = os.environ.get('AUTH_FAST_PATH', 'True') == 'True'
+if AUTH_FAST_PATH:
+    SESSION_ENGINE = 'authn.sessions'
+    AUTHENTICATION_BACKENDS = ['authn.sessions.CachedModelBackend']
+    MIDDLEWARE[MIDDLEWARE.index('django.contrib.auth.middleware.AuthenticationMiddleware')] = \
+        'authn.sessions.AuthenticationMiddleware'
+# Seconds a process may keep a session or a user without asking the shared cache
+# (how long a logout or a password change takes to reach the other workers)
+SESSION_LOCAL_TTL = int(os.environ.get('SESSION_LOCAL_TTL', 5))
+SESSION_LOCAL_SIZE = int(os.environ.get('SESSION_LOCAL_SIZE', 10000))
+USER_CACHE_LOCAL_TTL = int(os.environ.get('USER_CACHE_LOCAL_TTL', 5))
+USER_CACHE_LOCAL_SIZE = int(os.environ.get('USER_CACHE_LOCAL_SIZE', 10000))
+USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL', 300))
 
 # INFO: SECURITY configuration
 # Enable SSL communication
@@ -121,6 +185,14 @@ CORS_ALLOW_HEADERS = [
     "authorization",
     "x-csrftoken",
     "x-requested-with",
+    "if-none-match",
+]
+
+# Headers readable by the frontend (match history pagination)
+CORS_EXPOSE_HEADERS = [
+    "x-total-count",
+    "etag",
+    "x-request-id",
 ]
 
 # Allow requests without a Referer header (useful for APIs)
@@ -149,60 +221,137 @@ AUTH_PASSWORD_VALIDATORS = [
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.SessionAuthentication',
-        'rest_framework.authentication.BasicAuthentication',
+        'authn.authentication.CachedBasicAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
 }
 
+# INFO: ASGI configuration
+CHANNEL_LAYERS = {
+    'default': {
+        'BACKEND': 'channels.layers.InMemoryChannelLayer',
+    }
+}
+# Serve the hot read endpoints with the async views (see authn/async_views.py)
+ASYNC_READ_VIEWS = os.environ.get('ASYNC_READ_VIEWS', 'True') == 'True'
+# Threads available to the blocking code called from async views
+ASYNC_SYNC_WORKERS = int(os.environ.get('ASYNC_SYNC_WORKERS', 8))
+# Password hashes computed at the same time by one process (0: one per CPU core)
+PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 0))
+
+# INFO: Basic authentication configuration
+# Seconds verified Basic credentials are remembered (0 disables the cache)
+BASIC_AUTH_CACHE_TTL = int(os.environ.get('BASIC_AUTH_CACHE_TTL', 60))
+
+# INFO: User uid configuration
+# 'username': one discriminator pool per username, 'global': a single shared pool
+UID_POOL_SCOPE = os.environ.get('UID_POOL_SCOPE', 'username')
+# Discriminators reserved per process at once when UID_POOL_SCOPE is 'global'
+UID_GLOBAL_BLOCK_SIZE = int(os.environ.get('UID_GLOBAL_BLOCK_SIZE', 64))
+
+# INFO: Leaderboard configuration
+# Seconds after which the in-memory leaderboard is reloaded from the database,
+# so that processes converge with the writes handled by other workers
+LEADERBOARD_MAX_AGE = int(os.environ.get('LEADERBOARD_MAX_AGE', 300))
+
+# INFO: Player search configuration
+# 'auto' uses pg_trgm on Postgres, 'ngram' forces the in-process trigram index
+SEARCH_BACKEND = os.environ.get('SEARCH_BACKEND', 'auto')
+SEARCH_INDEX_MAX_AGE = int(os.environ.get('SEARCH_INDEX_MAX_AGE', 300))
+
+# INFO: Response cache configuration
+# Seconds a cached read response is fresh, then seconds it is still served
+# while one request recomputes it (stale-while-revalidate)
+RESPONSE_CACHE_TTL = int(os.environ.get('RESPONSE_CACHE_TTL', 60))
+RESPONSE_CACHE_STALE = int(os.environ.get('RESPONSE_CACHE_STALE', 300))
+
+# INFO: Rating configuration
+# Elo K factor and fixed rating of the bot AM (recompute_ratings replays the history)
+RATING_K = float(os.environ.get('RATING_K', 32))
+RATING_BOT = float(os.environ.get('RATING_BOT', 1500))
+
+# INFO: Pong rooms configuration
+# Rooms simulated by one process (all on the same 60 Hz loop)
+PONG_MAX_ROOMS = int(os.environ.get('PONG_MAX_ROOMS', 5000))
+# Late ticks caught up before the loop drops frames and resets its clock
+PONG_MAX_CATCH_UP = int(os.environ.get('PONG_MAX_CATCH_UP', 3))
+
+# INFO: Tris bot configuration
+# Positions kept in the transposition table of a search (and solved positions kept
+# by each m,n,k solver)
+TRIS_CACHE_SIZE = int(os.environ.get('TRIS_CACHE_SIZE', 200000))
+# Search depth on boards too large to be solved exactly
+TRIS_MAX_DEPTH = int(os.environ.get('TRIS_MAX_DEPTH', 6))
+# Seconds of search per bot move: then the best move of the deepest complete search
+TRIS_TIME_BUDGET = float(os.environ.get('TRIS_TIME_BUDGET', 0.5))
+# Largest board accepted by tris/bot/move/ (5x5)
+TRIS_MAX_CELLS = int(os.environ.get('TRIS_MAX_CELLS', 25))
+
 # INFO: Logging configuration
+# Records go through a queue: JSON lines (ECS) and console output are written by
+# a background thread (see authn/jsonlog.py)
+# Fraction of the records kept per level, decided per request
+LOG_SAMPLING = {
+    'DEBUG': float(os.environ.get('LOG_SAMPLE_DEBUG', 1.0)),
+    'INFO': float(os.environ.get('LOG_SAMPLE_INFO', 1.0)),
+    'WARNING': float(os.environ.get('LOG_SAMPLE_WARNING', 1.0)),
+}
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
-    'formatters': {
-        'verbose': {
-            'format': '{levelname} {asctime} {module} {message}',
-            'style': '{',
-        },
-        'simple': {
-            'format': '{levelname} {message}',
-            'style': '{',
+    'filters': {
+        'sampling': {
+            '()': 'authn.jsonlog.SamplingFilter',
         },
     },
     'handlers': {
-        'console': {
-            'level': 'INFO',
-            'class': 'logging.StreamHandler',
-            'formatter': 'simple',
-        },
-        'file': {
-            'level': 'INFO',
-            'class': 'logging.handlers.TimedRotatingFileHandler',
+        'queue': {
+            '()': 'authn.jsonlog.QueueHandler',
+            'level': 'DEBUG',
             'filename': os.path.join(BASE_DIR, 'logs', 'django.log'),
             'when': 'midnight',
-            'interval': 1,
-            'backupCount': 7,
-            'formatter': 'verbose',
+            'backup_count': 7,
+            'queue_size': int(os.environ.get('LOG_QUEUE_SIZE', 10000)),
+            'filters': ['sampling'],
         },
     },
     'loggers': {
         'django': {
-            'handlers': ['console', 'file'],
+            'handlers': ['queue'],
             'level': 'INFO',
             'propagate': True,
         },
         'django.request': {
-            'handlers': ['console', 'file'],
+            'handlers': ['queue'],
             'level': 'INFO',
             'propagate': False,
         },
         'web': { 
-            'handlers': ['console', 'file'],
-            'level': 'INFO',
+            'handlers': ['queue'],
+            'level': os.environ.get('LOG_LEVEL', 'INFO'),
             'propagate': True,
         },
     },
 }
 
+# INFO: Metrics configuration
+# Per-view metrics, exposed to the admins in Prometheus format on /metrics/
+# Every worker writes its totals here (a directory shared by the workers, '' for
+# a single process)
+METRICS_DIR = os.environ.get('METRICS_DIR', os.path.join(tempfile.gettempdir(), 'authn-metrics'))
+METRICS_FLUSH_INTERVAL = int(os.environ.get('METRICS_FLUSH_INTERVAL', 5))
+# Files of the workers that stopped writing are ignored and removed
+METRICS_STALE_AFTER = int(os.environ.get('METRICS_STALE_AFTER', 300))
+
+# INFO: Match archive configuration
+# Segments of the archived matches (authn/archive.py, written by archive_matches).
+# Outside BASE_DIR: in docker the code is a bind mount, the archive has its own volume
+ARCHIVE_DIR = os.environ.get('ARCHIVE_DIR', '/var/lib/transcendence/archive')
+# Rows compressed together: a read decompresses only the groups it needs
+ARCHIVE_GROUP_ROWS = int(os.environ.get('ARCHIVE_GROUP_ROWS', 4096))
+# Decompressed groups kept in memory by each worker
+ARCHIVE_CACHE_GROUPS = int(os.environ.get('ARCHIVE_CACHE_GROUPS', 64))
+
 os.makedirs(os.path.join(BASE_DIR, 'logs'), exist_ok=True)
\ No newline at end of file
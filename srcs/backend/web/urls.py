@@ -7,10 +7,12 @@ Main content:
 
 from django.contrib import admin
 from django.conf import settings
-from django.conf.urls.static import static
-from django.urls import path, include
+from django.urls import path, re_path, include
+from authn.media import serve_media
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', include('authn.urls')),
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+    # Media caricati (avatar): servita anche senza DEBUG, vedi authn/media.py
+    re_path(rf'^{settings.MEDIA_URL.lstrip("/")}(?P<path>.+)$', serve_media, name='media'),
+]
\ No newline at end of file
@@ -249,9 +249,14 @@ export async function getTrisPlayerInfo(uid) {
 	return response;
 }
 
-export async function getPongGames(uid = null) {
-	const encodedUid = uid ? encodeURIComponent(uid) : null;
-	const url = uid ? `${API_BASE_URL}pong/games/?uid=${encodedUid}` : `${API_BASE_URL}pong/games/`;
+// cursor: next_cursor della pagina precedente (null per la prima pagina)
+export async function getPongGames(uid = null, cursor = null) {
+	const params = new URLSearchParams();
+	if (uid)
+		params.set('uid', uid);
+	if (cursor)
+		params.set('cursor', cursor);
+	const url = `${API_BASE_URL}pong/games/${params.toString() ? `?${params}` : ''}`;
 	const response = await fetchJson(url, {
 		method: 'GET',
 		headers: { 'Content-Type': 'application/json' },
@@ -260,9 +265,13 @@ export async function getPongGames(uid = null) {
 	return response;
 }
 
-export async function getTrisGames(uid = null) {
-	const encodedUid = uid ? encodeURIComponent(uid) : null;
-	const url = uid ? `${API_BASE_URL}tris/games/?uid=${encodedUid}` : `${API_BASE_URL}tris/games/`;
+export async function getTrisGames(uid = null, cursor = null) {
+	const params = new URLSearchParams();
+	if (uid)
+		params.set('uid', uid);
+	if (cursor)
+		params.set('cursor', cursor);
+	const url = `${API_BASE_URL}tris/games/${params.toString() ? `?${params}` : ''}`;
 	const response = await fetchJson(url, {
 		method: 'GET',
 		headers: { 'Content-Type': 'application/json' },
@@ -271,6 +280,18 @@ export async function getTrisGames(uid = null) {
 	return response;
 }
 
+export async function postHeartbeat(csrfToken) {
+	const response = await fetchJson(`${API_BASE_URL}presence/heartbeat/`, {
+		method: 'POST',
+		headers: {
+			'X-Csrftoken': csrfToken,
+			'Content-Type': 'application/json'
+		},
+		credentials: 'include'
+	});
+	return response;
+}
+
 export async function postPongGame(player1Uid, player2Uid, mode, p1Score, p2Score, csrfToken) {
 	const response = await fetchJson(`${API_BASE_URL}pong/games/`, {
 		method: 'POST',
@@ -24,6 +24,8 @@ class Player {
 		this._tournamentWonTris = 0;
 		this._recentGames = [];
 		this._recentGamesTris = [];
+		this._recentGamesCursor = null;
+		this._recentGamesTrisCursor = null;
 		this._localGames = 0;
 		this._localGamesWin = 0;
 		this._botGames = 0;
@@ -246,6 +248,28 @@ class Player {
 			console.log('%cInvalid value for recentGamesTris', 'color: red');
 	}
 
+	get recentGamesCursor() {
+		return this._recentGamesCursor;
+	}
+
+	set recentGamesCursor(value) {
+		if (value === null || typeof value === 'string')
+			this._recentGamesCursor = value;
+		else
+			console.log('%cInvalid value for recentGamesCursor', 'color: red');
+	}
+
+	get recentGamesTrisCursor() {
+		return this._recentGamesTrisCursor;
+	}
+
+	set recentGamesTrisCursor(value) {
+		if (value === null || typeof value === 'string')
+			this._recentGamesTrisCursor = value;
+		else
+			console.log('%cInvalid value for recentGamesTrisCursor', 'color: red');
+	}
+
 	get localGames() {
 		return this._localGames;
 	}
@@ -397,6 +421,8 @@ class Player {
 		this.tournamentWonTris = 0;
 		this.recentGames = [];
 		this.recentGamesTris = [];
+		this.recentGamesCursor = null;
+		this.recentGamesTrisCursor = null;
 		this.localGames = 0;
 		this.localGamesWin = 0;
 		this.botGames = 0;
@@ -123,6 +123,7 @@ document.addEventListener('DOMContentLoaded', async function() {
 			renderPlayerInfo(general.player, 'playerNameProfile', 'profileImage', 'profileDescription');
 			renderStats(general.player, 'profileStats', 'pong');
 			renderMatchesList(general.player, 'recentGamesList', 'pong');
+			addEventListenersMatchesList(general.player, 'recentGamesList');
 			renderFriendsList(general.player);
 			renderFriendRequests(general.player);
 			renderSentRequests(general.player);
@@ -140,6 +141,7 @@ document.addEventListener('DOMContentLoaded', async function() {
 			renderPlayerInfo(general.player, 'playerNameStats', 'profileImageStats', '');
 			renderStats(general.player, 'profileStats2', 'pong');
 			renderMatchesList(general.player, 'recentGamesList2', 'pong');
+			addEventListenersMatchesList(general.player, 'recentGamesList2');
 			renderModeStats(general.player, 'modeStats', 'pong');
 		},
 		profileOther: () => {
@@ -149,6 +151,7 @@ document.addEventListener('DOMContentLoaded', async function() {
 			renderPlayerInfo(general.other, 'playerNameOther', 'profileImageOther', 'profileDescriptionOther');
 			renderStats(general.other, 'profileStatsOther', 'pong');
 			renderMatchesList(general.other, 'recentGamesListOther', 'pong');
+			addEventListenersMatchesList(general.other, 'recentGamesListOther');
 			renderModeStats(general.other, 'modeStatsOther', 'pong');
 		},
 		search: () => {
@@ -585,6 +588,23 @@ document.addEventListener('DOMContentLoaded', async function() {
 		});
 	}
 
+	// Pulsante "Load more" in fondo alla lista delle partite
+	function addEventListenersMatchesList(player, elementId) {
+		document.getElementById(elementId).addEventListener('click', async function(event) {
+			if (!event.target.classList.contains('load-more-matches-btn'))
+				return;
+			const game = event.target.getAttribute('data-game');
+			const uid = player === general.other ? player.id : null;
+			event.target.disabled = true;
+			if (game === 'pong')
+				await handleGetPongGames(player, uid, true);
+			else
+				await handleGetTrisGames(player, uid, true);
+			renderMatchesList(player, elementId, game);
+			updateLanguage(general.lang);
+		});
+	}
+
 	//profileOther buttons
 	function addEventListenerProfileOther() {
 		document.getElementById('sendFriendProfile').addEventListener('click', async function(event) {
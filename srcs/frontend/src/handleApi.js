@@ -2,7 +2,26 @@ import { general } from "./classes.js";
 import { setElementById, addInvalidClass, showEmailModal, showPasswordModal, transformLeaderboardData, transformMatchesData } from "./utils.js";
 import { getXCrsfToken, isAuthenticated, login, loginGuest, logout, signup, getUserInfo, getLogin, updateUserInfo, updateProfileImage, getFriends, 
 	getFriendRequests, postFriendRequest, updateFriendRequestStatus, getLeaderboard, getLeaderboardTris, searchPlayers, getPongPlayerInfo, getTrisPlayerInfo, getPongGames, 
-	getTrisGames, postPongGame, postTrisGame, postPongTournamentWinner, postTrisTournamentWinner } from "./api.js";
+	getTrisGames, postPongGame, postTrisGame, postPongTournamentWinner, postTrisTournamentWinner, postHeartbeat } from "./api.js";
+
+const HEARTBEAT_INTERVAL = 30000;
+let heartbeatTimer = null;
+
+// Segnala periodicamente al backend che l'utente è ancora connesso
+function startHeartbeat() {
+	if (heartbeatTimer)
+		return;
+	heartbeatTimer = setInterval(async () => {
+		if (!general.isAuthenticated)
+			return;
+		try {
+			const csrfToken = localStorage.getItem('xcrsfToken') || await getXCrsfToken();
+			await postHeartbeat(csrfToken);
+		} catch (error) {
+			console.log(`%cFailed to send heartbeat: ${error.message}`, 'color: red');
+		}
+	}, HEARTBEAT_INTERVAL);
+}
 
 export async function isAuth() {
 	try {
@@ -11,6 +30,7 @@ export async function isAuth() {
 		if (response.message === 'Authenticated') {
 			general.isAuthenticated = true;
 			general.player.id = response.data.uid;
+			startHeartbeat();
 		}
 	} catch (error) {
 		console.log('Authentication status:', error.message);
@@ -28,6 +48,7 @@ export async function handleLogin(email, password, handleNavigation, page) {
 	try {
 		const response = await login(email, password);
 		general.isAuthenticated = true;
+		startHeartbeat();
 		console.log('Login response:', response.message);
 		const loginData = await getLogin();
 		console.log('Login data:', loginData.message);
@@ -191,22 +212,27 @@ export async function handleGetTrisPlayerInfo(uid, player) {
 	}
 }
 
-export async function handleGetPongGames(player, uid = null) {
+// more: aggiunge la pagina successiva (recentGamesCursor) a quelle già caricate
+export async function handleGetPongGames(player, uid = null, more = false) {
 	try {
-		const response = await getPongGames(uid);
+		const response = await getPongGames(uid, more ? player.recentGamesCursor : null);
 		console.log('Pong games retrieved:', response.message);
-	   	player.recentGames = transformMatchesData(response.data, player.id);
+		const games = transformMatchesData(response.data, player.id);
+	   	player.recentGames = more ? player.recentGames.concat(games) : games;
+		player.recentGamesCursor = response.next_cursor;
 		return response.data;
 	} catch (error) {
 		console.log(`%cFailed to retrieve Pong games: ${error.message}`, 'color: red');
 	}
 }
 
-export async function handleGetTrisGames(player, uid = null) {
+export async function handleGetTrisGames(player, uid = null, more = false) {
 	try {
-		const response = await getTrisGames(uid);
+		const response = await getTrisGames(uid, more ? player.recentGamesTrisCursor : null);
 		console.log('Tris games retrieved:', response.message);
-		player.recentGamesTris = transformMatchesData(response.data, player.id);
+		const games = transformMatchesData(response.data, player.id);
+		player.recentGamesTris = more ? player.recentGamesTris.concat(games) : games;
+		player.recentGamesTrisCursor = response.next_cursor;
 	} catch (error) {
 		console.log(`%cFailed to retrieve Tris games: ${error.message}`, 'color: red');
 	}
@@ -154,6 +154,15 @@ export function renderMatchesList(player, elementId, game) {
 			</li>
 		`;
 	});
+	// Altre partite sul server: la pagina successiva si carica con il cursore
+	const cursor = game === 'pong' ? player.recentGamesCursor : player.recentGamesTrisCursor;
+	if (cursor) {
+		matchesListElement.innerHTML += `
+			<li class="list-group-item d-flex justify-content-center bg-dark text-white">
+				<button class="btn btn-outline-light btn-sm load-more-matches-btn" data-translate="loadMore" data-game="${game}">Load more</button>
+			</li>
+		`;
+	}
 }
 
 // Lista di amici
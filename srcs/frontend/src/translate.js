@@ -79,6 +79,7 @@ const translations = {
 	viewProfile: "View Profile",
 	leaderboardEmpty: "No leaderboard available",
 	noMatches: "No matches played",
+	loadMore: "Load more",
 	noFriends: "No friends yet",
 	noRequests: "No incoming friend requests",
 	noSentRequests: "No sent friend requests",
@@ -184,6 +185,7 @@ const translations = {
 	viewProfile: "Visualizza Profilo",
 	leaderboardEmpty: "Classifica non disponibile",
 	noMatches: "Nessuna partita giocata",
+	loadMore: "Carica altre",
 	noFriends: "Nessun amico per ora",
 	noRequests: "Nessuna richiesta di amicizia in arrivo",
 	noSentRequests: "Nessuna richiesta di amicizia inviata",
@@ -289,6 +291,7 @@ const translations = {
 	viewProfile: "Ver perfil",
 	leaderboardEmpty: "Clasificación no disponible",
 	noMatches: "No hay partidas jugadas",
+	loadMore: "Cargar más",
 	noFriends: "Aún no tienes amigos",
 	noRequests: "No hay solicitudes de amistad entrantes",
 	noSentRequests: "No hay solicitudes de amistad enviadas",